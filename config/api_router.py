@@ -3,6 +3,7 @@ from django.urls import path
 from rest_framework.routers import DefaultRouter, SimpleRouter
 
 from ryft.core.api.views import (
+    CollectionHistoryView,
     CollectionTransfersAPIView,
     CollectionTransfersGraphView,
     CollectionViewSet,
@@ -16,6 +17,7 @@ from ryft.core.api.views import (
     UserTrackedWalletViewSet,
     UserWhitelistViewSet,
     WalletNFTAPIView,
+    WalletOnboardingView,
     WalletPortfolioView,
     WalletTransactionsAPIView,
     WalletViewSet,
@@ -47,9 +49,11 @@ urlpatterns += [
         "collections/<contract_address>/transfers/graph/",
         CollectionTransfersGraphView.as_view(),
     ),
+    path("collections/<contract_address>/history/", CollectionHistoryView.as_view()),
     path("wallet/portfolio/", WalletPortfolioView.as_view()),
     path("wallet/transactions/", WalletTransactionsAPIView.as_view()),
     path("wallet/nfts/", WalletNFTAPIView.as_view()),
+    path("wallet/onboarding/", WalletOnboardingView.as_view()),
     path("collections/<contract_address>/nfts/", NFTListAPIView.as_view()),
     path("trending-collections/", TrendingCollectionsView.as_view()),
     path("collections/<contract_address>/user-vote/", CollectionVoteView.as_view()),
@@ -322,16 +322,24 @@ CELERY_ROUTES = {
     "ryft.core.portfolio.tasks.create_wallet_webhook": {"queue": "long"},
     "ryft.core.portfolio.tasks.get_wallet_nfts": {"queue": "long"},
     "ryft.core.portfolio.tasks.calculate_portfolio_total": {"queue": "long"},
+    "ryft.core.portfolio.tasks.calculate_portfolio_totals": {"queue": "default"},
     "ryft.core.portfolio.tasks.create_wallet_nfts": {"queue": "long"},
     "ryft.core.portfolio.tasks.fetch_individual_wallet_transactions": {"queue": "long"},
     "ryft.core.portfolio.tasks.check_wallet_access": {"queue": "long"},
     "ryft.core.portfolio.tasks.save_final_wallet_details": {"queue": "long"},
+    "ryft.core.portfolio.tasks.fetch_wallet_ens_domains": {"queue": "long"},
+    "ryft.core.portfolio.tasks.run_wallet_onboarding_step": {"queue": "long"},
     "ryft.core.portfolio.tasks.save_tracked_wallet_thumbnail": {"queue": "long"},
+    "ryft.core.portfolio.tasks.process_webhook_events": {"queue": "default"},
     "ryft.core.tasks.fetch_nfts": {"queue": "default"},
+    "ryft.core.tasks.fetch_collections_nfts": {"queue": "default"},
     "ryft.core.tasks.create_nft_attributes": {"queue": "default"},
     "ryft.core.tasks.rank_nfts": {"queue": "default"},
+    "ryft.core.tasks.rerank_nfts": {"queue": "default"},
     "ryft.core.tasks.link_nfts_to_transactions": {"queue": "default"},
     "ryft.core.tasks.link_nfts_to_wallets": {"queue": "default"},
+    "ryft.core.tasks.link_nfts_for_collections": {"queue": "default"},
+    "ryft.core.tasks.backfill_transaction_price_usd": {"queue": "default"},
     "ryft.core.portfolio.tasks.fetch_collection_metrics": {"queue": "default"},
     "ryft.core.portfolio.tasks.fetch_collection_owners_history": {"queue": "default"},
     "ryft.core.portfolio.tasks.fetch_collection_price_history": {"queue": "default"},
@@ -473,6 +481,14 @@ SPECTACULAR_SETTINGS = {
 # Your stuff...
 # ------------------------------------------------------------------------------
 
+# Integrations response cache
+# --
+INTEGRATIONS_CACHE_ALIAS = "integrations"
+# Per endpoint TTL overrides in seconds, keyed by the clients' endpoint patterns
+INTEGRATIONS_CACHE_TTLS = {}
+# Requests per second of a rate limiter bucket, by bucket name
+INTEGRATIONS_RATE_LIMITS = {}
+
 # Alchemy
 # --
 ALCHEMY_API_KEY = env("ALCHEMY_API_KEY")
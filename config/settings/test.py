@@ -2,6 +2,9 @@
 With these settings, tests run faster.
 """
 
+import os
+import tempfile
+
 from .base import *  # noqa
 from .base import env
 
@@ -25,5 +28,19 @@ PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 
+# CACHES
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#caches
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "",
+    },
+    "integrations": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(tempfile.gettempdir(), "ryft-integrations-cache"),
+    },
+}
+
 # Your stuff...
 # ------------------------------------------------------------------------------
@@ -1,11 +1,14 @@
 from django.contrib import admin
+from django.db import transaction
 from django.db.models import QuerySet
 
-from ryft.core.portfolio.tasks import run_new_wallet_tasks
+from ryft.core.portfolio.tasks import process_webhook_events, run_new_wallet_tasks
 from ryft.core.tasks import (
     calculate_collection_rarity_task,
+    link_nfts_for_collections,
     link_nfts_to_transactions,
     link_nfts_to_wallets,
+    refresh_collection_nfts_task,
 )
 
 from .forms import CollectionAdminForm
@@ -16,6 +19,8 @@ from .models import (
     Collection,
     CollectionAttribute,
     CollectionMetrics,
+    CollectionOwnersRecord,
+    CollectionPriceRecord,
     DiscordUser,
     EthBlock,
     EthPrice,
@@ -27,8 +32,10 @@ from .models import (
     UserTrackedWallet,
     UserWhiteList,
     Wallet,
+    WalletHolding,
     WalletNFT,
     WalletPortfolioRecord,
+    WebhookEvent,
 )
 
 
@@ -52,6 +59,15 @@ def collection_link_nfts_to_wallets(
 collection_link_nfts_to_wallets.short_description = "Link NFTs to Wallets"
 
 
+def collection_link_nfts(modeladmin, request, queryset: QuerySet[Collection]):
+    link_nfts_for_collections.delay(
+        list(queryset.values_list("contract_address", flat=True))
+    )
+
+
+collection_link_nfts.short_description = "Link NFTs to Transactions and Wallets"
+
+
 def collection_perform_all_tasks(modeladmin, request, queryset: QuerySet[Collection]):
     for collection in queryset:
         calculate_collection_rarity_task(collection.contract_address)
@@ -60,6 +76,14 @@ def collection_perform_all_tasks(modeladmin, request, queryset: QuerySet[Collect
 collection_perform_all_tasks.short_description = "Perform all tasks"
 
 
+def collection_refresh_nfts(modeladmin, request, queryset: QuerySet[Collection]):
+    for collection in queryset:
+        refresh_collection_nfts_task(collection.contract_address)
+
+
+collection_refresh_nfts.short_description = "Refresh NFTs and re-rank changes"
+
+
 def wallet_calculate_wallet_portfolio_task(
     modeladmin, request, queryset: QuerySet[Wallet]
 ):
@@ -70,6 +94,14 @@ def wallet_calculate_wallet_portfolio_task(
 wallet_calculate_wallet_portfolio_task.short_description = "Perform all tasks"
 
 
+def webhook_event_requeue(modeladmin, request, queryset: QuerySet[WebhookEvent]):
+    queryset.update(processed_timestamp=None, error=None)
+    transaction.on_commit(process_webhook_events.delay)
+
+
+webhook_event_requeue.short_description = "Requeue events"
+
+
 class WalletAdmin(admin.ModelAdmin):
     list_display = [
         "id",
@@ -104,7 +136,9 @@ class CollectionAdmin(admin.ModelAdmin):
     actions = [
         collection_link_nfts_to_transactions,
         collection_link_nfts_to_wallets,
+        collection_link_nfts,
         collection_perform_all_tasks,
+        collection_refresh_nfts,
     ]
     add_form = CollectionAdminForm
 
@@ -134,6 +168,16 @@ class CollectionMetricsAdmin(admin.ModelAdmin):
     search_fields = ["collection__name", "collection__contract_address"]
 
 
+class CollectionPriceRecordAdmin(admin.ModelAdmin):
+    list_display = ["collection", "timestamp", "avg_price", "volume", "quantity"]
+    search_fields = ["collection__name", "collection__contract_address"]
+
+
+class CollectionOwnersRecordAdmin(admin.ModelAdmin):
+    list_display = ["collection", "timestamp", "owners_count"]
+    search_fields = ["collection__name", "collection__contract_address"]
+
+
 class NFTTraitInLineAdmin(admin.TabularInline):
     model = NFTTrait
     extra = 0
@@ -169,6 +213,12 @@ class WalletNFTAdmin(admin.ModelAdmin):
     exclude = ["nft_raw_data"]
 
 
+class WalletHoldingAdmin(admin.ModelAdmin):
+    list_display = ["wallet", "contract_address", "count", "floor_value"]
+    search_fields = ["wallet__wallet_address", "contract_address"]
+    raw_id_fields = ["wallet", "collection"]
+
+
 class TransactionAdmin(admin.ModelAdmin):
     list_display = ["id", "transaction_type", "block_number"]
     search_fields = ["wallet__wallet_address"]
@@ -214,6 +264,12 @@ class RequestLogAdmin(admin.ModelAdmin):
     list_display = ["user", "endpoint", "method", "date"]
 
 
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ["event_id", "timestamp", "processed_timestamp", "error"]
+    search_fields = ["event_id"]
+    actions = [webhook_event_requeue]
+
+
 class TrackedWalletAdmin(admin.ModelAdmin):
     list_display = ["id", "__str__"]
 
@@ -223,11 +279,14 @@ admin.site.register(DiscordUser, DiscordUserAdmin)
 admin.site.register(Wallet, WalletAdmin)
 admin.site.register(Collection, CollectionAdmin)
 admin.site.register(CollectionMetrics, CollectionMetricsAdmin)
+admin.site.register(CollectionPriceRecord, CollectionPriceRecordAdmin)
+admin.site.register(CollectionOwnersRecord, CollectionOwnersRecordAdmin)
 admin.site.register(NFT, NFTAdmin)
 admin.site.register(CollectionAttribute, CollectionAttributeAdmin)
 admin.site.register(NFTTrait)
 admin.site.register(WalletPortfolioRecord, WalletPortfolioRecordAdmin)
 admin.site.register(WalletNFT, WalletNFTAdmin)
+admin.site.register(WalletHolding, WalletHoldingAdmin)
 admin.site.register(Transaction, TransactionAdmin)
 admin.site.register(UserWhiteList)
 admin.site.register(EthBlock, EthBlockAdmin)
@@ -237,3 +296,4 @@ admin.site.register(APICallRecordLog, APICallRecordLogAdmin)
 admin.site.register(TrendingCollections)
 admin.site.register(EthPrice, EthPriceAdmin)
 admin.site.register(RequestLog, RequestLogAdmin)
+admin.site.register(WebhookEvent, WebhookEventAdmin)
@@ -0,0 +1,160 @@
+"""
+Sparse fieldsets for the API.
+
+Clients pick the fields of a response with ``?fields=name,collectionmetrics``,
+or only some fields of a nested object with
+``?fields=name,collectionmetrics.current_floor_price``. Fields a serializer
+lists in ``Meta.expandable_fields`` are only rendered on request, with
+``?expand=artwork_images`` or by naming them in ``?fields=``.
+
+The queryset then only loads the columns and relations of the fields that
+are rendered.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+def parse_fields(value):
+    """
+    :return: the requested fields, each with the requested fields of its
+    nested object or None for all of them
+    """
+    fields = {}
+    for name in filter(None, (name.strip() for name in value.split(","))):
+        field, _, nested = name.partition(".")
+        if not nested:
+            fields[field] = None
+        elif field not in fields:
+            fields[field] = {nested}
+        elif fields[field] is not None:
+            fields[field].add(nested)
+    return fields
+
+
+def select_fields(queryset, serializer):
+    """
+    Restrict the queryset to the columns and relations the serializer renders.
+    The queryset is returned as is when a field isn't rendered from a model
+    field, as there's no telling what it reads.
+    """
+    opts = queryset.model._meta
+    only = []
+    related = []
+    prefetch = []
+    for field in serializer.fields.values():
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            return queryset
+
+        if isinstance(field, serializers.ListSerializer):
+            prefetch.append(field.source)
+        elif isinstance(field, serializers.ModelSerializer):
+            nested_opts = model_field.related_model._meta
+            for nested in field.fields.values():
+                try:
+                    nested_opts.get_field(nested.source)
+                except FieldDoesNotExist:
+                    return queryset
+                only.append(f"{field.source}__{nested.source}")
+            related.append(field.source)
+        elif model_field.concrete:
+            only.append(field.source)
+        else:
+            return queryset
+
+    return (
+        queryset.select_related(None)
+        .prefetch_related(None)
+        .select_related(*related)
+        .prefetch_related(*prefetch)
+        .only(*only)
+    )
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Serializer rendering only the fields in its `fields` context, and its
+    `Meta.expandable_fields` only when they are in its `expand` context
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get("fields")
+        expand = self.context.get("expand") or set()
+
+        for name in getattr(self.Meta, "expandable_fields", ()):
+            if name not in expand and (fields is None or name not in fields):
+                self.fields.pop(name, None)
+        if fields is None:
+            return
+
+        for name in list(self.fields):
+            if name not in fields:
+                self.fields.pop(name)
+        for name, nested_fields in fields.items():
+            if nested_fields is None or name not in self.fields:
+                continue
+            nested = getattr(self.fields[name], "child", self.fields[name])
+            for nested_name in list(nested.fields):
+                if nested_name not in nested_fields:
+                    nested.fields.pop(nested_name)
+
+
+class SparseFieldsetMixin:
+    """
+    View handling the `fields` and `expand` query params of its
+    `sparse_fieldset_actions` with a SparseFieldsetSerializerMixin serializer
+    """
+
+    sparse_fieldset_actions = ("list", "retrieve")
+
+    def get_sparse_fieldset(self):
+        """
+        :return: the requested fields, None for the default ones, and the
+        requested expandable fields
+        """
+        if getattr(self, "action", None) not in self.sparse_fieldset_actions:
+            return None, set()
+
+        params = self.request.query_params
+        fields = parse_fields(params.get("fields", "")) or None
+        expand = set(parse_fields(params.get("expand", "")))
+
+        serializer_class = self.get_serializer_class()
+        expandable = set(getattr(serializer_class.Meta, "expandable_fields", ()))
+        available = serializer_class(context={"expand": expandable}).fields
+        errors = {}
+        unknown = sorted(set(fields or ()) - set(available))
+        if unknown:
+            errors["fields"] = [f"Unknown fields: {', '.join(unknown)}"]
+        unknown = sorted(expand - expandable)
+        if unknown:
+            errors["expand"] = [f"Fields can't be expanded: {', '.join(unknown)}"]
+        for name, nested_fields in (fields or {}).items():
+            nested = getattr(available.get(name), "child", available.get(name))
+            if nested_fields is None or nested is None:
+                continue
+            unknown = sorted(nested_fields - set(getattr(nested, "fields", ())))
+            if unknown:
+                errors.setdefault("fields", []).append(
+                    f"Unknown fields of {name}: {', '.join(unknown)}"
+                )
+        if errors:
+            raise ValidationError(errors)
+
+        return fields, expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if not hasattr(self, "_sparse_fieldset"):
+            self._sparse_fieldset = self.get_sparse_fieldset()
+        context["fields"], context["expand"] = self._sparse_fieldset
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, "action", None) not in self.sparse_fieldset_actions:
+            return queryset
+        return select_fields(queryset, self.get_serializer())
@@ -1,6 +1,8 @@
+from django import forms
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from ryft.core.models import Collection, TrackedWallet, Transaction
+from ryft.core.models import NFT, Collection, NFTTrait, TrackedWallet, Transaction
 
 
 class CollectionFilter(filters.FilterSet):
@@ -47,3 +49,52 @@ class TrackedWalletFilter(filters.FilterSet):
     class Meta:
         model = TrackedWallet
         fields = ["wallet_address"]
+
+
+class TraitField(forms.Field):
+    # Read every value of a repeated query param
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        traits = []
+        for trait in value or []:
+            name, separator, trait_value = trait.partition(":")
+            if not separator:
+                raise forms.ValidationError("Traits must be formatted as Name:Value")
+            traits.append((name, trait_value))
+        return traits
+
+
+class TraitFilter(filters.Filter):
+    """
+    Filter NFTs by trait, e.g. ``?trait=Hat:Army Hat&trait=Hat:Cap&trait=Eyes:Blue``.
+    Values of the same trait are OR'd together and different traits are AND'd.
+    """
+
+    field_class = TraitField
+
+    def filter(self, qs, value):
+        values_by_name = {}
+        for name, trait_value in value or []:
+            values_by_name.setdefault(name, []).append(trait_value)
+
+        for name, values in values_by_name.items():
+            qs = qs.filter(
+                Exists(
+                    NFTTrait.objects.filter(
+                        nft=OuterRef("pk"),
+                        attribute__collection=OuterRef("collection"),
+                        attribute__name=name,
+                        attribute__value__in=values,
+                    )
+                )
+            )
+        return qs
+
+
+class NFTFilter(filters.FilterSet):
+    trait = TraitFilter()
+
+    class Meta:
+        model = NFT
+        fields = ["trait"]
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from web3 import Web3
 
+from ryft.core.api.fieldsets import SparseFieldsetSerializerMixin
+from ryft.core.collection_history import get_owners_data_points, get_price_data_points
 from ryft.core.models import (
     NFT,
     ArtworkPreviewImage,
@@ -14,6 +16,7 @@ from ryft.core.models import (
     UserWhiteList,
     Wallet,
     WalletNFT,
+    WalletOnboardingStep,
     WalletPortfolioRecord,
 )
 
@@ -40,13 +43,45 @@ class CollectionMetricsSerializer(serializers.ModelSerializer):
             "average_sales_24hr",
             "average_volume_24hr",
             "royalty_fee",
+        )
+
+
+class HistoryField(serializers.ReadOnlyField):
+    """
+    Last 30 days of a collection's history as Mnemonic data points, read from
+    the collection id of its metrics
+    """
+
+    def __init__(self, get_data_points, **kwargs):
+        self.get_data_points = get_data_points
+        super().__init__(source="collection_id", **kwargs)
+
+    def to_representation(self, value):
+        return self.get_data_points(value)
+
+
+class CollectionDetailMetricsSerializer(CollectionMetricsSerializer):
+    # The history used to be stored on CollectionMetrics in this shape
+    price_history = HistoryField(get_price_data_points)
+    owners_history = HistoryField(get_owners_data_points)
+
+    class Meta(CollectionMetricsSerializer.Meta):
+        fields = CollectionMetricsSerializer.Meta.fields + (
             "price_history",
             "owners_history",
         )
 
 
-class CollectionListSerializer(serializers.ModelSerializer):
+class CollectionHistoryQuerySerializer(serializers.Serializer):
+    days = serializers.IntegerField(min_value=1, max_value=3650, default=30)
+    period = serializers.ChoiceField(choices=["day", "week", "month"], required=False)
+
+
+class CollectionListSerializer(
+    SparseFieldsetSerializerMixin, serializers.ModelSerializer
+):
     collectionmetrics = CollectionMetricsSerializer()
+    artwork_images = ArtworkSerializer(many=True, read_only=True)
 
     class Meta:
         model = Collection
@@ -65,7 +100,10 @@ class CollectionListSerializer(serializers.ModelSerializer):
             "num_discord_members",
             "num_twitter_followers",
             "created_timestamp",
+            "description",
+            "artwork_images",
         )
+        expandable_fields = ("description", "artwork_images")
         read_only_fields = (
             "id",
             "name",
@@ -189,9 +227,11 @@ class UpcomingCollectionSerializer(serializers.ModelSerializer):
         )
 
 
-class CollectionDetailSerializer(serializers.ModelSerializer):
+class CollectionDetailSerializer(
+    SparseFieldsetSerializerMixin, serializers.ModelSerializer
+):
     artwork_images = ArtworkSerializer(many=True, read_only=True)
-    collectionmetrics = CollectionMetricsSerializer(read_only=True)
+    collectionmetrics = CollectionDetailMetricsSerializer(read_only=True)
 
     class Meta:
         model = Collection
@@ -240,6 +280,13 @@ class WalletPortfolioRecordSerializer(serializers.ModelSerializer):
         read_only_fields = ("portfolio_value", "timestamp")
 
 
+class WalletOnboardingStepSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WalletOnboardingStep
+        fields = ("step", "status", "updated_timestamp")
+        read_only_fields = ("step", "status", "updated_timestamp")
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     discord_user = serializers.SerializerMethodField()
 
@@ -1,10 +1,9 @@
 import datetime
+import hashlib
 import json
 import logging
-from decimal import Decimal
 from itertools import chain
 
-from dateutil import parser
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction
@@ -31,10 +30,11 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
-from config.settings.base import RYFT_CONTRACT_ADDRESS
+from ryft.core.api.fieldsets import SparseFieldsetMixin
 from ryft.core.api.filters import (
     CollectionFilter,
     CollectionTransfersFilter,
+    NFTFilter,
     TrackedWalletFilter,
 )
 from ryft.core.api.paginators import (
@@ -47,6 +47,7 @@ from ryft.core.api.permissions import IsMember, IsValidDiscordUser, IsWalletOwne
 from ryft.core.api.serializers import (
     CollectionCreateSerializer,
     CollectionDetailSerializer,
+    CollectionHistoryQuerySerializer,
     CollectionListSerializer,
     CollectionTransferSerializer,
     CollectionVoteSerializer,
@@ -62,14 +63,19 @@ from ryft.core.api.serializers import (
     UserWhiteListCreateSerializer,
     UserWhiteListSerializer,
     WalletNFTSerializer,
+    WalletOnboardingStepSerializer,
     WalletPortfolioRecordSerializer,
 )
 from ryft.core.authentication import CsrfExemptSessionAuthentication
+from ryft.core.collection_history import (
+    get_owners_history,
+    get_period,
+    get_price_history,
+)
 from ryft.core.models import (
     NFT,
     Collection,
     CollectionVote,
-    EthPrice,
     TrackedWallet,
     Transaction,
     TrendingCollections,
@@ -77,14 +83,16 @@ from ryft.core.models import (
     UserWhiteList,
     Wallet,
     WalletNFT,
+    WebhookEvent,
 )
-from ryft.core.portfolio.tasks import run_new_wallet_tasks
+from ryft.core.portfolio.tasks import queue_webhook_events, run_new_wallet_tasks
 from ryft.core.utils import (
     DISCORD_API_ENDPOINT,
     discord_request,
     get_user_discord_roles,
     is_valid_signature_for_string_body,
 )
+from ryft.core.wallet_addresses import wallet_addresses
 
 User = get_user_model()
 
@@ -139,7 +147,11 @@ class UserProfilePictureViewSet(RetrieveModelMixin, UpdateModelMixin, GenericVie
 
 
 class CollectionViewSet(
-    ListModelMixin, RetrieveModelMixin, CreateModelMixin, GenericViewSet
+    SparseFieldsetMixin,
+    ListModelMixin,
+    RetrieveModelMixin,
+    CreateModelMixin,
+    GenericViewSet,
 ):
     permission_classes = [IsAuthenticated, IsMember]
     authentication_classes = (CsrfExemptSessionAuthentication,)
@@ -313,6 +325,34 @@ class CollectionTransfersGraphView(ListAPIView):
         )
 
 
+class CollectionHistoryView(APIView):
+    """
+    Price and owners history of a collection over the last `days` days,
+    downsampled to one point per `period`
+    """
+
+    permission_classes = [IsAuthenticated, IsMember]
+
+    @method_decorator(cache_page(60 * 60))
+    def get(self, request, *args, **kwargs):
+        collection = get_object_or_404(
+            Collection, contract_address=self.kwargs.get("contract_address")
+        )
+        serializer = CollectionHistoryQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        days = serializer.validated_data["days"]
+        period = serializer.validated_data.get("period") or get_period(days)
+
+        since = timezone.now() - datetime.timedelta(days=days)
+        return Response(
+            {
+                "period": period,
+                "price_history": get_price_history(collection, since, period),
+                "owners_history": get_owners_history(collection, since, period),
+            }
+        )
+
+
 class WalletViewSet(ListModelMixin, RetrieveModelMixin, GenericViewSet):
     permission_classes = [IsAuthenticated, IsMember]
     serializer_class = TrackedWalletSerializer
@@ -357,6 +397,27 @@ class WalletPortfolioView(ListAPIView):
         return context
 
 
+class WalletOnboardingView(ListAPIView):
+    """Progress of the steps that process a new or tracked wallet"""
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = WalletOnboardingStepSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        user: User = self.request.user
+        wallet = user.wallet
+
+        wallet_address = self.request.GET.get("wallet_address")
+        if wallet_address:
+            tracked_wallet = get_object_or_404(
+                TrackedWallet, wallet__wallet_address=wallet_address.lower()
+            )
+            wallet = tracked_wallet.wallet
+
+        return wallet.onboarding_steps.order_by("id")
+
+
 class WalletNFTAPIView(ListAPIView):
     permission_classes = [IsAuthenticated, IsMember]
     serializer_class = WalletNFTSerializer
@@ -483,6 +544,7 @@ class NFTListAPIView(ListAPIView):
     permission_classes = [IsAuthenticated, IsMember]
     serializer_class = NFTSerializer
     pagination_class = NFTResultsSetPagination
+    filterset_class = NFTFilter
 
     @method_decorator(cache_page(60 * 60 * 2))
     def list(self, request, *args, **kwargs):
@@ -677,159 +739,27 @@ def wallet_activity_webhook(request):
     logging.info(msg="Received wallet address activity")
 
     data = json.loads(payload)
-
-    event = data["event"]
-    activity = event["activity"]
-    logging.info(msg=f"Here is the activity in the event: {activity}")
-
-    null_address = "0x0000000000000000000000000000000000000000"
-
-    def get_transaction_type(t):
-        transaction_type = "transfer"
-        from_address = t.get("from")
-        to_address = t.get("to")
-
-        if from_address == null_address:
-            transaction_type = "mint"
-
-        elif to_address == null_address:
-            transaction_type = "burn"
-
-        return transaction_type
-
-    for t in activity:
-
-        category = t.get("category")
-        if category != "token":
-            transaction_date = parser.parse(data.get("createdAt")).date()
-
-            from_address = t.get("fromAddress")
-            to_address = t.get("toAddress")
-
-            raw_contract = t.get("rawContract")
-            contract_address = raw_contract.get("address")
-
-            is_ryft_transfer = False
-            if contract_address == RYFT_CONTRACT_ADDRESS:
-                is_ryft_transfer = True
-
-            price_eth = None
-            price_usd = None
-
-            erc1155_metadata = t.get("erc1155Metadata")
-            erc721_token_id = t.get("erc721TokenId")
-
-            token_id = None
-
-            if erc1155_metadata:
-                if len(erc1155_metadata) > 0:
-                    token_id = int(erc1155_metadata[0].get("tokenId"), base=16)
-                    price_eth_hex = erc1155_metadata[0].get("value")
-                    price_eth = int(price_eth_hex, base=16)
-            elif erc721_token_id:
-                token_id = int(erc721_token_id, base=16)
-
-            if token_id:
-
-                value = t.get("value")
-                if value:
-                    price_eth = value
-
-                if price_eth:
-                    ether_price = (
-                        EthPrice.objects.filter(date__lte=transaction_date)
-                        .order_by("-date")
-                        .first()
-                    )
-                    if ether_price:
-                        price_usd = int(
-                            Decimal(ether_price.value) * Decimal(str(price_eth))
-                        )
-
-                nft = NFT.objects.filter(
-                    collection__contract_address=contract_address, token_id=token_id
-                ).first()
-
-                if from_address:
-                    try:
-                        wallet = Wallet.objects.get(wallet_address=from_address)
-                        Transaction.objects.get_or_create(
-                            wallet=wallet,
-                            transaction_hash=t.get("transactionHash"),
-                            defaults={
-                                "nft": nft,
-                                "transaction_type": get_transaction_type(t),
-                                "transfer_from": from_address,
-                                "transfer_to": to_address,
-                                "contract_address": contract_address,
-                                "token_id": token_id,
-                                "quantity": 1,
-                                "block_hash": t.get("blockHash"),
-                                "block_number": t.get("blockNumber"),
-                                "transaction_date": transaction_date,
-                                "raw_transaction_data": t,
-                                "price_eth": price_eth,
-                                "price_usd": price_usd,
-                            },
-                        )
-                        if is_ryft_transfer:
-                            wallet.is_member = False
-                            wallet.save()
-
-                        if nft:
-                            # delete the walletNFT because this is sent from the fromAddress
-                            try:
-                                wallet_nft = WalletNFT.objects.get(
-                                    nft=nft, wallet=wallet
-                                )
-                                wallet_nft.delete()
-                            except WalletNFT.DoesNotExist:
-                                pass
-
-                    except Wallet.DoesNotExist:
-                        pass
-
-                if to_address:
-                    try:
-                        wallet = Wallet.objects.get(wallet_address=to_address)
-                        Transaction.objects.get_or_create(
-                            wallet=wallet,
-                            transaction_hash=t.get("transactionHash"),
-                            defaults={
-                                "nft": nft,
-                                "transaction_type": get_transaction_type(t),
-                                "transfer_from": from_address,
-                                "transfer_to": to_address,
-                                "contract_address": contract_address,
-                                "token_id": token_id,
-                                "quantity": 1,
-                                "block_hash": t.get("blockHash"),
-                                "block_number": t.get("blockNumber"),
-                                "transaction_date": transaction_date,
-                                "raw_transaction_data": t,
-                                "price_eth": price_eth,
-                                "price_usd": price_usd,
-                            },
-                        )
-                        if is_ryft_transfer:
-                            wallet.is_member = True
-                            wallet.save()
-
-                        if nft:
-                            # create the walletNFT because this is sent to the toAddress
-                            WalletNFT.objects.get_or_create(
-                                nft=nft,
-                                wallet=wallet,
-                                defaults={
-                                    "nft_raw_data": {
-                                        "contract_address": contract_address,
-                                        "token_id": token_id,
-                                    }
-                                },
-                            )
-
-                    except Wallet.DoesNotExist:
-                        pass
+    addresses = {
+        address
+        for activity in data["event"]["activity"]
+        for address in (activity.get("fromAddress"), activity.get("toAddress"))
+    }
+    if not wallet_addresses.filter(addresses):
+        logging.info(msg="Ignored wallet activity without any of our wallets")
+        return HttpResponse(status=200)
+
+    # Store the payload and let a worker apply it, so Alchemy gets a response
+    # long before it would time out and redeliver the webhook
+    WebhookEvent.objects.bulk_create(
+        [
+            WebhookEvent(
+                event_id=data.get("id") or hashlib.sha256(payload).hexdigest(),
+                payload=data,
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(queue_webhook_events)
 
     logging.info(msg="Finished wallet address webhook")
     return HttpResponse(status=200)
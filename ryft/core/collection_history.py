@@ -0,0 +1,277 @@
+"""
+Price and owners history of collections.
+
+Mnemonic reports one data point per collection and day. The points are
+stored as rows of CollectionPriceRecord and CollectionOwnersRecord, so the
+history can grow past Mnemonic's 30 day window without growing any row. Each
+refresh only asks for the days after the latest stored point, using the
+shortest duration that covers them; the latest day is fetched again because
+its point keeps changing until the day is over.
+
+History is read downsampled to one point per day, week or month. The last
+30 days are also served in Mnemonic's data point format on the collection
+detail, the shape of the JSON fields the history used to be stored in.
+"""
+import datetime
+import logging
+from dataclasses import dataclass
+from typing import Callable
+
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Max, Min, Q, Sum
+from django.db.models.functions import NullIf, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ryft.core.db import bulk_upsert
+from ryft.core.integrations.mnemonic import Duration, mnemonic_client
+from ryft.core.models import (
+    APICallRecordLog,
+    Collection,
+    CollectionOwnersRecord,
+    CollectionPriceRecord,
+)
+
+# Shortest duration covering a number of days
+DURATIONS = [
+    (1, Duration.day),
+    (7, Duration.week),
+    (30, Duration.month),
+    (365, Duration.year),
+]
+
+PERIODS = {"day": TruncDay, "week": TruncWeek, "month": TruncMonth}
+
+
+def _trunc(period):
+    # Mnemonic's days are UTC days
+    return PERIODS[period]("timestamp", tzinfo=datetime.timezone.utc)
+
+
+def _float(value):
+    return float(value) if value not in (None, "") else None
+
+
+def _int(value):
+    return int(float(value)) if value not in (None, "") else None
+
+
+@dataclass
+class History:
+    model: type
+    service: str
+    # Name of the MnemonicClient method fetching the data points
+    fetch: str
+    # Fields of a record from a Mnemonic data point
+    parse: Callable
+    update_fields: list
+
+
+PRICE_HISTORY = History(
+    model=CollectionPriceRecord,
+    service="collection_price_history",
+    fetch="get_historical_price_history",
+    parse=lambda point: {
+        "min_price": _float(point.get("min")),
+        "max_price": _float(point.get("max")),
+        "avg_price": _float(point.get("avg")),
+        "volume": _float(point.get("volume")),
+        "quantity": _int(point.get("quantity")),
+    },
+    update_fields=["min_price", "max_price", "avg_price", "volume", "quantity"],
+)
+
+OWNERS_HISTORY = History(
+    model=CollectionOwnersRecord,
+    service="collection_owners_history",
+    fetch="get_historical_collection_owners",
+    parse=lambda point: {"owners_count": _int(point.get("count")) or 0},
+    update_fields=["owners_count"],
+)
+
+
+def get_duration(since, now=None):
+    """
+    :param since: timestamp of the latest stored point, None without history
+    :return: the shortest Mnemonic duration going back to `since`, a year
+    when there's no history yet
+    """
+    if since is None:
+        return Duration.year
+
+    days = ((now or timezone.now()) - since).days + 1
+    for max_days, duration in DURATIONS:
+        if days <= max_days:
+            return duration
+    return Duration.year
+
+
+def refresh_history(history: History, collections=None, flush_size=5000):
+    """
+    Fetch the points of every collection after its latest stored one and
+    upsert them in batches of about `flush_size` records. A collection that
+    fails is logged and skipped.
+
+    :param collections: defaults to the released collections with metrics
+    :return: number of records written
+    """
+    if collections is None:
+        collections = Collection.objects.filter(
+            released=True, collectionmetrics__isnull=False
+        )
+    collections = list(collections.only("id", "contract_address"))
+    latest = dict(
+        history.model.objects.filter(collection__in=collections)
+        .values("collection_id")
+        .annotate(latest=Max("timestamp"))
+        .values_list("collection_id", "latest")
+    )
+
+    fetch = getattr(mnemonic_client, history.fetch)
+    records = {}
+    written = 0
+    api_calls = 0
+
+    def flush():
+        with transaction.atomic():
+            bulk_upsert(
+                history.model,
+                list(records.values()),
+                conflict_fields=["collection", "timestamp"],
+                update_fields=history.update_fields,
+            )
+            APICallRecordLog.objects.bulk_create(
+                [
+                    APICallRecordLog(client="mnemonic", service=history.service)
+                    for _ in range(api_calls)
+                ]
+            )
+        return len(records)
+
+    for collection in collections:
+        since = latest.get(collection.id)
+        try:
+            data = fetch(collection.contract_address, get_duration(since))
+        except Exception:
+            logging.exception(
+                msg=f"Failed to fetch {history.service} for contract: "
+                f"{collection.contract_address}"
+            )
+            continue
+        api_calls += 1
+
+        for point in data.get("dataPoints") or []:
+            timestamp = parse_datetime(point.get("timestamp") or "")
+            if timestamp is None or (since is not None and timestamp < since):
+                continue
+            records[(collection.id, timestamp)] = history.model(
+                collection_id=collection.id,
+                timestamp=timestamp,
+                **history.parse(point),
+            )
+
+        if len(records) >= flush_size:
+            written += flush()
+            records = {}
+            api_calls = 0
+
+    written += flush()
+    return written
+
+
+def get_period(days):
+    """
+    :return: the period history over `days` is downsampled to by default
+    """
+    if days <= 90:
+        return "day"
+    if days <= 730:
+        return "week"
+    return "month"
+
+
+def get_price_history(collection, since, period="day"):
+    """
+    :return: lowest, highest and average price, volume and number of sales
+    of every period since `since`. The average is weighted by the number of
+    sales of each day
+    """
+    sold = Q(avg_price__isnull=False, quantity__gt=0)
+    return list(
+        collection.price_records.filter(timestamp__gte=since)
+        .annotate(date=_trunc(period))
+        .values("date")
+        .annotate(
+            min_price=Min("min_price"),
+            max_price=Max("max_price"),
+            avg_price=ExpressionWrapper(
+                Sum(F("avg_price") * F("quantity"), filter=sold)
+                / NullIf(Sum("quantity", filter=sold), 0),
+                output_field=FloatField(),
+            ),
+            volume=Sum("volume"),
+            quantity=Sum("quantity"),
+        )
+        .order_by("date")
+    )
+
+
+def get_owners_history(collection, since, period="day"):
+    """
+    :return: highest number of owners of every period since `since`
+    """
+    return list(
+        collection.owners_records.filter(timestamp__gte=since)
+        .annotate(date=_trunc(period))
+        .values("date")
+        .annotate(owners_count=Max("owners_count"))
+        .order_by("date")
+    )
+
+
+def _data_point_value(value):
+    return "" if value is None else str(value)
+
+
+def _data_points(records, days, fields):
+    since = timezone.now() - datetime.timedelta(days=days)
+    return [
+        {
+            "timestamp": record["timestamp"]
+            .astimezone(datetime.timezone.utc)
+            .strftime("%Y-%m-%dT%H:%M:%SZ"),
+            **{key: _data_point_value(record[field]) for key, field in fields.items()},
+        }
+        for record in records.filter(timestamp__gte=since)
+        .order_by("timestamp")
+        .values("timestamp", *fields.values())
+    ]
+
+
+def get_price_data_points(collection_id, days=30):
+    """
+    :return: the daily prices of the last `days` days as Mnemonic data points
+    """
+    return _data_points(
+        CollectionPriceRecord.objects.filter(collection_id=collection_id),
+        days,
+        {
+            "min": "min_price",
+            "max": "max_price",
+            "avg": "avg_price",
+            "volume": "volume",
+            "quantity": "quantity",
+        },
+    )
+
+
+def get_owners_data_points(collection_id, days=30):
+    """
+    :return: the daily number of owners of the last `days` days as Mnemonic
+    data points
+    """
+    return _data_points(
+        CollectionOwnersRecord.objects.filter(collection_id=collection_id),
+        days,
+        {"count": "owners_count"},
+    )
@@ -0,0 +1,132 @@
+"""
+Refresh of the CollectionMetrics of many collections at once.
+
+Fetching statistics from NFTPort is network bound, so it runs in a thread
+pool sized to the NFTPort rate budget (the client's rate limited session is
+shared between the threads). A failing contract is logged and skipped
+instead of stopping the refresh. Once everything is fetched the metrics are
+written with one upsert and contracts NFTPort doesn't know are marked
+unsupported with one update.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from ryft.core.db import bulk_upsert
+from ryft.core.holdings import refresh_holding_floor_values
+from ryft.core.integrations.errors import NFTPortContractNotFound
+from ryft.core.integrations.nftport import nftport_client
+from ryft.core.models import APICallRecordLog, Collection, CollectionMetrics
+
+# CollectionMetrics field of every NFTPort statistic
+STATISTICS = {
+    "current_floor_price": "floor_price",
+    "average_price_24hr": "one_day_average_price",
+    "average_sales_24hr": "one_day_sales",
+    "average_volume_24hr": "one_day_volume",
+}
+
+
+@dataclass
+class MetricsResult:
+    updated: list = field(default_factory=list)
+    unsupported: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+
+    def __str__(self):
+        return (
+            f"{len(self.updated)} updated, {len(self.unsupported)} unsupported, "
+            f"{len(self.failed)} failed"
+        )
+
+
+def _fetch_statistics(contract_address):
+    return nftport_client.get_contract_statistics(contract_address).get("statistics")
+
+
+def fetch_statistics(contract_addresses, workers=None):
+    """
+    Fetch the NFTPort statistics of many contracts concurrently
+
+    :param workers: concurrent requests, defaults to NFTPort's requests per second
+    :return: the statistics by contract address, the contracts NFTPort doesn't
+    know and the contracts that failed
+    """
+    workers = workers or nftport_client.requests_per_second
+
+    statistics = {}
+    unsupported = []
+    failed = []
+    with ThreadPoolExecutor(workers) as pool:
+        futures = {
+            contract_address: pool.submit(_fetch_statistics, contract_address)
+            for contract_address in contract_addresses
+        }
+        for contract_address, future in futures.items():
+            try:
+                data = future.result()
+            except NFTPortContractNotFound:
+                unsupported.append(contract_address)
+            except Exception:
+                logging.exception(
+                    msg=f"Failed to fetch statistics for contract: {contract_address}"
+                )
+                failed.append(contract_address)
+            else:
+                if data:
+                    statistics[contract_address] = data
+
+    return statistics, unsupported, failed
+
+
+def refresh_collection_metrics(collections=None, workers=None):
+    """
+    Fetch the statistics of the collections and store them in their
+    CollectionMetrics, then revalue the holdings of the updated collections
+
+    :param collections: defaults to every released collection NFTPort supports
+    :return: the contracts updated, marked unsupported and failed
+    """
+    if collections is None:
+        collections = Collection.objects.filter(
+            released=True, nftport_unsupported=False
+        )
+    collection_ids = dict(collections.values_list("contract_address", "id"))
+
+    statistics, unsupported, failed = fetch_statistics(collection_ids, workers)
+
+    now = timezone.now()
+    metrics = [
+        CollectionMetrics(
+            collection_id=collection_ids[contract_address],
+            last_fetched=now,
+            **{metric: data.get(statistic) for metric, statistic in STATISTICS.items()},
+        )
+        for contract_address, data in statistics.items()
+    ]
+    with transaction.atomic():
+        bulk_upsert(
+            CollectionMetrics,
+            metrics,
+            conflict_fields=["collection"],
+            update_fields=[*STATISTICS, "last_fetched"],
+        )
+        Collection.objects.filter(contract_address__in=unsupported).update(
+            nftport_unsupported=True
+        )
+        APICallRecordLog.objects.bulk_create(
+            [
+                APICallRecordLog(client="nftport", service="fetch_nftport_statistics")
+                for _ in range(len(collection_ids) - len(unsupported) - len(failed))
+            ],
+            batch_size=1000,
+        )
+
+    refresh_holding_floor_values(statistics)
+
+    return MetricsResult(
+        updated=list(statistics), unsupported=unsupported, failed=failed
+    )
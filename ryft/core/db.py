@@ -0,0 +1,147 @@
+from django.db import connection
+from psycopg2.extras import execute_values
+
+
+def _cast_template(fields):
+    casts = ", ".join(f"%s::{field.cast_db_type(connection)}" for field in fields)
+    return f"({casts})"
+
+
+def _insert_rows(fields, objs):
+    return [
+        tuple(
+            field.get_db_prep_save(field.pre_save(obj, True), connection)
+            for field in fields
+        )
+        for obj in objs
+    ]
+
+
+def bulk_update_values(model, rows, fields, key="id", page_size=1000):
+    """
+    Update many rows with a single ``UPDATE ... FROM (VALUES ...)`` statement
+    per page instead of one CASE expression per 100 rows like ``bulk_update``.
+
+    :param model: the model class to update
+    :param rows: list of tuples ordered as ``(key, *fields)``
+    :param fields: names of the fields being updated
+    :param key: name of the field used to match rows
+    :return: number of rows sent to the database
+    """
+    if not rows:
+        return 0
+
+    qn = connection.ops.quote_name
+    opts = model._meta
+    key_field = opts.get_field(key)
+    update_fields = [opts.get_field(name) for name in fields]
+    columns = [key_field] + update_fields
+
+    assignments = ", ".join(
+        f"{qn(field.column)} = v.{qn(field.column)}" for field in update_fields
+    )
+    column_names = ", ".join(qn(field.column) for field in columns)
+    sql = (
+        f"UPDATE {qn(opts.db_table)} AS t SET {assignments} "
+        f"FROM (VALUES %s) AS v({column_names}) "
+        f"WHERE t.{qn(key_field.column)} = v.{qn(key_field.column)}"
+    )
+
+    with connection.cursor() as cursor:
+        execute_values(
+            cursor, sql, rows, template=_cast_template(columns), page_size=page_size
+        )
+
+    return len(rows)
+
+
+def bulk_upsert(
+    model,
+    objs,
+    conflict_fields,
+    update_fields,
+    changed_field=None,
+    returning=None,
+    page_size=1000,
+):
+    """
+    Insert model instances with ``INSERT ... ON CONFLICT DO UPDATE``.
+
+    :param conflict_fields: fields of the unique constraint the rows conflict on
+    :param update_fields: fields overwritten when the row already exists
+    :param changed_field: only update existing rows where this field differs
+    :param returning: fields to return for every inserted or updated row
+    :return: list of tuples of the `returning` fields
+    """
+    if not objs:
+        return []
+
+    qn = connection.ops.quote_name
+    opts = model._meta
+    table = qn(opts.db_table)
+    fields = [field for field in opts.concrete_fields if not field.primary_key]
+
+    def column(name):
+        return qn(opts.get_field(name).column)
+
+    column_names = ", ".join(qn(field.column) for field in fields)
+    assignments = ", ".join(
+        f"{column(name)} = EXCLUDED.{column(name)}" for name in update_fields
+    )
+    sql = (
+        f"INSERT INTO {table} ({column_names}) VALUES %s "
+        f"ON CONFLICT ({', '.join(column(name) for name in conflict_fields)}) "
+        f"DO UPDATE SET {assignments}"
+    )
+    if changed_field:
+        sql += (
+            f" WHERE {table}.{column(changed_field)} "
+            f"IS DISTINCT FROM EXCLUDED.{column(changed_field)}"
+        )
+    if returning:
+        sql += f" RETURNING {', '.join(column(name) for name in returning)}"
+
+    with connection.cursor() as cursor:
+        result = execute_values(
+            cursor,
+            sql,
+            _insert_rows(fields, objs),
+            template=_cast_template(fields),
+            page_size=page_size,
+            fetch=bool(returning),
+        )
+
+    return result or []
+
+
+def bulk_insert_ignore(model, objs, page_size=1000):
+    """
+    Insert model instances with ``INSERT ... ON CONFLICT DO NOTHING``, one
+    statement per page. Rows that violate any unique constraint are skipped.
+
+    :return: number of rows inserted
+    """
+    if not objs:
+        return 0
+
+    qn = connection.ops.quote_name
+    opts = model._meta
+    fields = [field for field in opts.concrete_fields if not field.primary_key]
+    column_names = ", ".join(qn(field.column) for field in fields)
+    pk_column = qn(opts.pk.column)
+    sql = (
+        f"INSERT INTO {qn(opts.db_table)} ({column_names}) VALUES %s "
+        f"ON CONFLICT DO NOTHING RETURNING {pk_column}"
+    )
+
+    with connection.cursor() as cursor:
+        inserted = execute_values(
+            cursor,
+            sql,
+            _insert_rows(fields, objs),
+            template=_cast_template(fields),
+            page_size=page_size,
+            fetch=True,
+        )
+
+    return len(inserted)
@@ -0,0 +1,115 @@
+"""
+Maintenance of the WalletHolding summary table.
+
+Holdings are recomputed per wallet from its WalletNFTs whenever they change,
+so reading what a wallet holds is a lookup on a small table instead of an
+aggregate over every NFT it owns. Floor values are refreshed separately when
+collection metrics change.
+"""
+from django.db import connection, transaction
+
+from ryft.core.models import (
+    Collection,
+    CollectionMetrics,
+    Wallet,
+    WalletHolding,
+    WalletNFT,
+)
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _insert_holdings(where="", params=()):
+    sql = (
+        f"INSERT INTO {_table(WalletHolding)} "
+        "(wallet_id, contract_address, collection_id, count, floor_value) "
+        "SELECT wn.wallet_id, wn.nft_raw_data ->> 'contract_address', c.id, "
+        "COUNT(*), COUNT(*) * COALESCE(m.current_floor_price, 0) "
+        f"FROM {_table(WalletNFT)} AS wn "
+        f"LEFT JOIN {_table(Collection)} AS c "
+        "ON c.contract_address = wn.nft_raw_data ->> 'contract_address' "
+        f"LEFT JOIN {_table(CollectionMetrics)} AS m ON m.collection_id = c.id "
+        "WHERE wn.nft_raw_data ->> 'contract_address' IS NOT NULL "
+        f"{where} "
+        "GROUP BY wn.wallet_id, wn.nft_raw_data ->> 'contract_address', c.id, "
+        "m.current_floor_price"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def refresh_wallet_holdings(wallet_ids):
+    """
+    Recompute the holdings of the given wallets from their WalletNFTs
+
+    :return: number of holdings stored
+    """
+    wallet_ids = list(wallet_ids)
+    if not wallet_ids:
+        return 0
+
+    with transaction.atomic():
+        # Refreshes of the same wallet would both delete its holdings before
+        # either inserts, so they take turns. Locking in id order keeps
+        # overlapping batches from deadlocking
+        wallet_ids = list(
+            Wallet.objects.select_for_update()
+            .filter(id__in=wallet_ids)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        WalletHolding.objects.filter(wallet_id__in=wallet_ids).delete()
+        return _insert_holdings("AND wn.wallet_id = ANY(%s)", [wallet_ids])
+
+
+def rebuild_holdings():
+    """
+    Recompute the holdings of every wallet
+
+    :return: number of holdings stored
+    """
+    with transaction.atomic():
+        # Wait for the wallet refreshes in progress and hold off new ones
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"LOCK TABLE {_table(WalletHolding)} IN SHARE ROW EXCLUSIVE MODE"
+            )
+        WalletHolding.objects.all().delete()
+        return _insert_holdings()
+
+
+def refresh_holding_floor_values(contract_addresses=None):
+    """
+    Link holdings to their collection and value them at the current floor
+    price. Only holdings whose collection or value changes are written.
+
+    :param contract_addresses: only refresh the holdings of these collections
+    :return: number of holdings updated
+    """
+    where = ""
+    params = []
+    if contract_addresses is not None:
+        where = "WHERE h.contract_address = ANY(%s)"
+        params = [list(contract_addresses)]
+
+    sql = (
+        f"UPDATE {_table(WalletHolding)} AS t "
+        "SET collection_id = v.collection_id, floor_value = v.floor_value "
+        "FROM ("
+        "SELECT h.id, c.id AS collection_id, "
+        "h.count * COALESCE(m.current_floor_price, 0) AS floor_value "
+        f"FROM {_table(WalletHolding)} AS h "
+        f"LEFT JOIN {_table(Collection)} AS c ON c.contract_address = h.contract_address "
+        f"LEFT JOIN {_table(CollectionMetrics)} AS m ON m.collection_id = c.id "
+        f"{where}"
+        ") AS v "
+        "WHERE t.id = v.id "
+        "AND (t.collection_id IS DISTINCT FROM v.collection_id "
+        "OR t.floor_value IS DISTINCT FROM v.floor_value)"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
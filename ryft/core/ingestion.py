@@ -0,0 +1,147 @@
+"""
+Bulk ingestion of many collections at once.
+
+Fetching NFTs and creating their attributes is network bound, so it runs in
+a thread pool sized to the Alchemy rate budget (the client's limiter session
+is shared between the threads). Ranking is CPU bound, so each fetched
+collection is handed to a process pool. Collections are grouped in shards and
+the NFTs of a shard are linked to transactions and wallets as soon as the
+whole shard is done.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+
+import django
+from django.db import connection
+
+from ryft.core.integrations.alchemy import get_alchemy_client
+from ryft.core.linking import link_transactions, link_wallet_nfts
+from ryft.core.tasks import create_nft_attributes, fetch_nfts, rank_nfts
+
+FETCH = "fetch"
+RANK = "rank"
+
+
+@dataclass
+class ShardProgress:
+    shard: int
+    contract_addresses: list
+    fetched: int = 0
+    ranked: int = 0
+    failed: list = field(default_factory=list)
+
+    @property
+    def done(self):
+        return self.ranked + len(self.failed) == len(self.contract_addresses)
+
+    def __str__(self):
+        return (
+            f"Shard {self.shard}: {self.fetched}/{len(self.contract_addresses)} "
+            f"fetched, {self.ranked} ranked, {len(self.failed)} failed"
+        )
+
+
+def _fetch_collection(contract_address):
+    fetch_nfts(contract_address)
+    create_nft_attributes(contract_address)
+
+
+def _rank_collection(contract_address):
+    rank_nfts(contract_address)
+
+
+def _link_shard(shard: ShardProgress):
+    contract_addresses = [
+        contract_address
+        for contract_address in shard.contract_addresses
+        if contract_address not in shard.failed
+    ]
+    link_transactions(contract_addresses)
+    link_wallet_nfts(contract_addresses)
+
+
+def ingest_collections(
+    contract_addresses,
+    shard_size=50,
+    fetch_workers=None,
+    rank_workers=None,
+    on_progress=None,
+):
+    """
+    Fetch, rank and link many collections concurrently
+
+    :param fetch_workers: concurrent fetches, defaults to Alchemy's requests per second
+    :param rank_workers: rank processes, defaults to the number of CPUs
+    :param on_progress: called with a ShardProgress whenever a shard advances
+    :return: the progress of every shard
+    """
+    fetch_workers = fetch_workers or get_alchemy_client().requests_per_second
+    rank_workers = rank_workers or os.cpu_count()
+    on_progress = on_progress or (lambda progress: logging.info(msg=str(progress)))
+
+    shards = [
+        ShardProgress(shard=index + 1, contract_addresses=chunk)
+        for index, chunk in enumerate(
+            contract_addresses[pos : pos + shard_size]  # noqa
+            for pos in range(0, len(contract_addresses), shard_size)
+        )
+    ]
+    shard_by_address = {
+        contract_address: shard
+        for shard in shards
+        for contract_address in shard.contract_addresses
+    }
+
+    # Spawned processes set up Django themselves instead of inheriting this
+    # process's database connections and threads
+    rank_context = multiprocessing.get_context("spawn")
+    with ThreadPoolExecutor(fetch_workers) as fetch_pool, ProcessPoolExecutor(
+        rank_workers, mp_context=rank_context, initializer=django.setup
+    ) as rank_pool:
+        pending = {
+            fetch_pool.submit(_fetch_collection, contract_address): (
+                FETCH,
+                contract_address,
+            )
+            for contract_address in contract_addresses
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                step, contract_address = pending.pop(future)
+                shard = shard_by_address[contract_address]
+                try:
+                    future.result()
+                except Exception:
+                    logging.exception(
+                        msg=f"Failed to {step} NFTs for contract: {contract_address}"
+                    )
+                    shard.failed.append(contract_address)
+                else:
+                    if step == FETCH:
+                        shard.fetched += 1
+                        future = rank_pool.submit(_rank_collection, contract_address)
+                        pending[future] = (RANK, contract_address)
+                    else:
+                        shard.ranked += 1
+
+                if shard.done:
+                    try:
+                        _link_shard(shard)
+                    except Exception:
+                        logging.exception(
+                            msg=f"Failed to link NFTs for shard {shard.shard}"
+                        )
+                on_progress(shard)
+
+    connection.close()
+
+    return shards
@@ -1,14 +1,19 @@
+import asyncio
+from collections.abc import Mapping
+
+import httpx
 import requests
 from django.conf import settings
-from requests_ratelimiter import LimiterSession
 from retry import retry
 
+from .cache import CachedSession
 from .errors import (
     AlchemyCollectionNFTsError,
     AlchemyFloorPriceError,
     AlchemyRateLimitError,
     AlchemyWalletNFTsError,
 )
+from .ratelimit import RateLimitedSession, TokenBucket, parse_retry_after
 
 
 class AlchemyClient:
@@ -22,8 +27,12 @@ class AlchemyClient:
         self._url = f"https://eth-mainnet.alchemyapi.io/nft/v2/{self.api_key}"
         self._dashboard_url = "https://dashboard.alchemyapi.io/api"
         # TODO monitor this because in the future there will be higher rate limits
-        self.session = LimiterSession(per_second=25)
-        self.alchemy_session = LimiterSession(per_second=3)
+        self.requests_per_second = 25
+        self.session = CachedSession(
+            RateLimitedSession("alchemy", per_second=self.requests_per_second),
+            ttls={r"/getFloorPrice/": 60 * 10},
+        )
+        self.alchemy_session = RateLimitedSession("alchemy_transfers", per_second=3)
 
     def get_nfts_for_wallet(self, wallet_address, page=None):
         params = {"owner": wallet_address, "pageKey": page}
@@ -193,6 +202,173 @@ class AlchemyClient:
         return data
 
 
+class AsyncAlchemyClient:
+    """
+    asyncio variant of AlchemyClient for driving many collections or wallets
+    from one process. Requests share one connection pool and the same rate
+    budgets as AlchemyClient, and are retried with backoff when rate limited.
+
+    Use it as ``async with AsyncAlchemyClient() as client:`` inside one event loop.
+    """
+
+    def __init__(self, max_connections=50):
+        self.api_key = settings.ALCHEMY_API_KEY
+        self._url = f"https://eth-mainnet.alchemyapi.io/nft/v2/{self.api_key}"
+        self._rpc_url = f"https://eth-mainnet.alchemyapi.io/v2/{self.api_key}"
+        self.requests_per_second = 25
+        self.bucket = TokenBucket("alchemy", self.requests_per_second)
+        self.transfers_bucket = TokenBucket("alchemy_transfers", 3)
+        self.client = httpx.AsyncClient(
+            headers={"Accept": "application/json"},
+            limits=httpx.Limits(max_connections=max_connections),
+            timeout=30,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.client.aclose()
+
+    async def _request(
+        self, bucket, method, url, delay=2, tries=3, backoff=2, **kwargs
+    ):
+        """
+        Send a request once the bucket has a token, retrying on HTTP 429 or a
+        JSON-RPC 429 error
+
+        :return: the decoded JSON response
+        """
+        for attempt in range(tries):
+            await bucket.aacquire()
+            response = await self.client.request(method, url, **kwargs)
+
+            if response.status_code != 429:
+                data = response.json()
+                error = data.get("error")
+                if not (isinstance(error, Mapping) and error.get("code") == 429):
+                    return data
+
+            retry_after = response.headers.get("Retry-After")
+            wait = parse_retry_after(retry_after) if retry_after else delay
+            # Slow down every worker sharing the bucket
+            bucket.penalize(wait)
+            if attempt < tries - 1:
+                await asyncio.sleep(wait)
+                delay *= backoff
+
+        raise AlchemyRateLimitError()
+
+    @staticmethod
+    async def _iter_pages(fetch_page, next_page_key):
+        """
+        Yield pages while the next one is already being fetched
+
+        :param fetch_page: coroutine function taking a page key, None for the first page
+        :param next_page_key: returns the key of the page after the given one
+        """
+        next_page = asyncio.ensure_future(fetch_page(None))
+        try:
+            while next_page is not None:
+                page = await next_page
+                key = next_page_key(page)
+                next_page = asyncio.ensure_future(fetch_page(key)) if key else None
+                yield page
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def get_nfts_for_wallet(self, wallet_address, page=None):
+        params = {"owner": wallet_address}
+        if page:
+            params["pageKey"] = page
+        data = await self._request(
+            self.bucket, "GET", f"{self._url}/getNFTs/", params=params
+        )
+
+        if data.get("error", None):
+            raise AlchemyWalletNFTsError
+
+        return data
+
+    async def get_nfts_for_collection(self, contract_address, start_token=None):
+        params = {
+            "contractAddress": contract_address,
+            "withMetadata": True,
+            "limit": 100,
+            "tokenUriTimeoutInMs": 0,
+        }
+        if start_token:
+            params["startToken"] = start_token
+        data = await self._request(
+            self.bucket, "GET", f"{self._url}/getNFTsForCollection", params=params
+        )
+
+        if data.get("error", None):
+            raise AlchemyCollectionNFTsError
+
+        return data
+
+    async def get_floor_price(self, contract_address):
+        params = {"contractAddress": contract_address}
+        data = await self._request(
+            self.bucket, "GET", f"{self._url}/getFloorPrice/", params=params
+        )
+
+        opensea_error = data["openSea"].get("error", None)
+        looksrare_error = data["looksRare"].get("error", None)
+
+        if opensea_error and looksrare_error:
+            raise AlchemyFloorPriceError
+
+        return data
+
+    async def get_collection_transactions(
+        self, contract_addresses, last_block=0, page=None
+    ):
+        params = {
+            "fromBlock": hex(int(last_block)),
+            "toBlock": "latest",
+            "category": ["erc721", "erc1155"],
+            "withMetadata": True,
+            "contractAddresses": contract_addresses,
+            "maxCount": "0x3e8",  # 1000 transactions
+        }
+
+        if page:
+            params["pageKey"] = page
+
+        payload = {
+            "id": 1,
+            "jsonrpc": "2.0",
+            "method": "alchemy_getAssetTransfers",  # 150 CUPS
+            "params": [params],
+        }
+        return await self._request(
+            self.transfers_bucket, "POST", self._rpc_url, json=payload
+        )
+
+    def iter_nfts_for_collection(self, contract_address):
+        return self._iter_pages(
+            lambda key: self.get_nfts_for_collection(contract_address, start_token=key),
+            lambda data: data.get("nextToken") if data["nfts"] else None,
+        )
+
+    def iter_nfts_for_wallet(self, wallet_address):
+        return self._iter_pages(
+            lambda key: self.get_nfts_for_wallet(wallet_address, page=key),
+            lambda data: data.get("pageKey"),
+        )
+
+    def iter_collection_transactions(self, contract_addresses, last_block=0):
+        return self._iter_pages(
+            lambda key: self.get_collection_transactions(
+                contract_addresses, last_block=last_block, page=key
+            ),
+            lambda data: data.get("result", {}).get("pageKey"),
+        )
+
+
 alchemy_client = AlchemyClient()
 
 
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import re
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from requests.structures import CaseInsensitiveDict
+
+HIT = "hits"
+MISS = "misses"
+REVALIDATED = "revalidated"
+
+KEY_PREFIX = "integrations"
+
+# Stale responses are kept this long after their TTL so they can be
+# revalidated with a conditional request instead of downloaded again
+STALE_TTL = 60 * 60 * 24
+
+VALIDATOR_HEADERS = ("ETag", "Last-Modified")
+
+
+class CachedSession:
+    """
+    Wraps a requests session and serves the GET responses of the configured
+    endpoints from the Django cache.
+
+    Endpoints are regular expressions searched in the request URL, each with
+    its own TTL in seconds. TTLs can be overridden per endpoint with the
+    `INTEGRATIONS_CACHE_TTLS` setting. Every other request goes straight to
+    the wrapped session.
+    """
+
+    def __init__(self, session, ttls, cache_alias=None):
+        self.session = session
+        self.ttls = {**ttls, **getattr(settings, "INTEGRATIONS_CACHE_TTLS", {})}
+        self.endpoints = {endpoint: re.compile(endpoint) for endpoint in self.ttls}
+        self.cache_alias = cache_alias or getattr(
+            settings, "INTEGRATIONS_CACHE_ALIAS", "default"
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    @property
+    def cache(self):
+        alias = self.cache_alias if self.cache_alias in settings.CACHES else "default"
+        return caches[alias]
+
+    def get_endpoint(self, url):
+        for endpoint, pattern in self.endpoints.items():
+            if pattern.search(url):
+                return endpoint
+
+    def get(self, url, params=None, **kwargs):
+        endpoint = self.get_endpoint(url)
+        if endpoint is None or not self.ttls[endpoint]:
+            return self.session.get(url, params=params, **kwargs)
+
+        key = self.make_key(url, params)
+        entry = self.cache.get(key)
+        if entry and entry["expires"] > time.time():
+            self.count(endpoint, HIT)
+            return self.build_response(entry)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry:
+            if entry["headers"].get("ETag"):
+                headers["If-None-Match"] = entry["headers"]["ETag"]
+            if entry["headers"].get("Last-Modified"):
+                headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+        response = self.session.get(url, params=params, headers=headers, **kwargs)
+
+        if entry and response.status_code == 304:
+            self.count(endpoint, REVALIDATED)
+            self.store(key, endpoint, entry)
+            return self.build_response(entry)
+
+        self.count(endpoint, MISS)
+        if self.is_cacheable(response):
+            self.store(
+                key,
+                endpoint,
+                {
+                    "status_code": response.status_code,
+                    "content": response.content,
+                    "headers": {
+                        name: response.headers[name]
+                        for name in ("Content-Type", *VALIDATOR_HEADERS)
+                        if name in response.headers
+                    },
+                    "url": response.url,
+                },
+            )
+        return response
+
+    @staticmethod
+    def make_key(url, params):
+        # The url is hashed because some providers put the API key in it
+        request = json.dumps([url, params], sort_keys=True, default=str)
+        return f"{KEY_PREFIX}:response:{hashlib.sha1(request.encode()).hexdigest()}"
+
+    @staticmethod
+    def is_cacheable(response):
+        """
+        Only successful responses are cached, including providers that
+        report errors in the body of a 200
+        """
+        if response.status_code != 200:
+            return False
+        try:
+            data = response.json()
+        except ValueError:
+            return False
+        return not (isinstance(data, dict) and data.get("error"))
+
+    def store(self, key, endpoint, entry):
+        ttl = self.ttls[endpoint]
+        entry["expires"] = time.time() + ttl
+        has_validators = any(entry["headers"].get(h) for h in VALIDATOR_HEADERS)
+        self.cache.set(key, entry, timeout=ttl + (STALE_TTL if has_validators else 0))
+
+    @staticmethod
+    def build_response(entry):
+        response = requests.Response()
+        response.status_code = entry["status_code"]
+        response._content = entry["content"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.url = entry["url"]
+        response.encoding = "utf-8"
+        response.from_cache = True
+        return response
+
+    def count(self, endpoint, outcome):
+        key = f"{KEY_PREFIX}:stats:{endpoint}:{outcome}"
+        self.cache.add(key, 0, timeout=None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # The counter was evicted between add and incr
+            pass
+
+    def stats(self):
+        """
+        :return: hit, miss and revalidation counts of every endpoint
+        """
+        keys = {
+            f"{KEY_PREFIX}:stats:{endpoint}:{outcome}": (endpoint, outcome)
+            for endpoint in self.ttls
+            for outcome in (HIT, MISS, REVALIDATED)
+        }
+        counts = self.cache.get_many(list(keys))
+        stats = {
+            endpoint: dict.fromkeys((HIT, MISS, REVALIDATED), 0)
+            for endpoint in self.ttls
+        }
+        for key, value in counts.items():
+            endpoint, outcome = keys[key]
+            stats[endpoint][outcome] = value
+        return stats
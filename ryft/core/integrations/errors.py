@@ -14,6 +14,14 @@ class AlchemyRateLimitError(Exception):
     pass
 
 
+class MnemonicRateLimitError(Exception):
+    pass
+
+
+class MnemonicPageError(Exception):
+    pass
+
+
 class NFTPortContractStatisticsError(Exception):
     pass
 
@@ -1,9 +1,14 @@
-import time
+import asyncio
 
 from django.conf import settings
-from requests_ratelimiter import LimiterSession
 from retry import retry
 
+from .cache import CachedSession
+from .errors import MnemonicPageError, MnemonicRateLimitError
+from .ratelimit import RateLimitedSession
+
+RETRY_ERRORS = (ConnectionResetError, MnemonicRateLimitError)
+
 
 class TrendingBy:
     sales = "by_sales_count"
@@ -11,6 +16,13 @@ class TrendingBy:
     price = "by_avg_price"
 
 
+class Duration:
+    day = "DURATION_1_DAY"
+    week = "DURATION_7_DAYS"
+    month = "DURATION_30_DAYS"
+    year = "DURATION_365_DAYS"
+
+
 class MnemonicClient:
     """
     Client for implementing API calls to Mnemonic service
@@ -19,10 +31,99 @@ class MnemonicClient:
     def __init__(self):
         self.api_key = settings.MNEMONIC_API_KEY
         self._url = "https://ethereum.rest.mnemonichq.com"
-        self.session = LimiterSession(per_second=25)
+        self.session = CachedSession(
+            RateLimitedSession("mnemonic", per_second=25),
+            ttls={
+                r"/collections/v1beta1/owners_count/": 60 * 60 * 12,
+                r"/pricing/v1beta1/prices/by_contract/": 60 * 60 * 12,
+                r"/collections/v1beta1/top/": 60 * 15,
+                r"/ens/v1beta1/entity/by_address/": 60 * 60 * 24,
+                r"/tokens/v1beta1/token/.+/metadata": 60 * 60 * 24,
+            },
+        )
         self.max_retries = 3
 
-    @retry(ConnectionResetError, delay=10, tries=7)
+    def _get(self, url, **kwargs):
+        response = self.session.get(url, **kwargs)
+        if response.status_code == 429:
+            raise MnemonicRateLimitError()
+        return response.json()
+
+    @staticmethod
+    def _iter_pages(get_page, results_key, limit=500, **kwargs):
+        """
+        Yield the results of an offset paginated endpoint one page at a time,
+        stopping after the first short page
+
+        :param get_page: client method taking `limit` and `offset`
+        :param results_key: key of the results list in the response
+        """
+        offset = 0
+        while True:
+            data = get_page(limit=limit, offset=offset, **kwargs)
+            error = data.get("error")
+            if error:
+                raise MnemonicPageError(error)
+
+            results = data.get(results_key) or []
+            if results:
+                yield results
+            if len(results) < limit:
+                return
+            offset += limit
+
+    def iter_wallet_nfts(self, wallet_address: str, limit: int = 500):
+        return self._iter_pages(
+            self.get_wallet_nfts, "tokens", limit, wallet_address=wallet_address
+        )
+
+    def iter_collection_transfers(
+        self, contract_address: str, limit: int = 500, timestamp__gt=None
+    ):
+        """
+        Yield the transfers of a contract after `timestamp__gt` one page at a
+        time, oldest first.
+
+        Pages are requested with a block timestamp cursor instead of a growing
+        offset. Transfers sharing the last timestamp of a page may continue on
+        the next one, so the cursor stays on the timestamp before them and the
+        offset skips the ones already seen.
+        """
+        cursor = timestamp__gt
+        offset = 0
+        while True:
+            data = self.get_collection_transfers(
+                contract_address, limit=limit, offset=offset, timestamp__gt=cursor
+            )
+            error = data.get("error")
+            if error:
+                raise MnemonicPageError(error)
+
+            transfers = data.get("nftTransfers") or []
+            if transfers:
+                yield transfers
+            if len(transfers) < limit:
+                return
+
+            timestamps = [
+                transfer["blockchainEvent"]["blockTimestamp"] for transfer in transfers
+            ]
+            ties = timestamps.count(timestamps[-1])
+            if ties == len(timestamps):
+                offset += ties
+            else:
+                cursor = timestamps[-ties - 1]
+                offset = ties
+
+    def iter_collection_nfts(self, contract_address: str, limit: int = 500):
+        return self._iter_pages(
+            self.get_collection_nfts,
+            "tokens",
+            limit,
+            contract_address=contract_address,
+        )
+
+    @retry(RETRY_ERRORS, delay=10, tries=7)
     def get_wallet_nfts(self, wallet_address: str, limit: int = 500, offset: int = 0):
         url = f"{self._url}/tokens/v1beta1/by_owner/{wallet_address}"
         query = {
@@ -35,13 +136,9 @@ class MnemonicClient:
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
-        time.sleep(0.01)
-        response = self.session.get(url, headers=headers, params=query)
+        return self._get(url, headers=headers, params=query)
 
-        data = response.json()
-        return data
-
-    @retry(ConnectionResetError, delay=5, tries=3)
+    @retry(RETRY_ERRORS, delay=5, tries=3, backoff=2)
     def get_collection_transfers(
         self,
         contract_address: str,
@@ -68,16 +165,14 @@ class MnemonicClient:
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
-        time.sleep(0.01)
-        response = self.session.get(url, headers=headers, params=query)
-
-        data = response.json()
-        return data
+        return self._get(url, headers=headers, params=query)
 
-    @retry(ConnectionResetError, delay=5, tries=3)
-    def get_historical_collection_owners(self, contract_address):
+    @retry(RETRY_ERRORS, delay=5, tries=3, backoff=2)
+    def get_historical_collection_owners(
+        self, contract_address, duration: str = Duration.month
+    ):
         params = {
-            "duration": "DURATION_30_DAYS",
+            "duration": duration,
             "groupByPeriod": "GROUP_BY_PERIOD_1_DAY",
         }
         url = f"{self._url}/collections/v1beta1/owners_count/{contract_address}"
@@ -86,15 +181,14 @@ class MnemonicClient:
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
-        time.sleep(0.01)
-        response = self.session.get(url, params=params, headers=headers)
-        data = response.json()
-        return data
+        return self._get(url, headers=headers, params=params)
 
-    @retry(ConnectionResetError, delay=5, tries=3)
-    def get_historical_price_history(self, contract_address):
+    @retry(RETRY_ERRORS, delay=5, tries=3, backoff=2)
+    def get_historical_price_history(
+        self, contract_address, duration: str = Duration.month
+    ):
         params = {
-            "duration": "DURATION_30_DAYS",
+            "duration": duration,
             "groupByPeriod": "GROUP_BY_PERIOD_1_DAY",
         }
         url = f"{self._url}/pricing/v1beta1/prices/by_contract/{contract_address}"
@@ -103,12 +197,9 @@ class MnemonicClient:
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
-        time.sleep(0.01)
-        response = self.session.get(url, params=params, headers=headers)
-        data = response.json()
-        return data
+        return self._get(url, headers=headers, params=params)
 
-    @retry(ConnectionResetError, delay=5, tries=3)
+    @retry(RETRY_ERRORS, delay=5, tries=3, backoff=2)
     def get_trending_collections(
         self, by: str = TrendingBy.sales, limit: int = 500, offset: int = 0
     ):
@@ -123,12 +214,9 @@ class MnemonicClient:
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
-        time.sleep(0.01)
-        response = self.session.get(url, headers=headers, params=query)
-        data = response.json()
-        return data
+        return self._get(url, headers=headers, params=query)
 
-    @retry(ConnectionResetError, delay=5, tries=3)
+    @retry(RETRY_ERRORS, delay=5, tries=3, backoff=2)
     def get_ens_domains(self, wallet_address):
         url = f"{self._url}/ens/v1beta1/entity/by_address/{wallet_address}"
 
@@ -137,12 +225,9 @@ class MnemonicClient:
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
-        time.sleep(0.01)
-        response = self.session.get(url, headers=headers)
-        data = response.json()
-        return data
+        return self._get(url, headers=headers)
 
-    @retry(ConnectionResetError, delay=5, tries=3)
+    @retry(RETRY_ERRORS, delay=5, tries=3, backoff=2)
     def get_collection_nfts(self, contract_address, limit: int, offset: int):
         url = f"{self._url}/tokens/v1beta1/by_contract/{contract_address}"
 
@@ -158,12 +243,9 @@ class MnemonicClient:
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
-        time.sleep(0.01)
-        response = self.session.get(url, headers=headers, params=query)
-        data = response.json()
-        return data
+        return self._get(url, headers=headers, params=query)
 
-    @retry(ConnectionResetError, delay=5, tries=3)
+    @retry(RETRY_ERRORS, delay=5, tries=3, backoff=2)
     def get_token_metadata(self, contract_address: str, token_id: int):
         url = f"{self._url}/tokens/v1beta1/token/{contract_address}/{token_id}/metadata"
 
@@ -173,10 +255,20 @@ class MnemonicClient:
             "Accept": "application/json",
         }
 
-        time.sleep(0.01)
-        response = self.session.get(url, headers=headers)
-        data = response.json()
-        return data
+        return self._get(url, headers=headers)
+
+
+async def aiter_pages(pages):
+    """
+    Iterate one of the client's page generators from async code, fetching
+    each page in a worker thread so the event loop isn't blocked
+    """
+    done = object()
+    while True:
+        page = await asyncio.to_thread(next, pages, done)
+        if page is done:
+            return
+        yield page
 
 
 mnemonic_client = MnemonicClient()
@@ -1,6 +1,6 @@
 from django.conf import settings
-from requests_ratelimiter import LimiterSession
 
+from .cache import CachedSession
 from .errors import (
     NFTPortContractNotFound,
     NFTPortContractStatisticsError,
@@ -10,6 +10,7 @@ from .errors import (
     NFTPortWalletNFTsError,
     NFTPortWalletTransactionsError,
 )
+from .ratelimit import RateLimitedSession
 
 
 class NFTPortClient:
@@ -20,7 +21,11 @@ class NFTPortClient:
     def __init__(self):
         self.api_key = settings.NFTPORT_API_KEY
         self._url = "https://api.nftport.xyz/v0"
-        self.session = LimiterSession(per_second=3)
+        self.requests_per_second = 3
+        self.session = CachedSession(
+            RateLimitedSession("nftport", per_second=self.requests_per_second),
+            ttls={r"/transactions/stats/": 60 * 60 * 12},
+        )
 
     def get_wallet_nfts(self, wallet_address: str, continuation: str = None):
         params = {
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from django.conf import settings
+
+KEY_PREFIX = "ratelimit"
+
+# A rate limited response halves the rate, then every granted request adds
+# back this fraction of the configured rate
+DECREASE = 0.5
+INCREASE = 0.01
+# The rate never drops below this fraction of the configured rate
+MIN_RATE = 0.05
+
+# Wait before retrying a rate limited response without a Retry-After header
+DEFAULT_RETRY_AFTER = 1
+
+# Buckets left alone this long are dropped
+STATE_TTL = 60 * 60
+
+# Both scripts read the clock from Redis so every worker agrees on it
+ACQUIRE_SCRIPT = """
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated", "rate", "blocked_until")
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local max_rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local increase = tonumber(ARGV[3])
+
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+local rate = tonumber(state[3]) or max_rate
+local blocked_until = tonumber(state[4]) or 0
+
+if blocked_until > now then
+    return tostring(blocked_until - now)
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    rate = math.min(max_rate, rate + max_rate * increase)
+else
+    wait = (1 - tokens) / rate
+end
+
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now, "rate", rate)
+redis.call("EXPIRE", KEYS[1], ARGV[4])
+return tostring(wait)
+"""
+
+PENALIZE_SCRIPT = """
+local state = redis.call("HMGET", KEYS[1], "rate", "blocked_until")
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local max_rate = tonumber(ARGV[1])
+
+local rate = tonumber(state[1]) or max_rate
+rate = math.max(max_rate * tonumber(ARGV[3]), rate * tonumber(ARGV[2]))
+local blocked_until = math.max(tonumber(state[2]) or 0, now + tonumber(ARGV[4]))
+
+redis.call(
+    "HSET", KEYS[1], "tokens", 0, "updated", now, "rate", rate,
+    "blocked_until", blocked_until
+)
+redis.call("EXPIRE", KEYS[1], ARGV[5])
+return tostring(rate)
+"""
+
+
+def parse_retry_after(value):
+    """
+    :return: seconds to wait from a Retry-After header in seconds or as a date
+    """
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    if value.strip().isdigit():
+        return int(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+    return max(0, retry_at.timestamp() - time.time())
+
+
+def get_redis():
+    """
+    :return: the Redis client of the integrations cache, None when it isn't
+    backed by Redis
+    """
+    alias = getattr(settings, "INTEGRATIONS_CACHE_ALIAS", "default")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND", "")
+    if not backend.startswith("django_redis"):
+        return None
+
+    from django_redis import get_redis_connection
+
+    return get_redis_connection(alias)
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every worker through Redis, falling back to one
+    bucket per process when there is no Redis cache.
+
+    The rate adapts to the provider: a rate limited response halves it and
+    blocks the bucket for the Retry-After period, then it creeps back up to
+    the configured rate as requests go through. Rates can be overridden per
+    bucket name with the `INTEGRATIONS_RATE_LIMITS` setting.
+    """
+
+    _local_states = {}
+    _local_lock = threading.Lock()
+
+    def __init__(self, name, rate, capacity=1):
+        """
+        :param rate: requests per second
+        :param capacity: largest burst, 1 spaces requests evenly
+        """
+        self.name = name
+        self.rate = getattr(settings, "INTEGRATIONS_RATE_LIMITS", {}).get(name, rate)
+        self.capacity = capacity
+        self.key = f"{KEY_PREFIX}:{name}"
+        self._scripts = None
+
+    def _redis_scripts(self):
+        if self._scripts is None:
+            redis = get_redis()
+            self._scripts = {}
+            if redis:
+                self._scripts = {
+                    "take": redis.register_script(ACQUIRE_SCRIPT),
+                    "penalize": redis.register_script(PENALIZE_SCRIPT),
+                }
+        return self._scripts
+
+    def _run(self, operation, *args):
+        script = self._redis_scripts().get(operation)
+        if script:
+            try:
+                return float(script(keys=[self.key], args=[*args, STATE_TTL]))
+            except Exception:
+                logging.exception(msg=f"Rate limiter {self.name} fell back to local")
+        with self._local_lock:
+            return getattr(self, f"_local_{operation}")(*args)
+
+    def take(self):
+        """
+        Take a token if one is available
+
+        :return: seconds to wait before trying again, 0 when a token was taken
+        """
+        return self._run("take", self.rate, self.capacity, INCREASE)
+
+    def acquire(self):
+        while (wait := self.take()) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        # take() is a blocking Redis round-trip, keep it off the event loop
+        while (wait := await asyncio.to_thread(self.take)) > 0:
+            await asyncio.sleep(wait)
+
+    def penalize(self, retry_after=DEFAULT_RETRY_AFTER):
+        """
+        Slow the bucket down after a rate limited response
+
+        :return: the new rate
+        """
+        return self._run("penalize", self.rate, DECREASE, MIN_RATE, retry_after)
+
+    def _local_state(self):
+        return self._local_states.setdefault(
+            self.key,
+            {
+                "tokens": self.capacity,
+                "updated": time.monotonic(),
+                "rate": self.rate,
+                "blocked_until": 0,
+            },
+        )
+
+    def _local_take(self, max_rate, capacity, increase):
+        state = self._local_state()
+        now = time.monotonic()
+        if state["blocked_until"] > now:
+            return state["blocked_until"] - now
+
+        state["tokens"] = min(
+            capacity, state["tokens"] + (now - state["updated"]) * state["rate"]
+        )
+        state["updated"] = now
+        if state["tokens"] < 1:
+            return (1 - state["tokens"]) / state["rate"]
+
+        state["tokens"] -= 1
+        state["rate"] = min(max_rate, state["rate"] + max_rate * increase)
+        return 0
+
+    def _local_penalize(self, max_rate, decrease, min_rate, retry_after):
+        state = self._local_state()
+        now = time.monotonic()
+        state["rate"] = max(max_rate * min_rate, state["rate"] * decrease)
+        state["tokens"] = 0
+        state["updated"] = now
+        state["blocked_until"] = max(state["blocked_until"], now + retry_after)
+        return state["rate"]
+
+
+class RateLimitedSession(requests.Session):
+    """
+    requests session that takes a token from a shared TokenBucket before
+    every request.
+
+    Rate limited responses slow the bucket down for every worker and are
+    retried up to `max_retries` times. The last response is returned as is
+    when they are all rate limited.
+    """
+
+    def __init__(self, name, per_second, max_retries=3):
+        super().__init__()
+        self.bucket = TokenBucket(name, per_second)
+        self.max_retries = max_retries
+
+    def request(self, method, url, *args, **kwargs):
+        for _ in range(self.max_retries + 1):
+            self.bucket.acquire()
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code != 429:
+                break
+            self.bucket.penalize(parse_retry_after(response.headers.get("Retry-After")))
+        return response
@@ -0,0 +1,52 @@
+from django.db import connection
+
+from ryft.core.models import NFT, Collection, Transaction, WalletNFT
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def link_transactions(contract_addresses):
+    """
+    Point every wallet transaction of the given collections at its NFT with a
+    single ``UPDATE ... FROM`` join on (contract_address, token_id).
+
+    Only rows whose NFT actually changes are written.
+
+    :return: number of transactions linked
+    """
+    sql = (
+        f"UPDATE {_table(Transaction)} AS t SET nft_id = n.id "
+        f"FROM {_table(NFT)} AS n "
+        f"JOIN {_table(Collection)} AS c ON c.id = n.collection_id "
+        "WHERE c.contract_address = ANY(%s) "
+        "AND t.contract_address = c.contract_address "
+        "AND t.token_id = n.token_id "
+        "AND t.collection_only = false "
+        "AND t.nft_id IS DISTINCT FROM n.id"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(contract_addresses)])
+        return cursor.rowcount
+
+
+def link_wallet_nfts(contract_addresses):
+    """
+    Point every WalletNFT of the given collections at its NFT by joining the
+    contract address and token id stored in `nft_raw_data`.
+
+    :return: number of wallet NFTs linked
+    """
+    sql = (
+        f"UPDATE {_table(WalletNFT)} AS w SET nft_id = n.id "
+        f"FROM {_table(NFT)} AS n "
+        f"JOIN {_table(Collection)} AS c ON c.id = n.collection_id "
+        "WHERE c.contract_address = ANY(%s) "
+        "AND w.nft_raw_data -> 'contract_address' = to_jsonb(c.contract_address) "
+        "AND w.nft_raw_data ->> 'token_id' = n.token_id "
+        "AND w.nft_id IS DISTINCT FROM n.id"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(contract_addresses)])
+        return cursor.rowcount
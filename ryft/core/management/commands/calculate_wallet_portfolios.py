@@ -1,12 +1,9 @@
 from django.core.management.base import BaseCommand
 
-from ryft.core.models import Wallet
-from ryft.core.portfolio.tasks import calculate_portfolio_total
+from ryft.core.portfolio.tasks import calculate_portfolio_totals
 
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
-
-        wallets = Wallet.objects.all()
-        for wallet in wallets:
-            calculate_portfolio_total(wallet.id)
+        valued = calculate_portfolio_totals()
+        self.stdout.write(f"Calculated portfolios for {valued} wallets")
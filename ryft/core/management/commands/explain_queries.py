@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ryft.core.api.views import (
+    CollectionTransfersAPIView,
+    CollectionTransfersGraphView,
+    CollectionViewSet,
+    NFTListAPIView,
+    WalletNFTAPIView,
+    WalletTransactionsAPIView,
+)
+from ryft.core.models import Collection, Transaction, Wallet
+
+
+class Command(BaseCommand):
+    help = "Print EXPLAIN ANALYZE for the main query of each hot endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--contract-address", help="Collection to explain")
+        parser.add_argument("--wallet-address", help="Wallet to explain")
+        parser.add_argument("--page-size", type=int, default=20)
+
+    def handle(self, *args, **options):
+        contract_address = options["contract_address"] or (
+            Transaction.objects.filter(collection_only=True)
+            .values_list("contract_address", flat=True)
+            .first()
+        )
+        wallet = (
+            Wallet.objects.get(wallet_address=options["wallet_address"].lower())
+            if options["wallet_address"]
+            else Wallet.objects.filter(wallet_nfts__isnull=False).first()
+        )
+        page_size = options["page_size"]
+
+        endpoints = [("collections", CollectionViewSet, {}, {})]
+        if Collection.objects.filter(contract_address=contract_address).exists():
+            kwargs = {"contract_address": contract_address}
+            endpoints += [
+                ("collection transfers", CollectionTransfersAPIView, kwargs, {}),
+                (
+                    "collection transfers graph",
+                    CollectionTransfersGraphView,
+                    kwargs,
+                    {},
+                ),
+                ("collection nfts", NFTListAPIView, kwargs, {}),
+            ]
+        if wallet:
+            endpoints += [
+                ("wallet nfts", WalletNFTAPIView, {}, {}),
+                (
+                    "wallet nfts by collection",
+                    WalletNFTAPIView,
+                    {},
+                    {"contract_address": contract_address},
+                ),
+                ("wallet transactions", WalletTransactionsAPIView, {}, {}),
+            ]
+
+        for name, view_class, kwargs, params in endpoints:
+            queryset = self.get_view_queryset(view_class, wallet, kwargs, params)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name}:"))
+            self.stdout.write(str(queryset[:page_size].query))
+            self.stdout.write(queryset[:page_size].explain(analyze=True, buffers=True))
+            self.stdout.write("")
+
+    @staticmethod
+    def get_view_queryset(view_class, wallet, kwargs, params):
+        """
+        Build the view's own queryset so the explained query can't drift from
+        what the endpoint runs
+        """
+        request = Request(APIRequestFactory().get("/", params))
+        request.user = SimpleNamespace(wallet=wallet)
+        view = view_class(request=request, kwargs=kwargs, format_kwarg=None)
+        return view.get_queryset()
@@ -0,0 +1,65 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from ryft.core.ingestion import ingest_collections
+from ryft.core.models import Collection
+
+
+class Command(BaseCommand):
+    help = "Fetch, rank and link the NFTs of many collections concurrently"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "contract_addresses",
+            nargs="*",
+            help="Collections to ingest, defaults to every collection",
+        )
+        parser.add_argument(
+            "--csv",
+            help="Ingest the collections named in a catalogue CSV, "
+            "e.g. data/collections.csv",
+        )
+        parser.add_argument("--shard-size", type=int, default=50)
+        parser.add_argument("--fetch-workers", type=int)
+        parser.add_argument("--rank-workers", type=int)
+
+    def handle(self, *args, **options):
+        collections = Collection.objects.order_by("id")
+        if options["contract_addresses"]:
+            collections = collections.filter(
+                contract_address__in=[
+                    contract_address.lower()
+                    for contract_address in options["contract_addresses"]
+                ]
+            )
+        if options["csv"]:
+            with open(options["csv"]) as f:
+                names = [row["Name"] for row in csv.DictReader(f)]
+            collections = collections.filter(name__in=names)
+
+        contract_addresses = list(
+            collections.values_list("contract_address", flat=True)
+        )
+        self.stdout.write(f"Ingesting {len(contract_addresses)} collections")
+
+        shards = ingest_collections(
+            contract_addresses,
+            shard_size=options["shard_size"],
+            fetch_workers=options["fetch_workers"],
+            rank_workers=options["rank_workers"],
+            on_progress=lambda progress: self.stdout.write(str(progress)),
+        )
+
+        failed = [
+            contract_address for shard in shards for contract_address in shard.failed
+        ]
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(f"Failed collections: {', '.join(failed)}")
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ingested {len(contract_addresses) - len(failed)} collections"
+            )
+        )
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+
+from ryft.core.holdings import rebuild_holdings
+
+
+class Command(BaseCommand):
+    def handle(self, *args, **options):
+        stored = rebuild_holdings()
+        self.stdout.write(f"Rebuilt {stored} wallet holdings")
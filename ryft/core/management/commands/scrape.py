@@ -8,19 +8,27 @@ from django.core.management.base import BaseCommand
 
 from ryft.core.models import Collection
 from ryft.core.scraper.rarity_sniper import RaritySniperScraper
+from ryft.core.seeds import iter_scraped_collections, seed_collections
 
 
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--skip-thumbnails",
+            action="store_true",
+            help="Don't download the thumbnails of the scraped collections again",
+        )
+
     def handle(self, *args, **options):
         self.save_collections_to_db()
+        if not options["skip_thumbnails"]:
+            self.save_collection_thumbnails()
 
     def save_collections_to_db(self):
-        scraper = RaritySniperScraper()
-        collections, collection_details = scraper.get_all_csv_data()
-
-        # add collection basic info to the collection details
-        length_collections = len(collections)
+        result = seed_collections()
+        self.stdout.write(f"Seeded collections: {result}")
 
+    def save_collection_thumbnails(self):
         def save_thumbnail(collection, thumbnail_url):
             img_temp = NamedTemporaryFile(delete=True)
             req = urllib.request.Request(
@@ -32,48 +40,12 @@ class Command(BaseCommand):
                 f"{collection.name} Thumbnail.png", File(img_temp)
             )
 
-        def format_supply(raw_supply):
-            # '20,000 items'
-            raw_number = raw_supply.split(" ")[0].replace(",", "")
-            return raw_number
-
-        for i in range(0, length_collections):
-            collection = collections[i]
-            collection_details[i].update(**collection)
-            collection_details[i]["contract_address"] = scraper.get_contract_address(
-                collection_details[i]
-            )
-
-        for c in collection_details:
-            contract_address = c["contract_address"]
-            if contract_address:
-                try:
-                    print(f"Try collection {contract_address}")
-                    collection = Collection.objects.get(
-                        contract_address=c["contract_address"].lower()
-                    )
-                    # if not collection.thumbnail:
-                    # add the thumbnail
-                    save_thumbnail(collection, c["Thumbnail"])
-                    print(f"Saved thumbnail to {contract_address}")
-
-                except Collection.DoesNotExist:
-                    collection = Collection.objects.create(
-                        contract_address=c["contract_address"],
-                        name=c["Name"],
-                        description="Todo",
-                        supply=format_supply(c["Supply"]),
-                        released=True,
-                        verified=True,
-                        discord_link=c["DiscordURL"],
-                        twitter_link=c["TwitterURL"],
-                        opensea_link=c["OpenseaURL"],
-                    )
-                    print("Doesn't exist: ", collection.contract_address)
-
-                    # website_link=c[""], # TODO
-                    # num_discord_members=c[""],  # TODO
-                    # num_twitter_followers=c[""],  # TODO
+        collections = Collection.objects.in_bulk(field_name="contract_address")
+        for c in iter_scraped_collections():
+            collection = collections.get(c["contract_address"])
+            if collection:
+                save_thumbnail(collection, c["Thumbnail"])
+                self.stdout.write(f"Saved thumbnail to {collection.contract_address}")
 
     def store_collection_thumbnails(self):
         scraper = RaritySniperScraper()
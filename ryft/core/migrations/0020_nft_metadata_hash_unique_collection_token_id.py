@@ -0,0 +1,61 @@
+# Generated by Django 4.0.8 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_remove_collection_mint_price_eth_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="nft",
+            name="metadata_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        # Keep the first NFT of any duplicated (collection, token_id) pair,
+        # moving the transactions and wallet NFTs of the duplicates onto it.
+        # The kept NFT already has its own traits
+        migrations.RunSQL(
+            sql=[
+                """
+                CREATE TEMPORARY TABLE nft_duplicates AS
+                SELECT a.id AS duplicate_id, MIN(b.id) AS kept_id
+                FROM core_nft a
+                JOIN core_nft b ON a.collection_id = b.collection_id
+                AND a.token_id = b.token_id
+                AND a.id > b.id
+                GROUP BY a.id
+                """,
+                """
+                UPDATE core_transaction t SET nft_id = d.kept_id
+                FROM nft_duplicates d WHERE t.nft_id = d.duplicate_id
+                """,
+                """
+                UPDATE core_walletnft wn SET nft_id = d.kept_id
+                FROM nft_duplicates d WHERE wn.nft_id = d.duplicate_id
+                """,
+                """
+                DELETE FROM core_nfttrait nt USING nft_duplicates d
+                WHERE nt.nft_id = d.duplicate_id
+                """,
+                """
+                DELETE FROM core_nft n USING nft_duplicates d
+                WHERE n.id = d.duplicate_id
+                """,
+                "DROP TABLE nft_duplicates",
+                # Run the deferred foreign key checks now, the constraint
+                # below can't alter core_nft while they're pending
+                "SET CONSTRAINTS ALL IMMEDIATE",
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="nft",
+            constraint=models.UniqueConstraint(
+                fields=("collection", "token_id"), name="unique_collection_token_id"
+            ),
+        ),
+    ]
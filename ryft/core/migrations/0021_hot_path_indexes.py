@@ -0,0 +1,47 @@
+# Generated by Django 4.0.8 on 2026-10-17 00:48
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.fields.json
+
+
+class Migration(migrations.Migration):
+
+    # Build the indexes without locking the tables against writes
+    atomic = False
+
+    dependencies = [
+        ('core', '0020_nft_metadata_hash_unique_collection_token_id'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='nft',
+            index=models.Index(fields=['collection', 'rank'], name='nft_collection_rank_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='nft',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['raw_metadata'], name='nft_raw_metadata_gin_idx', opclasses=['jsonb_path_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['contract_address', 'collection_only', '-transaction_date'], name='transaction_contract_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('collection_only', True), ('price_eth__gt', 0)), fields=['contract_address', '-transaction_date'], name='transaction_sales_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('collection_only', False)), fields=['contract_address', 'token_id'], name='transaction_token_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['wallet', '-transaction_date'], name='transaction_wallet_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='walletnft',
+            index=models.Index(django.db.models.fields.json.KeyTransform('contract_address', 'nft_raw_data'), name='walletnft_contract_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.8 on 2026-10-17 00:51
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0021_hot_path_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='collectionattribute',
+            index=models.Index(fields=['collection', 'name', 'value'], name='attribute_collection_name_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='nfttrait',
+            index=models.Index(fields=['attribute', 'nft'], name='nfttrait_attribute_nft_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.8 on 2026-10-17 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0022_trait_filter_indexes"),
+    ]
+
+    operations = [
+        # Keep only the latest block of every contract as its checkpoint
+        migrations.RunSQL(
+            sql="""
+                DELETE FROM core_ethblock a USING core_ethblock b
+                WHERE a.contract_address = b.contract_address
+                AND (a.last_block, a.id) < (b.last_block, b.id)
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="ethblock",
+            constraint=models.UniqueConstraint(
+                fields=("contract_address",), name="unique_ethblock_contract_address"
+            ),
+        ),
+    ]
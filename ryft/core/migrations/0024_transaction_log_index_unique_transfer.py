@@ -0,0 +1,66 @@
+# Generated by Django 4.0.8 on 2026-10-17 01:02
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0023_ethblock_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="log_index",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        # Fill the log index from the raw data of each source: Mnemonic
+        # transfers, Alchemy asset transfers and Alchemy webhook activity
+        migrations.RunSQL(
+            sql="""
+                UPDATE core_transaction
+                SET log_index = (raw_transaction_data #>> '{blockchainEvent,logIndex}')::int
+                WHERE raw_transaction_data #>> '{blockchainEvent,logIndex}' ~ '^[0-9]+$';
+
+                UPDATE core_transaction
+                SET log_index = split_part(raw_transaction_data ->> 'uniqueId', ':', 3)::int
+                WHERE raw_transaction_data ->> 'uniqueId' ~ ':log:[0-9]+$';
+
+                UPDATE core_transaction
+                SET log_index = (
+                    'x' || lpad(substr(raw_transaction_data #>> '{log,logIndex}', 3), 8, '0')
+                )::bit(32)::int
+                WHERE raw_transaction_data #>> '{log,logIndex}' ~ '^0x[0-9a-fA-F]{1,8}$';
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # Keep the first of any duplicated transfer
+        migrations.RunSQL(
+            sql="""
+                DELETE FROM core_transaction a USING core_transaction b
+                WHERE a.transaction_hash = b.transaction_hash
+                AND COALESCE(a.log_index, -1) = COALESCE(b.log_index, -1)
+                AND a.token_id = b.token_id
+                AND COALESCE(a.wallet_id, 0) = COALESCE(b.wallet_id, 0)
+                AND a.id > b.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="transaction",
+            constraint=models.UniqueConstraint(
+                django.db.models.expressions.F("transaction_hash"),
+                django.db.models.functions.comparison.Coalesce(
+                    "log_index", django.db.models.expressions.Value(-1)
+                ),
+                django.db.models.expressions.F("token_id"),
+                django.db.models.functions.comparison.Coalesce(
+                    "wallet", django.db.models.expressions.Value(0)
+                ),
+                name="unique_transaction_transfer",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.8 on 2026-10-17 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_transaction_log_index_unique_transfer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=100, unique=True)),
+                ('payload', models.JSONField()),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('processed_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(condition=models.Q(('processed_timestamp__isnull', True)), fields=['id'], name='webhookevent_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.8 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0025_webhookevent"),
+    ]
+
+    operations = [
+        # Re-runs of the price history seed stored every date more than once,
+        # keep the latest price of each
+        migrations.RunSQL(
+            sql="""
+                DELETE FROM core_ethprice a USING core_ethprice b
+                WHERE a.date = b.date AND a.id < b.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name="ethprice",
+            name="date",
+            field=models.DateField(unique=True),
+        ),
+    ]
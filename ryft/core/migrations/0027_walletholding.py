@@ -0,0 +1,79 @@
+# Generated by Django 4.0.8 on 2026-10-17 01:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0026_ethprice_unique_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WalletHolding",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("contract_address", models.CharField(max_length=100)),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("floor_value", models.FloatField(default=0)),
+                (
+                    "collection",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="holdings",
+                        to="core.collection",
+                    ),
+                ),
+                (
+                    "wallet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="holdings",
+                        to="core.wallet",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="walletholding",
+            index=models.Index(
+                fields=["contract_address"], name="walletholding_contract_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="walletholding",
+            constraint=models.UniqueConstraint(
+                fields=("wallet", "contract_address"),
+                name="unique_walletholding_contract_address",
+            ),
+        ),
+        # Build the holdings of the existing wallets
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO core_walletholding
+                (wallet_id, contract_address, collection_id, count, floor_value)
+                SELECT wn.wallet_id, wn.nft_raw_data ->> 'contract_address', c.id,
+                COUNT(*), COUNT(*) * COALESCE(m.current_floor_price, 0)
+                FROM core_walletnft AS wn
+                LEFT JOIN core_collection AS c
+                ON c.contract_address = wn.nft_raw_data ->> 'contract_address'
+                LEFT JOIN core_collectionmetrics AS m ON m.collection_id = c.id
+                WHERE wn.nft_raw_data ->> 'contract_address' IS NOT NULL
+                GROUP BY wn.wallet_id, wn.nft_raw_data ->> 'contract_address', c.id,
+                m.current_floor_price
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.8 on 2026-10-17 01:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_walletholding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletOnboardingStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('step', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('updated_timestamp', models.DateTimeField(auto_now=True)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='onboarding_steps', to='core.wallet')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='walletonboardingstep',
+            constraint=models.UniqueConstraint(fields=('wallet', 'step'), name='unique_walletonboardingstep_step'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.0.8 on 2026-10-17 01:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_walletonboardingstep'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionPriceRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('min_price', models.FloatField(blank=True, null=True)),
+                ('max_price', models.FloatField(blank=True, null=True)),
+                ('avg_price', models.FloatField(blank=True, null=True)),
+                ('volume', models.FloatField(blank=True, null=True)),
+                ('quantity', models.PositiveIntegerField(blank=True, null=True)),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_records', to='core.collection')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CollectionOwnersRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('owners_count', models.PositiveIntegerField(default=0)),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='owners_records', to='core.collection')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='collectionpricerecord',
+            constraint=models.UniqueConstraint(fields=('collection', 'timestamp'), name='unique_collectionpricerecord_timestamp'),
+        ),
+        migrations.AddConstraint(
+            model_name='collectionownersrecord',
+            constraint=models.UniqueConstraint(fields=('collection', 'timestamp'), name='unique_collectionownersrecord_timestamp'),
+        ),
+        # Keep the last 30 days fetched into the JSON fields
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO core_collectionpricerecord
+                (collection_id, timestamp, min_price, max_price, avg_price, volume, quantity)
+                SELECT m.collection_id, (p ->> 'timestamp')::timestamptz,
+                NULLIF(p ->> 'min', '')::float, NULLIF(p ->> 'max', '')::float,
+                NULLIF(p ->> 'avg', '')::float, NULLIF(p ->> 'volume', '')::float,
+                NULLIF(p ->> 'quantity', '')::numeric::integer
+                FROM core_collectionmetrics AS m,
+                jsonb_array_elements(m.price_history) AS p
+                WHERE jsonb_typeof(m.price_history) = 'array' AND p ? 'timestamp'
+                ON CONFLICT DO NOTHING
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO core_collectionownersrecord
+                (collection_id, timestamp, owners_count)
+                SELECT m.collection_id, (p ->> 'timestamp')::timestamptz,
+                COALESCE(NULLIF(p ->> 'count', '')::numeric::integer, 0)
+                FROM core_collectionmetrics AS m,
+                jsonb_array_elements(m.owners_history) AS p
+                WHERE jsonb_typeof(m.owners_history) = 'array' AND p ? 'timestamp'
+                ON CONFLICT DO NOTHING
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RemoveField(
+            model_name='collectionmetrics',
+            name='owners_history',
+        ),
+        migrations.RemoveField(
+            model_name='collectionmetrics',
+            name='price_history',
+        ),
+    ]
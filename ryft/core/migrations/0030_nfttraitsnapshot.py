@@ -0,0 +1,28 @@
+# Generated by Django 4.0.8 on 2026-10-17 01:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_collection_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NFTTraitSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token_id', models.TextField()),
+                ('trait_count', models.IntegerField(null=True)),
+                ('attributes', models.JSONField(null=True)),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trait_snapshots', to='core.collection')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='nfttraitsnapshot',
+            constraint=models.UniqueConstraint(fields=('collection', 'token_id'), name='unique_snapshot_collection_token_id'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.8 on 2026-10-17 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_nfttraitsnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='walletonboardingstep',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', max_length=10),
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models, transaction
-from django.db.models.signals import post_save, pre_save
+from django.db.models import Q, Value
+from django.db.models.fields.json import KeyTransform
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_save
 from siwe_auth.models import Wallet as UserWallet
 
 User = get_user_model()
@@ -100,6 +104,17 @@ def post_save_user_receiver(sender, instance, created, *args, **kwargs):
 post_save.connect(post_save_user_receiver, sender=UserWallet)
 
 
+def wallet_addresses_receiver(sender, instance, created=True, *args, **kwargs):
+    if created:
+        from ryft.core.wallet_addresses import wallet_addresses
+
+        transaction.on_commit(wallet_addresses.invalidate)
+
+
+post_save.connect(wallet_addresses_receiver, sender=Wallet)
+post_delete.connect(wallet_addresses_receiver, sender=Wallet)
+
+
 class Collection(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
@@ -185,14 +200,58 @@ class CollectionMetrics(models.Model):
     sales_24hr = models.IntegerField(blank=True, null=True)
     delists_24hr = models.IntegerField(blank=True, null=True)
     royalty_fee = models.FloatField(blank=True, null=True)
-    price_history = models.JSONField(blank=True, null=True)
-    owners_history = models.JSONField(blank=True, null=True)
     last_fetched = models.DateTimeField()
 
     def __str__(self) -> str:
         return self.collection.name
 
 
+class CollectionPriceRecord(models.Model):
+    """Sale prices of a collection over one day, as reported by Mnemonic"""
+
+    collection = models.ForeignKey(
+        Collection, on_delete=models.CASCADE, related_name="price_records"
+    )
+    timestamp = models.DateTimeField()
+    min_price = models.FloatField(blank=True, null=True)
+    max_price = models.FloatField(blank=True, null=True)
+    avg_price = models.FloatField(blank=True, null=True)
+    volume = models.FloatField(blank=True, null=True)
+    quantity = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["collection", "timestamp"],
+                name="unique_collectionpricerecord_timestamp",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.collection_id} {self.timestamp}"
+
+
+class CollectionOwnersRecord(models.Model):
+    """Number of owners of a collection at the end of one day"""
+
+    collection = models.ForeignKey(
+        Collection, on_delete=models.CASCADE, related_name="owners_records"
+    )
+    timestamp = models.DateTimeField()
+    owners_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["collection", "timestamp"],
+                name="unique_collectionownersrecord_timestamp",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.collection_id} {self.timestamp}"
+
+
 class NFT(models.Model):
     """
     Represents an NFT part of a collection and its rarity metrics
@@ -208,8 +267,25 @@ class NFT(models.Model):
     rank = models.IntegerField(null=True, blank=True)
     buy_rank = models.IntegerField(null=True, blank=True)
     raw_metadata = models.JSONField(null=True, blank=True)
+    metadata_hash = models.CharField(max_length=64, blank=True, null=True)
     trait_count = models.IntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["collection", "token_id"], name="unique_collection_token_id"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["collection", "rank"], name="nft_collection_rank_idx"),
+            # Attribute containment lookups used when re-ranking changed NFTs
+            GinIndex(
+                fields=["raw_metadata"],
+                opclasses=["jsonb_path_ops"],
+                name="nft_raw_metadata_gin_idx",
+            ),
+        ]
+
     def __str__(self) -> str:
         return self.token_id
 
@@ -226,6 +302,14 @@ class CollectionAttribute(models.Model):
     value = models.TextField()
     occurrences = models.IntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["collection", "name", "value"],
+                name="attribute_collection_name_idx",
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.name}: {self.value}"
 
@@ -241,10 +325,43 @@ class NFTTrait(models.Model):
     )
     rarity_score = models.FloatField(null=True)
 
+    class Meta:
+        indexes = [
+            # Trait filters look up the NFTs holding an attribute
+            models.Index(
+                fields=["attribute", "nft"], name="nfttrait_attribute_nft_idx"
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.attribute.name}: {self.attribute.value}"
 
 
+class NFTTraitSnapshot(models.Model):
+    """
+    Traits an NFT had before a fetch changed it, kept until the collection is
+    re-ranked. A null trait count means the NFT is new
+    """
+
+    collection = models.ForeignKey(
+        Collection, on_delete=models.CASCADE, related_name="trait_snapshots"
+    )
+    token_id = models.TextField()
+    trait_count = models.IntegerField(null=True)
+    attributes = models.JSONField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["collection", "token_id"],
+                name="unique_snapshot_collection_token_id",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return self.token_id
+
+
 class WalletNFT(models.Model):
     wallet = models.ForeignKey(
         Wallet, on_delete=models.CASCADE, related_name="wallet_nfts"
@@ -252,17 +369,55 @@ class WalletNFT(models.Model):
     nft = models.ForeignKey(NFT, on_delete=models.CASCADE, blank=True, null=True)
     nft_raw_data = models.JSONField()
 
-    # class Meta:
-    #     constraints = [
-    #         models.UniqueConstraint(
-    #             fields=["wallet", "nft"], name="NFT can only belong to one Wallet"
-    #         )
-    #     ]
+    class Meta:
+        indexes = [
+            models.Index(
+                KeyTransform("contract_address", "nft_raw_data"),
+                name="walletnft_contract_idx",
+            ),
+        ]
 
     def __str__(self):
         return str(self.id)
 
 
+class WalletHolding(models.Model):
+    """
+    Number of NFTs a wallet holds in each collection and their value at the
+    collection floor price, derived from the wallet's WalletNFTs
+    """
+
+    wallet = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, related_name="holdings"
+    )
+    contract_address = models.CharField(max_length=100)
+    collection = models.ForeignKey(
+        Collection,
+        on_delete=models.SET_NULL,
+        related_name="holdings",
+        blank=True,
+        null=True,
+    )
+    count = models.PositiveIntegerField(default=0)
+    floor_value = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["wallet", "contract_address"],
+                name="unique_walletholding_contract_address",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["contract_address"], name="walletholding_contract_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet} {self.contract_address}"
+
+
 class WalletPortfolioRecord(models.Model):
     """Represents a daily record of the wallet portfolio value"""
 
@@ -276,6 +431,36 @@ class WalletPortfolioRecord(models.Model):
         return self.wallet.wallet_address
 
 
+class WalletOnboardingStep(models.Model):
+    """Progress of one step of the workflow that processes a new wallet"""
+
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+        ("skipped", "Skipped"),
+    )
+
+    wallet = models.ForeignKey(
+        Wallet, on_delete=models.CASCADE, related_name="onboarding_steps"
+    )
+    step = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    error = models.TextField(blank=True, null=True)
+    updated_timestamp = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["wallet", "step"], name="unique_walletonboardingstep_step"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet} {self.step}"
+
+
 class Transaction(models.Model):
     wallet = models.ForeignKey(
         Wallet,
@@ -298,6 +483,7 @@ class Transaction(models.Model):
     token_id = models.CharField(max_length=200)
     quantity = models.IntegerField(default=1)
     transaction_hash = models.CharField(max_length=67, blank=True, null=True)
+    log_index = models.IntegerField(blank=True, null=True)
     block_hash = models.CharField(max_length=200, blank=True, null=True)
     block_number = models.IntegerField(default=0, blank=True, null=True)
     transaction_date = models.DateTimeField()
@@ -308,6 +494,42 @@ class Transaction(models.Model):
     # Transfers that show only on the collection page
     collection_only = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["contract_address", "collection_only", "-transaction_date"],
+                name="transaction_contract_date_idx",
+            ),
+            # Collection sales feed and price graph
+            models.Index(
+                fields=["contract_address", "-transaction_date"],
+                condition=Q(collection_only=True, price_eth__gt=0),
+                name="transaction_sales_idx",
+            ),
+            # Linking wallet transfers to NFTs
+            models.Index(
+                fields=["contract_address", "token_id"],
+                condition=Q(collection_only=False),
+                name="transaction_token_idx",
+            ),
+            models.Index(
+                fields=["wallet", "-transaction_date"],
+                name="transaction_wallet_date_idx",
+            ),
+        ]
+        constraints = [
+            # The same transfer is stored once for the collection feed and once
+            # for each wallet it involves. Null keys are coalesced so they
+            # still conflict.
+            models.UniqueConstraint(
+                "transaction_hash",
+                Coalesce("log_index", Value(-1)),
+                "token_id",
+                Coalesce("wallet", Value(0)),
+                name="unique_transaction_transfer",
+            ),
+        ]
+
     def __str__(self):
         return self.token_id
 
@@ -328,6 +550,14 @@ class EthBlock(models.Model):
     timestamp = models.DateTimeField()
     contract_address = models.TextField()
 
+    class Meta:
+        # A single transfer sync checkpoint per contract, updated in place
+        constraints = [
+            models.UniqueConstraint(
+                fields=["contract_address"], name="unique_ethblock_contract_address"
+            ),
+        ]
+
     def __str__(self):
         return str(self.last_block)
 
@@ -366,6 +596,30 @@ class APICallRecordLog(models.Model):
         return self.client
 
 
+class WebhookEvent(models.Model):
+    """Raw Alchemy webhook payload queued until a worker processes it"""
+
+    # Alchemy's event id, so redelivered webhooks are only stored once
+    event_id = models.CharField(max_length=100, unique=True)
+    payload = models.JSONField()
+    timestamp = models.DateTimeField(auto_now_add=True)
+    processed_timestamp = models.DateTimeField(blank=True, null=True)
+    # Why the event couldn't be processed
+    error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=Q(processed_timestamp__isnull=True),
+                name="webhookevent_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.event_id
+
+
 class TrendingCollections(models.Model):
     trending_by_volume = models.JSONField(blank=True, null=True)
     trending_by_sales = models.JSONField(blank=True, null=True)
@@ -377,8 +631,18 @@ class TrendingCollections(models.Model):
 
 
 class EthPrice(models.Model):
-    date = models.DateField()
+    date = models.DateField(unique=True)
     value = models.DecimalField(decimal_places=2, max_digits=10)
 
     def __str__(self):
         return str(self.value)
+
+
+def eth_prices_receiver(sender, instance, *args, **kwargs):
+    from ryft.core.prices import eth_prices
+
+    transaction.on_commit(eth_prices.invalidate)
+
+
+post_save.connect(eth_prices_receiver, sender=EthPrice)
+post_delete.connect(eth_prices_receiver, sender=EthPrice)
@@ -1,31 +1,39 @@
 import logging
-import time
 
-from celery import chain
+from celery import chain, chord, group
 from dateutil import parser
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import send_mail
-from django.db import connection
+from django.db import connection, transaction
+from django.db.models import F
 from django.utils import timezone
 
 from config.celery_app import app
+from ryft.core.collection_metrics import refresh_collection_metrics
 from ryft.core.integrations.alchemy import get_alchemy_client
-from ryft.core.integrations.errors import NFTPortContractNotFound
+from ryft.core.integrations.errors import MnemonicPageError
 from ryft.core.integrations.mnemonic import mnemonic_client
-from ryft.core.integrations.nftport import nftport_client
 from ryft.core.models import (
     NFT,
     APICallRecordLog,
     Collection,
-    CollectionMetrics,
     EthBlock,
     TrackedWallet,
     Transaction,
     Wallet,
-    WalletNFT,
-    WalletPortfolioRecord,
+    WalletHolding,
+    WalletOnboardingStep,
+    WebhookEvent,
+)
+from ryft.core.portfolio.valuation import (
+    record_all_portfolio_values,
+    record_portfolio_values,
 )
 from ryft.core.services.logging import logging_service
+from ryft.core.transfers import parse_log_index, save_transactions
+from ryft.core.wallet_nfts import sync_wallet_nfts
+from ryft.core.webhooks import process_wallet_activity
 
 
 def send_contract_dne_mail(contract_addresses):
@@ -59,37 +67,32 @@ def get_wallet_nfts(wallet_id, should_fetch=True):
 
     # Fetch all NFTs for this wallet
     owned_nfts = []
-
-    page_limit = 500
-    has_next_page = True
-    offset = 0
-    while has_next_page:
-        data = mnemonic_client.get_wallet_nfts(
-            wallet.wallet_address, limit=page_limit, offset=offset
-        )
-        time.sleep(1)
-        APICallRecordLog.objects.create(client="mnemonic", service="get_wallet_nfts")
-        logging_service.log(
-            {
-                "Event": "Fetch Wallet NFTs",
-                "Service": "Mnemonic",
-                "Wallet_Address": wallet.wallet_address,
-            }
-        )
-        nfts = data.get("tokens")
-        if nfts:
-            result_length = len(nfts)
+    pages = mnemonic_client.iter_wallet_nfts(wallet.wallet_address, limit=500)
+    try:
+        for nfts in pages:
+            APICallRecordLog.objects.create(
+                client="mnemonic", service="get_wallet_nfts"
+            )
+            logging_service.log(
+                {
+                    "Event": "Fetch Wallet NFTs",
+                    "Service": "Mnemonic",
+                    "Wallet_Address": wallet.wallet_address,
+                }
+            )
             owned_nfts += nfts
-            if result_length < page_limit:
-                has_next_page = False
-            else:
-                offset += 500
-        else:
-            has_next_page = False
+    except MnemonicPageError as error:
+        # Keep the NFTs from the last successful fetch rather than storing a
+        # partial list, and fail so the steps building on them don't run
+        logging.error(
+            msg=f"Failed to fetch NFTs for wallet: {wallet.wallet_address}: {error}"
+        )
+        connection.close()
+        raise
 
     # Store the NFTs in JSON for now in the wallet
     wallet.nfts_raw_data = owned_nfts
-    wallet.save()
+    wallet.save(update_fields=["nfts_raw_data"])
 
     connection.close()
 
@@ -100,52 +103,25 @@ def get_wallet_nfts(wallet_id, should_fetch=True):
 @app.task(name="calculate_portfolio_total")
 def calculate_portfolio_total(wallet_id):
     logging.info(msg=f"Calculating portfolio for wallet {wallet_id}")
-    wallet = Wallet.objects.get(id=wallet_id)
 
-    contract_addresses = []
-    if not wallet.nfts_raw_data:
-        logging.warning(
-            msg=f"Wallet: {wallet.wallet_address} does not have raw nft data"
-        )
-        return "Done"
+    portfolio_value = record_portfolio_values([wallet_id]).get(wallet_id)
+    logging.info(msg=f"Finished calculating portfolio for wallet {wallet_id}")
 
-    for nft in wallet.nfts_raw_data:
-        contract_addresses.append(nft.get("contractAddress"))
+    connection.close()
 
-    contract_addresses = list(set(contract_addresses))
+    return portfolio_value
 
-    metrics = (
-        CollectionMetrics.objects.select_related("collection")
-        .filter(collection__contract_address__in=contract_addresses)
-        .values("collection__contract_address", "current_floor_price")
-    )
 
-    floor_price_map = {}
-    for collection_metric in metrics:
-        floor_price_map[
-            collection_metric["collection__contract_address"]
-        ] = collection_metric["current_floor_price"]
-
-    collection_floor_prices = []
-
-    for nft in wallet.nfts_raw_data:
-        contract_address = nft.get("contractAddress")
-        if contract_address:
-            # Check the floor price and add to list
-            floor_price = floor_price_map.get(contract_address)
-            if floor_price:
-                collection_floor_prices.append(floor_price)
-
-    # Calculate portfolio value
-    portfolio_value = sum(collection_floor_prices)
-    WalletPortfolioRecord.objects.create(
-        wallet=wallet, portfolio_value=portfolio_value, timestamp=timezone.now()
-    )
-    logging.info(msg=f"Finished calculating portfolio for wallet {wallet_id}")
+@app.task(name="calculate_portfolio_totals")
+def calculate_portfolio_totals(batch_size=5000):
+    logging.info(msg="Calculating portfolios for all wallets")
+
+    valued = record_all_portfolio_values(batch_size=batch_size)
+    logging.info(msg=f"Finished calculating portfolios for {valued} wallets")
 
     connection.close()
 
-    return portfolio_value
+    return valued
 
 
 @app.task(name="create_wallet_nfts")
@@ -159,41 +135,11 @@ def create_wallet_nfts(wallet_id, should_create=True):
     if not wallet.nfts_raw_data:
         return "Wallet has no raw data"
 
-    # Delete and recreate them all
-    wallet.wallet_nfts.all().delete()
-
-    wallet_nfts = []
-    # Only getting the first 100. We can process the remaining in a separate task
-    # Also worth looking at how this would affect amount of data being stored
-    for nft_data in list(wallet.nfts_raw_data)[0:100]:
-        contract_address = nft_data["contractAddress"]
-        token_id = nft_data["tokenId"]
-
-        try:
-            collection = Collection.objects.get(contract_address=contract_address)
-            nft_obj = NFT.objects.get(token_id=token_id, collection=collection)
-        except (NFT.DoesNotExist, Collection.DoesNotExist):
-            nft_obj = None
-
-        metadata = nft_data.get("metadata")
-
-        nft_raw_data = {}
-        if metadata:
-            nft_raw_data = {
-                "contract_address": contract_address,
-                "token_id": token_id,
-            }
-        else:
-            logging.warning(
-                msg=f"Couldn't get metadata for NFT in wallet: {wallet_id}: {metadata}"
-            )
-
-        wallet_nfts.append(
-            WalletNFT(wallet=wallet, nft_raw_data=nft_raw_data, nft=nft_obj)
-        )
-
-    WalletNFT.objects.bulk_create(wallet_nfts, batch_size=100)
-    logging.info(msg=f"Created Wallet NFTs for wallet {wallet.wallet_address}")
+    created, relinked, deleted = sync_wallet_nfts(wallet, wallet.nfts_raw_data)
+    logging.info(
+        msg=f"Wallet NFTs for wallet {wallet.wallet_address}: {created} created, "
+        f"{relinked} relinked, {deleted} deleted"
+    )
 
     connection.close()
 
@@ -230,7 +176,6 @@ def fetch_individual_wallet_transactions(wallet_id):
                 last_block=latest_block_number,
                 transaction_type=transaction_type,
             )
-            time.sleep(5)
             data = result["result"]
             for tsx in data["transfers"]:
                 block_num = int(tsx["blockNum"], base=16)
@@ -305,20 +250,24 @@ def fetch_individual_wallet_transactions(wallet_id):
                 token_id=token_id,
                 quantity=1,
                 transaction_hash=t.get("hash"),
+                # uniqueId is "{hash}:log:{log index}"
+                log_index=parse_log_index(t.get("uniqueId", "").rpartition(":")[2]),
                 block_number=block_number,
                 transaction_date=parser.parse(t.get("metadata").get("blockTimestamp")),
                 raw_transaction_data=t,
             )
             transaction_objs.append(transaction_obj)
 
-    Transaction.objects.bulk_create(transaction_objs, batch_size=100)
-    logging.info(msg=f"Created Transactions for wallet {wallet.wallet_address}")
+    created = save_transactions(transaction_objs)
+    logging.info(
+        msg=f"Created {created} Transactions for wallet {wallet.wallet_address}"
+    )
 
     # This tells us if the wallet has any new transactions
 
     connection.close()
 
-    return len(transaction_objs) > 0
+    return created > 0
 
 
 @app.task(name="check_wallet_access")
@@ -342,20 +291,49 @@ def check_wallet_access(wallet_id):
     return "Done"
 
 
-@app.task(name="save_final_wallet_details")
-def save_final_wallet_details(wallet_id):
-    logging.info(msg="Saving final details on wallet")
+@app.task(name="fetch_wallet_ens_domains")
+def fetch_wallet_ens_domains(wallet_id):
+    logging.info(msg="Fetching wallet ENS domains")
     wallet = Wallet.objects.get(id=wallet_id)
-    wallet.processed = True
-    wallet.save()
 
     ens_data = mnemonic_client.get_ens_domains(wallet.wallet_address)
     entities = ens_data.get("entities")
     if entities:
-        if len(entities) > 0:
-            wallet.ens_domains = entities
-            first_domain = entities[0]
-            wallet.ens_domain = first_domain.get("name")
+        wallet.ens_domains = entities
+        first_domain = entities[0]
+        wallet.ens_domain = first_domain.get("name")
+        wallet.save(update_fields=["ens_domains", "ens_domain"])
+
+    connection.close()
+    logging.info(msg="Finished fetching wallet ENS domains")
+
+    return "Done"
+
+
+@app.task(name="save_final_wallet_details")
+def save_final_wallet_details(wallet_id, steps=None):
+    """
+    Mark the wallet as processed. With `steps`, the wallet is left unprocessed
+    so it can be retried unless all of those onboarding steps are done
+    """
+    if steps:
+        incomplete = list(
+            WalletOnboardingStep.objects.filter(wallet_id=wallet_id, step__in=steps)
+            .exclude(status="done")
+            .values_list("step", flat=True)
+        )
+        if incomplete:
+            logging.error(
+                msg=f"Wallet {wallet_id} left unprocessed, onboarding steps "
+                f"didn't complete: {', '.join(incomplete)}"
+            )
+            connection.close()
+            return "Incomplete"
+
+    logging.info(msg="Saving final details on wallet")
+    wallet = Wallet.objects.get(id=wallet_id)
+    wallet.processed = True
+    wallet.save(update_fields=["processed"])
 
     connection.close()
     logging.info(msg="Finished saving final details on wallet")
@@ -370,24 +348,32 @@ def create_tracked_wallet(wallet_id):
     wallet = Wallet.objects.get(id=wallet_id)
     tracked_wallet, created = TrackedWallet.objects.get_or_create(wallet=wallet)
 
-    wallet_nfts_with_thumbnails = (
-        wallet.wallet_nfts.select_related("nft", "nft__collection__collectionmetrics")
-        .filter(nft__raw_metadata__metadata__image__isnull=False)
-        .order_by("-nft__collection__collectionmetrics__current_floor_price")
+    # Use an NFT from the wallet's collection with the highest floor price
+    collection_ids = (
+        wallet.holdings.filter(collection__isnull=False)
+        .order_by(
+            F("collection__collectionmetrics__current_floor_price").desc(
+                nulls_last=True
+            )
+        )
+        .values_list("collection_id", flat=True)
     )
-
-    if wallet_nfts_with_thumbnails.exists():
-        for wallet_nft in wallet_nfts_with_thumbnails:
-            nft = wallet_nft.nft
-            if nft.image_url:
-                if "ipfs" not in nft.image_url:
-                    tracked_wallet.thumbnail = nft.image_url
-                    tracked_wallet.save()
-                    wallet.thumbnail = nft.image_url
-                    wallet.save()
-                    break
-
-                    # TODO redo wallet thumbnail if sold the NFT
+    for collection_id in collection_ids:
+        image_urls = NFT.objects.filter(
+            collection_id=collection_id,
+            walletnft__wallet=wallet,
+            raw_metadata__metadata__image__isnull=False,
+            image_url__isnull=False,
+        ).values_list("image_url", flat=True)
+        image_url = next((url for url in image_urls if url and "ipfs" not in url), None)
+        if image_url:
+            tracked_wallet.thumbnail = image_url
+            tracked_wallet.save()
+            wallet.thumbnail = image_url
+            wallet.save()
+            break
+
+            # TODO redo wallet thumbnail if sold the NFT
 
     connection.close()
     logging.info(msg="Finished creating tracked wallet")
@@ -396,58 +382,42 @@ def create_tracked_wallet(wallet_id):
 
 def calculate_wallet_portfolio(wallet_address, tracked_wallet=False):
     """
-    This gets triggered after adding the wallet
+    This gets triggered after adding the wallet.
+
+    The network fetches run in parallel. The steps that build on the wallet's
+    NFTs run in order as soon as the NFTs are fetched. Once every step has
+    finished, the wallet is marked as processed if they all completed. Each
+    step records its progress in WalletOnboardingStep.
     """
     wallet = Wallet.objects.get(wallet_address=wallet_address)
 
+    fetches = ["webhook", "transactions", "ens"]
     if tracked_wallet:
-        # Step 1 - create webhook for events
-        step1 = create_wallet_webhook.si(wallet.wallet_address)
-
-        # Step 2 - get NFTs - store's raw data on the wallet
-        step2 = get_wallet_nfts.si(wallet.id)
-
-        # Step 3 - create WalletNFTs for the wallet
-        step3 = create_wallet_nfts.si(wallet.id)
-
-        # Step 4 - fetch transactions of this wallet (doesn't impact portfolio calculations)
-        step4 = fetch_individual_wallet_transactions.si(wallet.id)
-
-        # Step 5 - done processing
-        step5 = save_final_wallet_details.si(wallet.id)
-
-        # Step 6 - create tracked wallet
-        step6 = create_tracked_wallet.si(wallet.id)
-
-        workflow = chain(step1, step2, step3, step4, step5, step6)
-        result = workflow.delay()
-        return result
-
-    # Step 0 - create webhook for events
-    step0 = create_wallet_webhook.si(wallet.wallet_address)
-
-    # Step 1 - get NFTs - store's raw data on the wallet
-    step1 = get_wallet_nfts.si(wallet.id)
-
-    # Step 2 - create WalletNFTs for the wallet
-    step2 = create_wallet_nfts.si(wallet.id)
-
-    # Step 3 - calculate portfolio value from floor prices
-    step3 = calculate_portfolio_total.si(wallet.id)
-
-    # Step 4 - fetch transactions of this wallet (doesn't impact portfolio calculations)
-    step4 = fetch_individual_wallet_transactions.si(wallet.id)
-
-    # Step 5 - check the wallet has an NFT for ryft
-    step5 = check_wallet_access.si(wallet.id)
-
-    # Step 6 - done processing
-    step6 = save_final_wallet_details.si(wallet.id)
-
-    # Step 7 - create tracked wallet
-    step7 = create_tracked_wallet.si(wallet.id)
+        dependents = ["wallet_nfts", "thumbnail"]
+    else:
+        dependents = ["wallet_nfts", "portfolio", "access", "thumbnail"]
+
+    WalletOnboardingStep.objects.filter(wallet=wallet).delete()
+    WalletOnboardingStep.objects.bulk_create(
+        [
+            WalletOnboardingStep(wallet=wallet, step=step)
+            for step in fetches + ["nfts"] + dependents
+        ]
+    )
 
-    workflow = chain(step0, step1, step2, step3, step4, step5, step6, step7)
+    workflow = chord(
+        group(
+            *[run_wallet_onboarding_step.si(wallet.id, step) for step in fetches],
+            chain(
+                run_wallet_onboarding_step.si(wallet.id, "nfts"),
+                *[
+                    run_wallet_onboarding_step.si(wallet.id, step)
+                    for step in dependents
+                ],
+            ),
+        ),
+        save_final_wallet_details.si(wallet.id, fetches + ["nfts"] + dependents),
+    )
     result = workflow.delay()
     return result
 
@@ -462,42 +432,8 @@ def fetch_collection_metrics():
     """
     Daily task that fetches collection statistics
     """
-    collections = Collection.objects.filter(released=True, nftport_unsupported=False)
-
-    for collection in collections:
-        time.sleep(3)
-
-        contract_address = collection.contract_address
-        try:
-            nftport_resp = nftport_client.get_contract_statistics(contract_address)
-            APICallRecordLog.objects.create(
-                client="nftport", service="fetch_nftport_statistics"
-            )
-            logging_service.log(
-                {
-                    "Event": "Fetch Statistics",
-                    "Service": "NFTPort",
-                    "Collection_ID": collection.id,
-                    "Collection_Name": collection.name,
-                    "Contract_Address": contract_address,
-                }
-            )
-            nftport_data = nftport_resp.get("statistics")
-            if nftport_data:
-                metrics, created = CollectionMetrics.objects.get_or_create(
-                    collection=collection, defaults={"last_fetched": timezone.now()}
-                )
-                metrics.current_floor_price = nftport_data.get("floor_price")
-                metrics.average_price_24hr = nftport_data.get("one_day_average_price")
-                metrics.average_sales_24hr = nftport_data.get("one_day_sales")
-                metrics.average_volume_24hr = nftport_data.get("one_day_volume")
-                metrics.last_fetched = timezone.now()
-                metrics.save()
-
-        except NFTPortContractNotFound:
-            collection.nftport_unsupported = True
-            collection.save()
-            return
+    result = refresh_collection_metrics()
+    logging.info(msg=f"Refreshed collection metrics: {result}")
 
     connection.close()
 
@@ -508,13 +444,7 @@ def wallet_callback(w_id):
 
 
 def daily_wallet_task():
-    wallet_ids = list(Wallet.objects.all().values_list("id", flat=True))
-    for wallet_id in wallet_ids:
-        calculate_portfolio_total.apply_async((wallet_id,))
-
-    # step1 = group([calculate_portfolio_total.s(wallet_id) for wallet_id in wallet_ids])
-    #
-    # step1.skew(start=1, stop=len(wallet_ids))()
+    calculate_portfolio_totals.delay()
 
 
 @app.task(name="create_wallet_webhook")
@@ -524,6 +454,70 @@ def create_wallet_webhook(wallet_address):
     logging.info(msg="Created webhook for wallet")
 
 
+# Webhooks arriving within this many seconds of each other are processed together
+WEBHOOK_DEBOUNCE_SECONDS = 2
+WEBHOOK_QUEUED_KEY = "process_webhook_events:queued"
+
+
+def queue_webhook_events():
+    """
+    Queue process_webhook_events to run shortly, unless a run is already
+    queued that will pick up the events stored since
+    """
+    if cache.add(WEBHOOK_QUEUED_KEY, True, timeout=WEBHOOK_DEBOUNCE_SECONDS * 5):
+        process_webhook_events.apply_async(countdown=WEBHOOK_DEBOUNCE_SECONDS)
+
+
+@app.task(name="process_webhook_events")
+def process_webhook_events(batch_size=100):
+    """
+    Apply queued wallet activity webhooks in batches until the queue is empty.
+
+    Batches are claimed with SKIP LOCKED so several workers can drain the
+    queue at once. If a batch fails its events are retried one at a time and
+    the ones that still fail are set aside with their error.
+    """
+    # Events stored from now on queue another run
+    cache.delete(WEBHOOK_QUEUED_KEY)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                WebhookEvent.objects.filter(processed_timestamp__isnull=True)
+                .select_for_update(skip_locked=True)
+                .order_by("id")[:batch_size]
+            )
+            if not events:
+                break
+
+            try:
+                with transaction.atomic():
+                    process_wallet_activity([event.payload for event in events])
+            except Exception:
+                logging.exception(msg="Failed to process webhook batch")
+                for event in events:
+                    try:
+                        with transaction.atomic():
+                            process_wallet_activity([event.payload])
+                    except Exception as error:
+                        logging.exception(
+                            msg=f"Failed to process webhook event {event.event_id}"
+                        )
+                        event.error = str(error)
+
+            now = timezone.now()
+            for event in events:
+                event.processed_timestamp = now
+            WebhookEvent.objects.bulk_update(
+                events, ["processed_timestamp", "error"], batch_size=batch_size
+            )
+            processed += len(events)
+
+    connection.close()
+    logging.info(msg=f"Processed {processed} webhook events")
+    return processed
+
+
 @app.task(name="wallet_transaction_callback")
 def wallet_transaction_callback(w_id):
     return f"Completed task for wallet transactions: {w_id}"
@@ -554,22 +548,84 @@ def send_daily_collection_email():
     Sends a daily email containing a list of missing collections
     """
 
-    wallet_addresses = (
-        WalletNFT.objects.all()
-        .values_list("nft_raw_data__contract_address", flat=True)
+    new_addresses = list(
+        WalletHolding.objects.exclude(collection__released=True)
+        .values_list("contract_address", flat=True)
         .distinct()
     )
 
-    all_addresses = Collection.objects.filter(released=True).values_list(
-        "contract_address", flat=True
+    send_contract_dne_mail(new_addresses)
+
+    connection.close()
+
+
+def _create_wallet_webhook(wallet_id):
+    wallet = Wallet.objects.get(id=wallet_id)
+    create_wallet_webhook(wallet.wallet_address)
+
+
+# Onboarding steps, each called with the wallet id
+ONBOARDING_STEPS = {
+    "webhook": _create_wallet_webhook,
+    "nfts": get_wallet_nfts,
+    "transactions": fetch_individual_wallet_transactions,
+    "ens": fetch_wallet_ens_domains,
+    "wallet_nfts": create_wallet_nfts,
+    "portfolio": calculate_portfolio_total,
+    "access": check_wallet_access,
+    "thumbnail": create_tracked_wallet,
+}
+
+# The step each onboarding step builds on, it's skipped unless that one is done
+ONBOARDING_STEP_REQUIREMENTS = {
+    "wallet_nfts": "nfts",
+    "portfolio": "wallet_nfts",
+    "access": "wallet_nfts",
+    "thumbnail": "wallet_nfts",
+}
+
+
+def set_onboarding_status(wallet_id, step, status, error=None):
+    WalletOnboardingStep.objects.filter(wallet_id=wallet_id, step=step).update(
+        status=status, error=error, updated_timestamp=timezone.now()
     )
-    new_addresses = [
-        a for a in wallet_addresses if a not in all_addresses and a is not None
-    ]
 
-    send_contract_dne_mail(new_addresses)
 
+@app.task(name="run_wallet_onboarding_step")
+def run_wallet_onboarding_step(wallet_id, step):
+    """
+    Run one step of a wallet's onboarding and record its progress.
+
+    A failure is recorded instead of raised, so the steps that don't build on
+    the failed one still run. The steps that do are recorded as skipped.
+    """
+    required = ONBOARDING_STEP_REQUIREMENTS.get(step)
+    if (
+        required
+        and not WalletOnboardingStep.objects.filter(
+            wallet_id=wallet_id, step=required, status="done"
+        ).exists()
+    ):
+        logging.warning(
+            msg=f"Skipping onboarding step {step} for wallet {wallet_id}, "
+            f"{required} isn't done"
+        )
+        set_onboarding_status(wallet_id, step, "skipped")
+        connection.close()
+        return False
+
+    set_onboarding_status(wallet_id, step, "running")
+    try:
+        ONBOARDING_STEPS[step](wallet_id)
+    except Exception as error:
+        logging.exception(msg=f"Onboarding step {step} failed for wallet: {wallet_id}")
+        set_onboarding_status(wallet_id, step, "failed", error=repr(error))
+        connection.close()
+        return False
+
+    set_onboarding_status(wallet_id, step, "done")
     connection.close()
+    return True
 
 
 """
@@ -0,0 +1,79 @@
+"""
+Portfolio valuation of many wallets at once.
+
+A wallet's portfolio is worth the floor price of every NFT it holds. A whole
+batch of wallets is valued in a single query summing their WalletHolding
+floor values, and the records of the batch are written with one bulk_create.
+"""
+from django.db import connection
+from django.utils import timezone
+
+from ryft.core.holdings import refresh_holding_floor_values
+from ryft.core.models import Wallet, WalletHolding, WalletPortfolioRecord
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def get_portfolio_values(wallet_ids):
+    """
+    :return: portfolio value of every wallet, 0 for wallets without priced NFTs
+    """
+    sql = (
+        "SELECT w.id, COALESCE(SUM(h.floor_value), 0) "
+        f"FROM {_table(Wallet)} AS w "
+        f"LEFT JOIN {_table(WalletHolding)} AS h ON h.wallet_id = w.id "
+        "WHERE w.id = ANY(%s) "
+        "GROUP BY w.id"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(wallet_ids)])
+        return dict(cursor.fetchall())
+
+
+def record_portfolio_values(wallet_ids, timestamp=None):
+    """
+    Value the wallets and store a WalletPortfolioRecord for each of them
+
+    :return: portfolio value of every wallet
+    """
+    timestamp = timestamp or timezone.now()
+    values = get_portfolio_values(wallet_ids)
+    WalletPortfolioRecord.objects.bulk_create(
+        [
+            WalletPortfolioRecord(
+                wallet_id=wallet_id, portfolio_value=value, timestamp=timestamp
+            )
+            for wallet_id, value in values.items()
+        ],
+        batch_size=1000,
+    )
+    return values
+
+
+def record_all_portfolio_values(batch_size=5000):
+    """
+    Value every wallet at the current floor prices in batches of
+    `batch_size` wallets. All the records share the same timestamp.
+
+    :return: number of wallets valued
+    """
+    refresh_holding_floor_values()
+
+    timestamp = timezone.now()
+    wallets = Wallet.objects.order_by("id")
+
+    valued = 0
+    last_id = 0
+    while True:
+        wallet_ids = list(
+            wallets.filter(id__gt=last_id).values_list("id", flat=True)[:batch_size]
+        )
+        if not wallet_ids:
+            break
+
+        valued += len(record_portfolio_values(wallet_ids, timestamp))
+        last_id = wallet_ids[-1]
+
+    return valued
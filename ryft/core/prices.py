@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+import numpy as np
+
+from ryft.core.models import EthPrice
+from ryft.core.snapshots import VersionedSnapshot
+
+
+class EthPriceSeries(VersionedSnapshot):
+    """
+    Daily ETH/USD prices from EthPrice as sorted arrays, so the price on any
+    date is a binary search and whole columns of dates convert at once
+    """
+
+    version_key = "eth_prices:version"
+
+    def load(self):
+        rows = list(
+            EthPrice.objects.order_by("date", "id").values_list("date", "value")
+        )
+        dates = np.array([date for date, _ in rows], dtype="datetime64[D]")
+        values = np.array([value for _, value in rows], dtype=np.float64)
+
+        # Keep the latest row of any date that was stored twice
+        keep = np.ones(len(dates), dtype=bool)
+        keep[:-1] = dates[1:] != dates[:-1]
+        return dates[keep], values[keep]
+
+    def as_of_many(self, dates):
+        """
+        :param dates: sequence of dates
+        :return: array of the price on or before each date, nan when there is none
+        """
+        price_dates, values = self.get()
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        if not len(price_dates):
+            return np.full(len(dates), np.nan)
+        index = np.searchsorted(price_dates, dates, side="right") - 1
+        return np.where(index >= 0, values[np.maximum(index, 0)], np.nan)
+
+    def as_of(self, date):
+        """
+        :return: the price on or before `date`, None when there is none
+        """
+        price = self.as_of_many([date])[0]
+        return None if np.isnan(price) else float(price)
+
+
+def usd_value(price_eth, ether_price):
+    """
+    :return: USD value of an ETH amount at `ether_price`, in whole dollars
+    """
+    return int(Decimal(str(ether_price)) * Decimal(str(price_eth)))
+
+
+eth_prices = EthPriceSeries()
@@ -0,0 +1,618 @@
+"""
+Rarity engine for ranking the NFTs of a collection.
+
+[Rarity Score for a Trait Value] =
+1 / ([Number of Items with that Trait Value] / [Total Number of Items in Collection])
+
+The NFT rarity score is the sum of its trait value scores plus the trait count
+score from rarity tools v1:
+
+[Trait Count Score] =
+[Number of distinct Trait Counts] * 2 / ([Number of Items with that Trait Count] / [Total])
+"""
+import bisect
+import logging
+from collections.abc import Mapping
+from dataclasses import dataclass
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Q
+
+from ryft.core.db import bulk_insert_ignore, bulk_update_values
+from ryft.core.models import (
+    NFT,
+    Collection,
+    CollectionAttribute,
+    NFTTrait,
+    NFTTraitSnapshot,
+)
+
+TRAIT_COUNT = "Trait Count"
+
+
+@dataclass
+class TraitMatrix:
+    """
+    The trait columns of every NFT in a collection, encoded as integer codes
+    """
+
+    nft_ids: np.ndarray  # (n,) NFT primary keys
+    trait_counts: np.ndarray  # (n,) NFT.trait_count
+    previous_scores: np.ndarray  # (n,) NFT.rarity_score, NaN when null
+    has_attributes: np.ndarray  # (n,) False for NFTs with no attributes
+    codes: np.ndarray  # (n, width) index into `pairs`, -1 for padding
+    scored: np.ndarray  # (n, width) True when the trait has both a name and a value
+    pairs: list  # [(name, value)] for every distinct trait value
+
+
+@dataclass
+class RarityResult:
+    occurrences: np.ndarray  # (len(pairs),) NFTs holding each trait value
+    trait_scores: np.ndarray  # (n, width) score of each trait, 0 when unscored
+    trait_count_occurrences: dict  # {trait_count: number of NFTs}
+    scores: np.ndarray  # (n,) rarity score, NaN when null
+    ranks: np.ndarray  # (n,) 1-based rank
+
+
+def build_trait_matrix(rows) -> TraitMatrix:
+    """
+    :param rows: iterable of (nft_id, trait_count, rarity_score, attributes)
+    """
+    pair_codes = {}
+    nft_ids, trait_counts, previous_scores, has_attributes = [], [], [], []
+    code_rows, scored_rows = [], []
+
+    for nft_id, trait_count, rarity_score, attributes in rows:
+        nft_ids.append(nft_id)
+        trait_counts.append(trait_count)
+        previous_scores.append(np.nan if rarity_score is None else rarity_score)
+        has_attributes.append(bool(attributes))
+
+        codes, scored = [], []
+        for attribute in attributes or []:
+            if not isinstance(attribute, Mapping):
+                continue
+
+            name = attribute.get("trait_type")  # e.g Hat
+            value = attribute.get("value")  # e.g Army Hat
+
+            # E.g for VeeFriends an attribute won't have a trait type: { "value": "Sky" }
+            key = name or value
+            codes.append(pair_codes.setdefault((key, value), len(pair_codes)))
+            scored.append(bool(name and value))
+
+        code_rows.append(codes)
+        scored_rows.append(scored)
+
+    n = len(nft_ids)
+    width = max((len(codes) for codes in code_rows), default=0)
+    code_matrix = np.full((n, width), -1, dtype=np.int64)
+    scored_matrix = np.zeros((n, width), dtype=bool)
+    for i, (codes, scored) in enumerate(zip(code_rows, scored_rows)):
+        code_matrix[i, : len(codes)] = codes
+        scored_matrix[i, : len(scored)] = scored
+
+    return TraitMatrix(
+        nft_ids=np.array(nft_ids, dtype=np.int64),
+        trait_counts=np.array(trait_counts, dtype=np.int64),
+        previous_scores=np.array(previous_scores, dtype=np.float64),
+        has_attributes=np.array(has_attributes, dtype=bool),
+        codes=code_matrix,
+        scored=scored_matrix,
+        pairs=list(pair_codes),
+    )
+
+
+def rank_scores(nft_ids: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """
+    1-based ranks matching ``order_by("-rarity_score")`` on Postgres, which puts
+    NULL scores first. Ties keep primary key order.
+    """
+    is_scored = ~np.isnan(scores)
+    order = np.lexsort((nft_ids, -np.nan_to_num(scores), is_scored))
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(1, len(order) + 1)
+    return ranks
+
+
+def score_trait_matrix(matrix: TraitMatrix, supply) -> RarityResult:
+    occurrences = np.bincount(
+        matrix.codes[matrix.codes >= 0], minlength=len(matrix.pairs)
+    )
+    code_scores = 1 / (occurrences / supply)
+    trait_scores = np.where(
+        matrix.scored, code_scores[np.maximum(matrix.codes, 0)], 0.0
+    )
+
+    # Add the columns one at a time so the floating point result is identical
+    # to summing each NFT's trait scores in order
+    totals = np.zeros(len(matrix.nft_ids), dtype=np.float64)
+    for column in trait_scores.T:
+        totals += column
+
+    count_values, count_index, count_occurrences = np.unique(
+        matrix.trait_counts, return_inverse=True, return_counts=True
+    )
+    count_scores = len(count_values) * 2 / (count_occurrences[count_index] / supply)
+
+    scores = np.where(
+        matrix.has_attributes, totals + count_scores, matrix.previous_scores
+    )
+
+    return RarityResult(
+        occurrences=occurrences,
+        trait_scores=trait_scores,
+        trait_count_occurrences=dict(
+            zip(count_values.tolist(), count_occurrences.tolist())
+        ),
+        scores=scores,
+        ranks=rank_scores(matrix.nft_ids, scores),
+    )
+
+
+def load_trait_matrix(collection: Collection) -> TraitMatrix:
+    return build_trait_matrix(
+        collection.nfts.values_list(
+            "id",
+            "trait_count",
+            "rarity_score",
+            "raw_metadata__metadata__attributes",
+        ).iterator(chunk_size=2000)
+    )
+
+
+def trait_score(occurrences, supply):
+    """Rarity score of a single trait value, None until its occurrences are known"""
+    if not occurrences or not supply:
+        return None
+    return 1 / (occurrences / supply)
+
+
+def save_trait_scores(attributes, supply):
+    """
+    Write the rarity score of every NFTTrait holding the given attributes
+
+    :param attributes: list of (attribute_id, occurrences)
+    """
+    rows = [
+        (attribute_id, trait_score(occurrences, supply))
+        for attribute_id, occurrences in attributes
+    ]
+    bulk_update_values(NFTTrait, rows, ["rarity_score"], key="attribute")
+
+
+def save_occurrences(collection: Collection, matrix: TraitMatrix, result, supply):
+    """
+    Make the collection's attributes match the trait values its NFTs hold:
+    write their occurrences and NFTTrait scores, create the attributes that
+    appeared, delete the ones no NFT holds anymore and replace the Trait
+    Count attributes
+    """
+    occurrence_map = {}
+    for (name, value), occurrences in zip(matrix.pairs, result.occurrences.tolist()):
+        if name and value:
+            key = (str(name), str(value))
+            occurrence_map[key] = occurrence_map.get(key, 0) + occurrences
+
+    attributes_for_update = []
+    attribute_ids_for_deletion = []
+    for attribute_id, name, value in collection.attributes.exclude(
+        name=TRAIT_COUNT
+    ).values_list("id", "name", "value"):
+        occurrences = occurrence_map.pop((name, value), None)
+        if occurrences:
+            attributes_for_update.append((attribute_id, occurrences))
+        else:
+            attribute_ids_for_deletion.append(attribute_id)
+
+    bulk_update_values(CollectionAttribute, attributes_for_update, ["occurrences"])
+    save_trait_scores(attributes_for_update, supply)
+    CollectionAttribute.objects.filter(id__in=attribute_ids_for_deletion).delete()
+    CollectionAttribute.objects.bulk_create(
+        [
+            CollectionAttribute(
+                collection=collection, name=name, value=value, occurrences=occurrences
+            )
+            for (name, value), occurrences in occurrence_map.items()
+            if occurrences
+        ],
+        batch_size=1000,
+    )
+
+    collection.attributes.filter(name=TRAIT_COUNT).delete()
+    CollectionAttribute.objects.bulk_create(
+        [
+            CollectionAttribute(
+                collection=collection,
+                name=TRAIT_COUNT,
+                value=trait_count,  # e.g. 7 - meaning 7 traits
+                occurrences=occurrences,  # e.g. 1883 occurrences of 7 traits
+            )
+            for trait_count, occurrences in result.trait_count_occurrences.items()
+        ]
+    )
+
+
+def save_scores(matrix: TraitMatrix, result: RarityResult):
+    rows = [
+        (nft_id, None if np.isnan(score) else score, rank)
+        for nft_id, score, rank in zip(
+            matrix.nft_ids.tolist(), result.scores.tolist(), result.ranks.tolist()
+        )
+    ]
+    bulk_update_values(NFT, rows, ["rarity_score", "rank"])
+
+
+def rank_collection(collection: Collection) -> RarityResult:
+    """
+    Load the collection's traits once, score and rank every NFT and write the
+    results back with one bulk statement per table
+    """
+    matrix = load_trait_matrix(collection)
+    logging.info(
+        msg=f"Loaded trait matrix {matrix.codes.shape} for {collection.contract_address}"
+    )
+
+    # The supply is entered manually so fall back to the number of NFTs fetched
+    supply = collection.supply or len(matrix.nft_ids)
+    result = score_trait_matrix(matrix, supply)
+
+    with transaction.atomic():
+        save_occurrences(collection, matrix, result, supply)
+        save_scores(matrix, result)
+        # Every NFT was counted afresh, so a stored snapshot is out of date
+        collection.trait_snapshots.all().delete()
+
+    return result
+
+
+def rank_key(nft_id, score):
+    """Sort key matching ``rank_scores``: NULL scores first, then score descending"""
+    if score is None:
+        return 0, 0.0, nft_id
+    return 1, -score, nft_id
+
+
+class RankIndex:
+    """
+    Ordered index of a collection's NFTs by rank so that changed NFTs can be
+    moved without re-sorting and rewriting every rank
+    """
+
+    def __init__(self, scores):
+        """
+        :param scores: iterable of (nft_id, rarity_score)
+        """
+        self.keys = sorted(rank_key(nft_id, score) for nft_id, score in scores)
+
+    def discard(self, key):
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del self.keys[index]
+
+    def add(self, key):
+        bisect.insort(self.keys, key)
+
+    def ranks(self):
+        return {key[2]: index + 1 for index, key in enumerate(self.keys)}
+
+
+def trait_pairs(attributes):
+    """(key, value, scored) for each of an NFT's attributes"""
+    pairs = []
+    for attribute in attributes or []:
+        if not isinstance(attribute, Mapping):
+            continue
+        name = attribute.get("trait_type")
+        value = attribute.get("value")
+        pairs.append((name or value, value, bool(name and value)))
+    return pairs
+
+
+def save_nft_traits(collection: Collection, nfts, batch_size=5000) -> int:
+    """
+    Bulk create the NFTTrait rows linking NFTs to the collection attributes
+    they hold. Callers remove the NFTs' previous traits first.
+
+    :param nfts: iterable of (nft_id, attributes)
+    :return: number of traits created
+    """
+    attributes = {
+        (name, value): (attribute_id, occurrences)
+        for attribute_id, name, value, occurrences in collection.attributes.exclude(
+            name=TRAIT_COUNT
+        ).values_list("id", "name", "value", "occurrences")
+    }
+    supply = collection.supply or collection.nfts.count()
+
+    created = 0
+    traits = []
+    for nft_id, nft_attributes in nfts:
+        seen = set()
+        for key, value, _ in trait_pairs(nft_attributes):
+            pair = (str(key), str(value))
+            if not (key and value) or pair in seen or pair not in attributes:
+                continue
+            seen.add(pair)
+
+            attribute_id, occurrences = attributes[pair]
+            traits.append(
+                NFTTrait(
+                    nft_id=nft_id,
+                    attribute_id=attribute_id,
+                    rarity_score=trait_score(occurrences, supply),
+                )
+            )
+
+        if len(traits) >= batch_size:
+            NFTTrait.objects.bulk_create(traits)
+            created += len(traits)
+            traits = []
+
+    NFTTrait.objects.bulk_create(traits)
+    return created + len(traits)
+
+
+def snapshot_nft_traits(collection: Collection, token_ids) -> dict:
+    """
+    The traits of NFTs about to change, used to compute occurrence deltas in
+    ``rerank_changed_nfts``. Token IDs without an NFT yet are recorded as None
+    """
+    snapshot = {str(token_id): None for token_id in token_ids}
+    for token_id, trait_count, attributes in collection.nfts.filter(
+        token_id__in=list(snapshot)
+    ).values_list("token_id", "trait_count", "raw_metadata__metadata__attributes"):
+        snapshot[token_id] = [trait_count, attributes]
+    return snapshot
+
+
+def save_nft_trait_snapshot(collection: Collection, token_ids) -> int:
+    """
+    Store the traits of NFTs about to change until the collection is re-ranked.
+    An NFT changed again before then keeps its first snapshot, the traits its
+    occurrences were counted with
+
+    :return: the number of NFTs snapshotted
+    """
+    snapshot = snapshot_nft_traits(collection, token_ids)
+    bulk_insert_ignore(
+        NFTTraitSnapshot,
+        [
+            NFTTraitSnapshot(
+                collection=collection,
+                token_id=token_id,
+                trait_count=before[0] if before is not None else None,
+                attributes=before[1] if before is not None else None,
+            )
+            for token_id, before in snapshot.items()
+        ],
+    )
+    return len(snapshot)
+
+
+def rerank_snapshotted_nfts(collection: Collection) -> int:
+    """
+    Re-rank the NFTs of the collection's stored snapshot with
+    ``rerank_changed_nfts``, then drop the snapshot
+
+    :return: the number of NFTs written
+    """
+    snapshots = collection.trait_snapshots.values_list(
+        "id", "token_id", "trait_count", "attributes"
+    )
+    snapshot_ids = []
+    previous = {}
+    for snapshot_id, token_id, trait_count, attributes in snapshots:
+        snapshot_ids.append(snapshot_id)
+        previous[token_id] = None if trait_count is None else [trait_count, attributes]
+
+    written = rerank_changed_nfts(collection, previous)
+    NFTTraitSnapshot.objects.filter(id__in=snapshot_ids).delete()
+    return written
+
+
+def _apply_occurrence_deltas(collection, pair_deltas, count_deltas):
+    """
+    Adjust CollectionAttribute occurrences, creating attributes that appeared
+    and deleting the ones no NFT holds anymore
+    """
+    deltas = {
+        (str(key), str(value)): delta
+        for (key, value), delta in pair_deltas.items()
+        if key and value and delta
+    }
+    deltas.update(
+        {
+            (TRAIT_COUNT, str(trait_count)): delta
+            for trait_count, delta in count_deltas.items()
+            if delta
+        }
+    )
+    if not deltas:
+        return
+
+    existing = {}
+    for attribute_id, name, value, occurrences in collection.attributes.filter(
+        name__in={name for name, _ in deltas}
+    ).values_list("id", "name", "value", "occurrences"):
+        existing[(name, value)] = (attribute_id, occurrences)
+
+    attributes_for_update = []
+    attributes_for_creation = []
+    attribute_ids_for_deletion = []
+    for (name, value), delta in deltas.items():
+        if (name, value) in existing:
+            attribute_id, occurrences = existing[(name, value)]
+            if occurrences + delta > 0:
+                attributes_for_update.append((attribute_id, occurrences + delta))
+            else:
+                attribute_ids_for_deletion.append(attribute_id)
+        elif delta > 0:
+            attributes_for_creation.append(
+                CollectionAttribute(
+                    collection=collection, name=name, value=value, occurrences=delta
+                )
+            )
+
+    bulk_update_values(CollectionAttribute, attributes_for_update, ["occurrences"])
+    save_trait_scores(attributes_for_update, collection.supply)
+    CollectionAttribute.objects.bulk_create(attributes_for_creation)
+    CollectionAttribute.objects.filter(id__in=attribute_ids_for_deletion).delete()
+
+
+def rerank_changed_nfts(collection: Collection, previous: dict) -> int:
+    """
+    Re-rank a collection after some of its NFTs were added or had their
+    metadata changed, without recomputing the whole collection. A collection
+    that lost NFTs is ranked in full.
+
+    Occurrences are adjusted by deltas, scores are recomputed only for NFTs
+    holding an affected trait value or trait count, and ranks are moved
+    through a ``RankIndex`` so only the NFTs whose rank changed are written.
+
+    :param previous: snapshot from ``snapshot_nft_traits`` taken before the change
+    :return: the number of NFTs written
+    """
+    if not previous:
+        return 0
+
+    changed = list(
+        collection.nfts.filter(token_id__in=list(previous)).values_list(
+            "id", "token_id", "trait_count", "raw_metadata__metadata__attributes"
+        )
+    )
+
+    fetched = {token_id for _, token_id, *_ in changed}
+    pruned = any(
+        before is not None and token_id not in fetched
+        for token_id, before in previous.items()
+    )
+
+    pair_deltas = {}
+    count_deltas = {}
+    for _, token_id, trait_count, attributes in changed:
+        before = previous.get(token_id)
+        if before is not None:
+            before_count, before_attributes = before
+            count_deltas[before_count] = count_deltas.get(before_count, 0) - 1
+            for key, value, _ in trait_pairs(before_attributes):
+                pair_deltas[(key, value)] = pair_deltas.get((key, value), 0) - 1
+        count_deltas[trait_count] = count_deltas.get(trait_count, 0) + 1
+        for key, value, _ in trait_pairs(attributes):
+            pair_deltas[(key, value)] = pair_deltas.get((key, value), 0) + 1
+
+    pair_deltas = {pair: delta for pair, delta in pair_deltas.items() if delta}
+    count_deltas = {count: delta for count, delta in count_deltas.items() if delta}
+
+    trait_count_occurrences = dict(
+        collection.nfts.order_by()
+        .values_list("trait_count")
+        .annotate(occurrences=Count("id"))
+    )
+    previous_trait_counts = {
+        count
+        for count in set(trait_count_occurrences) | set(count_deltas)
+        if trait_count_occurrences.get(count, 0) - count_deltas.get(count, 0) > 0
+    }
+
+    # A new or vanished trait count changes every NFT's trait count score, and
+    # without a supply the score depends on the number of NFTs, as it does when
+    # NFTs were deleted. Scoring the whole collection also rebuilds its
+    # attributes
+    if (
+        pruned
+        or not collection.supply
+        or previous_trait_counts != set(trait_count_occurrences)
+    ):
+        written = len(rank_collection(collection).ranks)
+    else:
+        try:
+            written = _rerank_affected_nfts(
+                collection, changed, pair_deltas, count_deltas, trait_count_occurrences
+            )
+        except CollectionAttribute.DoesNotExist:
+            # The attributes are out of date, so score the whole collection and
+            # rebuild them
+            written = len(rank_collection(collection).ranks)
+
+    changed_ids = [nft_id for nft_id, *_ in changed]
+    with transaction.atomic():
+        NFTTrait.objects.filter(nft_id__in=changed_ids).delete()
+        save_nft_traits(
+            collection,
+            ((nft_id, attributes) for nft_id, _, _, attributes in changed),
+        )
+
+    return written
+
+
+def _rerank_affected_nfts(
+    collection, changed, pair_deltas, count_deltas, trait_count_occurrences
+):
+    with transaction.atomic():
+        _apply_occurrence_deltas(collection, pair_deltas, count_deltas)
+
+        affected = Q(id__in=[nft_id for nft_id, *_ in changed])
+        if count_deltas:
+            affected |= Q(trait_count__in=list(count_deltas))
+        for key, value in pair_deltas:
+            attribute = {"value": value}
+            if key != value:
+                attribute["trait_type"] = key
+            # Top-level containment so the lookup can use nft_raw_metadata_gin_idx
+            affected |= Q(
+                raw_metadata__contains={"metadata": {"attributes": [attribute]}}
+            )
+
+        occurrences = {
+            (name, value): count
+            for name, value, count in collection.attributes.exclude(
+                name=TRAIT_COUNT
+            ).values_list("name", "value", "occurrences")
+        }
+        supply = collection.supply
+
+        new_scores = {}
+        for nft_id, trait_count, attributes in collection.nfts.filter(
+            affected
+        ).values_list("id", "trait_count", "raw_metadata__metadata__attributes"):
+            if not attributes:
+                continue
+
+            total_score = 0
+            for key, value, scored in trait_pairs(attributes):
+                if scored:
+                    trait_sum = occurrences.get((str(key), str(value)))
+                    if not trait_sum:
+                        raise CollectionAttribute.DoesNotExist
+                    total_score += 1 / (trait_sum / supply)
+
+            attribute_score = (
+                len(trait_count_occurrences)
+                * 2
+                / (trait_count_occurrences[trait_count] / supply)
+            )
+            new_scores[nft_id] = total_score + attribute_score
+
+        current = {
+            nft_id: (score, rank)
+            for nft_id, score, rank in collection.nfts.values_list(
+                "id", "rarity_score", "rank"
+            )
+        }
+        index = RankIndex((nft_id, score) for nft_id, (score, _) in current.items())
+        for nft_id, score in new_scores.items():
+            index.discard(rank_key(nft_id, current[nft_id][0]))
+            index.add(rank_key(nft_id, score))
+
+        rows = []
+        for nft_id, rank in index.ranks().items():
+            score, previous_rank = current[nft_id]
+            score = new_scores.get(nft_id, score)
+            if nft_id in new_scores or rank != previous_rank:
+                rows.append((nft_id, score, rank))
+
+        bulk_update_values(NFT, rows, ["rarity_score", "rank"])
+
+    return len(rows)
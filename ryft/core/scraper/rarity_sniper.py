@@ -166,36 +166,6 @@ class RaritySniperScraper:
 
         return collection
 
-    def get_all_csv_data(self):
-        collections = []
-        collection_details = []
-        with open("data/collections-duplicate.csv") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                collections.append(
-                    {
-                        "Name": row["Name"],
-                        "Thumbnail": row["Thumbnail"],
-                        "Href": row["Href"],
-                    }
-                )
-
-        with open("data/rarity_sniper_collections-duplicate.csv") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                collection_details.append(
-                    {
-                        "Href": row["Href"],
-                        "Supply": row["Supply"],
-                        "OpenseaURL": row["OpenseaURL"],
-                        "DiscordURL": row["DiscordURL"],
-                        "TwitterURL": row["TwitterURL"],
-                        "LooksrareURL": row["LooksrareURL"],
-                        "PreviewImages": row["PreviewImages"],
-                    }
-                )
-        return collections, collection_details
-
     def get_contract_address(self, collection):
         looksrare_url = collection.get("LooksrareURL")
         # https://looksrare.org/collections/0xbc4ca0eda7647a8ab7c2061c2e118a18a936f13d
@@ -0,0 +1,179 @@
+"""
+Loading of the seed data in the repository's data directory.
+
+CSV files are read lazily and written in chunks with one upsert per chunk.
+The natural key and values of every existing row are fetched once up front,
+so rows that are already stored unchanged are skipped and loading the same
+file again doesn't write anything.
+"""
+import csv
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from ryft.core.db import bulk_insert_ignore, bulk_upsert
+from ryft.core.models import Collection, EthPrice
+from ryft.core.utils import chunked
+
+DATA_DIR = settings.ROOT_DIR / "data"
+
+
+@dataclass
+class SeedResult:
+    created: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    unchanged: int = 0
+
+    def __str__(self):
+        return (
+            f"{len(self.created)} created, {len(self.updated)} updated, "
+            f"{self.unchanged} unchanged"
+        )
+
+
+def read_csv(name):
+    """
+    :return: an iterator over the rows of a CSV file in the data directory
+    """
+    with open(DATA_DIR / name, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def seed(model, objs, key, update_fields, chunk_size=1000):
+    """
+    Upsert unsaved model instances on their natural key.
+
+    Neither pre_save nor post_save are sent, so `objs` must already hold the
+    values that would be stored. When a key appears more than once the last
+    instance wins.
+
+    :param key: name of a unique field
+    :param update_fields: fields overwritten when the row already exists,
+        existing rows are left untouched when empty
+    :return: the keys that were created and updated
+    """
+    opts = model._meta
+    key_field = opts.get_field(key)
+    fields = [opts.get_field(name) for name in update_fields]
+
+    def prep(model_field, value):
+        # Compare values the way they are stored so "2017-11-09" matches its
+        # date and decimals match once rounded to the field's places like
+        # Postgres does
+        value = model_field.to_python(value)
+        if isinstance(value, Decimal):
+            value = value.quantize(
+                Decimal(1).scaleb(-model_field.decimal_places), rounding=ROUND_HALF_UP
+            )
+        return value
+
+    existing = {
+        prep(key_field, values[0]): tuple(
+            prep(model_field, value) for model_field, value in zip(fields, values[1:])
+        )
+        for values in model.objects.values_list(key, *update_fields).iterator()
+    }
+
+    result = SeedResult()
+    for chunk in chunked(objs, chunk_size):
+        # A single statement can't upsert the same row twice
+        by_key = {prep(key_field, getattr(obj, key)): obj for obj in chunk}
+
+        changed = []
+        for obj_key, obj in by_key.items():
+            values = tuple(
+                prep(model_field, getattr(obj, model_field.attname))
+                for model_field in fields
+            )
+            if obj_key not in existing:
+                result.created.append(obj_key)
+            elif existing[obj_key] != values:
+                result.updated.append(obj_key)
+            else:
+                result.unchanged += 1
+                continue
+            existing[obj_key] = values
+            changed.append(obj)
+
+        with transaction.atomic():
+            if update_fields:
+                bulk_upsert(
+                    model,
+                    changed,
+                    conflict_fields=[key],
+                    update_fields=update_fields,
+                    page_size=chunk_size,
+                )
+            else:
+                bulk_insert_ignore(model, changed, page_size=chunk_size)
+
+    return result
+
+
+def seed_eth_prices(name="ETH-USD.csv"):
+    """
+    Daily closing ETH/USD prices
+    """
+    prices = (
+        EthPrice(date=row["Date"], value=row["Close"])
+        for row in read_csv(name)
+        if row["Close"] not in ("", "null")
+    )
+    return seed(EthPrice, prices, key="date", update_fields=["value"])
+
+
+def get_contract_address(looksrare_url):
+    # https://looksrare.org/collections/0xbc4ca0eda7647a8ab7c2061c2e118a18a936f13d
+    if not looksrare_url:
+        return None
+    return looksrare_url.split("/")[-1].lower()
+
+
+def format_supply(raw_supply):
+    # '20,000 items'
+    raw_number = raw_supply.split(" ")[0].replace(",", "")
+    return int(raw_number) if raw_number.isdigit() else None
+
+
+def iter_scraped_collections(
+    collections="collections-duplicate.csv",
+    details="rarity_sniper_collections-duplicate.csv",
+):
+    """
+    Join the collections scraped from Rarity Sniper with their details. Both
+    files hold one row per collection in the same order.
+
+    :return: an iterator over the rows that have a contract address
+    """
+    for collection, detail in zip(read_csv(collections), read_csv(details)):
+        contract_address = get_contract_address(detail["LooksrareURL"])
+        if contract_address:
+            yield {**collection, **detail, "contract_address": contract_address}
+
+
+def seed_collections():
+    """
+    Collections scraped from Rarity Sniper.
+
+    Only missing collections are created, the ones already stored are curated
+    in the admin. Rarity isn't calculated for the collections that are
+    created, as it would be by Collection's post_save; fetch their NFTs with
+    `ingest_collections`.
+    """
+    collections = (
+        Collection(
+            contract_address=row["contract_address"],
+            name=row["Name"],
+            description="Todo",
+            supply=format_supply(row["Supply"]),
+            released=True,
+            verified=True,
+            discord_link=row["DiscordURL"],
+            twitter_link=row["TwitterURL"],
+            opensea_link=row["OpenseaURL"],
+        )
+        for row in iter_scraped_collections()
+    )
+    return seed(Collection, collections, key="contract_address", update_fields=[])
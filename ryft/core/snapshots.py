@@ -0,0 +1,38 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+
+
+class VersionedSnapshot:
+    """
+    Data loaded from the database and held in memory by each process.
+
+    A version token in the shared cache is bumped with `invalidate` whenever
+    the underlying rows change, and each process reloads its copy the next
+    time it sees a new token. Reading the data is then one cache read
+    instead of a query.
+    """
+
+    version_key = None
+
+    def __init__(self):
+        self._data = None
+        self._version = None
+
+    def load(self):
+        raise NotImplementedError
+
+    def get(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid4().hex
+            if not cache.add(self.version_key, version, timeout=None):
+                version = cache.get(self.version_key, version)
+
+        if version != self._version:
+            self._data = self.load()
+            self._version = version
+        return self._data
+
+    def invalidate(self):
+        cache.set(self.version_key, uuid4().hex, timeout=None)
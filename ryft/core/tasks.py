@@ -1,17 +1,24 @@
+import asyncio
 import datetime
+import hashlib
+import json
 import logging
-import time
 from collections.abc import Mapping
 
+import numpy as np
+from asgiref.sync import sync_to_async
 from celery import chain
-from dateutil import parser
-from django.db import connection
-from django.db.models import QuerySet
+from django.db import connection, connections, transaction
+from django.db.models.functions import TruncDate
 from pycoingecko import CoinGeckoAPI
 
 from config.celery_app import app
-from ryft.core.integrations.alchemy import get_alchemy_client
+from ryft.core.collection_history import OWNERS_HISTORY, PRICE_HISTORY, refresh_history
+from ryft.core.db import bulk_update_values, bulk_upsert
+from ryft.core.integrations.alchemy import AsyncAlchemyClient, get_alchemy_client
+from ryft.core.integrations.errors import MnemonicPageError
 from ryft.core.integrations.mnemonic import TrendingBy, mnemonic_client
+from ryft.core.linking import link_transactions, link_wallet_nfts
 from ryft.core.models import (
     NFT,
     APICallRecordLog,
@@ -22,159 +29,210 @@ from ryft.core.models import (
     EthPrice,
     Transaction,
     TrendingCollections,
-    WalletNFT,
 )
+from ryft.core.prices import eth_prices, usd_value
+from ryft.core.rarity import (
+    rank_collection,
+    rerank_snapshotted_nfts,
+    save_nft_trait_snapshot,
+    save_nft_traits,
+)
+from ryft.core.seeds import seed_eth_prices
 from ryft.core.services.logging import logging_service
+from ryft.core.transfers import sync_collection_transfers
 
 
 @app.task(name="rank_nfts")
 def rank_nfts(contract_address):
     collection = Collection.objects.get(contract_address=contract_address)
 
-    # Calculate the number of occurrences for each {name, value} combo
-    trait_type_map = {}
+    result = rank_collection(collection)
+    logging.info(
+        msg=f"Ranked {len(result.ranks)} NFTs for collection {contract_address}"
+    )
 
-    for nft in collection.nfts.all().values("id", "raw_metadata__metadata__attributes"):
-        attributes_values = nft["raw_metadata__metadata__attributes"]
+    connection.close()
 
-        if attributes_values is not None:
-            for attribute in attributes_values:
-                name = attribute.get("trait_type")  # e.g Hat
-                value = attribute.get("value")  # e.g Army Hat
 
-                key = name
-                if not name:
-                    key = value
+@app.task(name="rerank_nfts")
+def rerank_nfts(contract_address):
+    """
+    Incrementally re-rank a collection after NFTs were added or changed,
+    using the traits `fetch_nfts` stored before changing them
+    """
+    collection = Collection.objects.get(contract_address=contract_address)
 
-                if key in trait_type_map:
-                    attribute_type = trait_type_map[key]
-                    if value in attribute_type:
-                        trait_type_map[key][value] += 1
-                    else:
-                        trait_type_map[key][value] = 1
-                else:
-                    trait_type_map[key] = {value: 1}
-
-    logging.info(msg=f"Created attribute trait map for {contract_address}")
-
-    # Here we create a CollectionAttribute for each of the Trait Counts
-    # i.e. there are 1993 NFTs with 7 traits, 5232 NFTs with 6 traits etc.
-    nft_trait_count_map = {}
-    for nft_trait_count in collection.nfts.all().values_list("trait_count", flat=True):
-        if nft_trait_count in nft_trait_count_map:
-            nft_trait_count_map[nft_trait_count] += 1
-        else:
-            nft_trait_count_map[nft_trait_count] = 1
+    updated = rerank_snapshotted_nfts(collection)
+    logging.info(msg=f"Re-ranked {updated} NFTs for collection {contract_address}")
 
-    CollectionAttribute.objects.bulk_create(
-        [
-            CollectionAttribute(
-                collection=collection,
-                name="Trait Count",
-                value=nft_trait_count,  # e.g. 7 - meaning 7 traits
-                occurrences=nft_trait_count_map[
-                    nft_trait_count
-                ],  # e.g. 1883 occurrences of 7 traits
-            )
-            for nft_trait_count in nft_trait_count_map.keys()
-        ]
-    )
+    connection.close()
 
-    logging.info(
-        msg=f"Bulk-created collection attributes for trait counts for {contract_address}"
-    )
 
-    # Save the number of NFTs for each trait and value
-    collection_attributes_for_update = []
-    for trait_name in trait_type_map.keys():
-        if trait_name:
-            trait_types = trait_type_map[trait_name]
-            for trait_value in trait_types.keys():
-                if trait_value:
-                    trait_type_count = trait_types[trait_value]
-                    collection_attribute = CollectionAttribute.objects.get(
-                        collection=collection, name=trait_name, value=trait_value
-                    )
-                    collection_attribute.occurrences = trait_type_count
-                    collection_attributes_for_update.append(collection_attribute)
-
-    CollectionAttribute.objects.bulk_update(
-        collection_attributes_for_update, ["occurrences"], batch_size=100
-    )
-    logging.info(
-        msg=f"Updated collection attributes with occurrence counts for {contract_address}"
+def get_metadata_hash(nft):
+    """
+    Hash of the parts of an Alchemy NFT item that are saved and ranked on.
+    Fields such as `timeLastUpdated` change on every fetch and are left out
+    """
+    stable = {key: nft.get(key) for key in ("name", "title", "metadata", "media")}
+    return hashlib.sha256(json.dumps(stable, sort_keys=True).encode()).hexdigest()
+
+
+def build_nft(collection, nft):
+    """
+    Build an unsaved NFT from an Alchemy getNFTsForCollection item
+    """
+    metadata = nft.get("metadata")
+    if metadata is None or isinstance(metadata, Mapping) is False:
+        logging.warning(
+            msg=f"NFT is missing in Alchemy collection response data for contract: "
+            f"{collection.contract_address} and nft: {nft}"
+        )
+        return None
+
+    attributes = metadata.get("attributes")
+
+    if not attributes:
+        trait_count = 0
+    else:
+        trait_count = len(attributes)
+
+    token_id_str = nft.get("id").get("tokenId")
+    if isinstance(token_id_str, str):
+        token_id = int(token_id_str, base=16)
+    else:
+        token_id = token_id_str
+
+    media = nft.get("media")
+    image_url = None
+
+    if media and len(media) > 0:
+        thumbnail = media[0].get("thumbnail")
+        gateway_url = media[0].get("gateway")  # IPFS
+
+        if thumbnail:
+            image_url = thumbnail
+        elif gateway_url:
+            if "https" in gateway_url:
+                image_url = gateway_url
+
+    if not token_id:
+        return None
+
+    return NFT(
+        collection=collection,
+        name=nft.get("name"),
+        token_id=str(token_id),
+        image_url=image_url,
+        raw_metadata=nft,
+        metadata_hash=get_metadata_hash(nft),
+        trait_count=trait_count,
     )
 
-    # Calculate rarity
+
+def save_nft_page(collection, nfts):
     """
-    [Rarity Score for a Trait Value] =
-    1 / ([Number of Items with that Trait Value] / [Total Number of Items in Collection])
+    Upsert a page of NFTs on (collection, token_id), only writing the NFTs
+    that are new or whose metadata hash changed.
+
+    The previous traits of the written NFTs are stored for `rerank_nfts`.
+
+    :return: number of NFTs written
     """
-    collection_attributes = CollectionAttribute.objects.filter(
-        collection=collection, name="Trait Count"
+    # The same token can't be upserted twice in one statement
+    nfts = list({nft.token_id: nft for nft in nfts}.values())
+
+    existing_hashes = dict(
+        collection.nfts.filter(token_id__in=[nft.token_id for nft in nfts]).values_list(
+            "token_id", "metadata_hash"
+        )
     )
-    collection_attributes_count = collection_attributes.count()
-
-    nfts_for_update = []
-    NFT.objects.filter(collection=collection)
-    for nft in collection.nfts.all():
-        # fetch all traits for NFT
-        total_score = 0
-        metadata = nft.raw_metadata["metadata"]
-        attributes_values = metadata.get("attributes")
-        if attributes_values:
-
-            for attribute in attributes_values:
-                name = attribute.get("trait_type", None)  # e.g Hat
-                value = attribute.get("value", None)  # e.g Army Hat
-
-                if name and value:
-                    # Number of Items with that Trait Value
-                    trait_sum = trait_type_map[name][value]
-                    rarity_score = 1 / (trait_sum / collection.supply)
-                    # TODO we could store rarity score on the metadata in case wanting to render it in the future
-                    total_score += rarity_score
-                else:
-                    logging.error(
-                        msg=f"NFT attribute data error in contract {contract_address} for NFT ID {nft.id}"
-                    )
-
-            # Add the NFT Trait Count Rarity score
-            # The formula for the attribute score comes from rarity tools v1
-            occurrences = nft_trait_count_map[nft.trait_count]
-            attribute_score = (
-                collection_attributes_count * 2 / (occurrences / collection.supply)
-            )
+    changed = [
+        nft
+        for nft in nfts
+        if nft.token_id not in existing_hashes
+        or existing_hashes[nft.token_id] != nft.metadata_hash
+    ]
+    if not changed:
+        return 0
+
+    save_nft_trait_snapshot(collection, [nft.token_id for nft in changed])
+    bulk_upsert(
+        NFT,
+        changed,
+        conflict_fields=["collection", "token_id"],
+        update_fields=[
+            "name",
+            "image_url",
+            "raw_metadata",
+            "metadata_hash",
+            "trait_count",
+        ],
+        changed_field="metadata_hash",
+    )
+    return len(changed)
 
-            nft.rarity_score = total_score + attribute_score
-            nfts_for_update.append(nft)
 
-    NFT.objects.bulk_update(nfts_for_update, ["rarity_score"], batch_size=100)
+def prune_nfts(collection, seen_token_ids):
+    """
+    Delete the collection's NFTs that a complete fetch didn't return, e.g.
+    burned tokens. Their traits are stored for `rerank_nfts`.
 
-    logging.info(msg=f"Saved NFT rarity scores for collection {contract_address}")
+    :return: number of NFTs deleted
+    """
+    # An empty fetch is more likely an API failure than a burned collection
+    if not seen_token_ids:
+        return 0
 
-    # Rank NFTs
-    nfts_for_update = []
-    for index, nft in enumerate(collection.nfts.all().order_by("-rarity_score")):
-        nft.rank = index + 1
-        nfts_for_update.append(nft)
+    stale = list(
+        set(collection.nfts.values_list("token_id", flat=True)) - set(seen_token_ids)
+    )
+    if not stale:
+        return 0
 
-    NFT.objects.bulk_update(nfts_for_update, ["rank"], batch_size=100)
-    logging.info(msg=f"Ranked NFTs for collection {contract_address}")
+    with transaction.atomic():
+        save_nft_trait_snapshot(collection, stale)
+        collection.nfts.filter(token_id__in=stale).delete()
+    return len(stale)
 
-    connection.close()
+
+def save_nft_response(collection, data, seen_token_ids=None):
+    """
+    Record a getNFTsForCollection call and save the NFTs of its page
+
+    :param seen_token_ids: set updated with the token ids of the page
+    :return: number of new and changed NFTs written
+    """
+    APICallRecordLog.objects.create(client="alchemy", service="get_nfts_for_collection")
+    logging_service.log(
+        {
+            "Event": "Fetch NFTs for Collection",
+            "Service": "Alchemy",
+            "Collection_ID": collection.id,
+            "Contract_Address": collection.contract_address,
+        }
+    )
+    nft_objs = [build_nft(collection, nft) for nft in data["nfts"]]
+    nft_objs = [nft for nft in nft_objs if nft]
+    if seen_token_ids is not None:
+        seen_token_ids.update(nft.token_id for nft in nft_objs)
+    return save_nft_page(collection, nft_objs)
 
 
 @app.task(name="fetch_nfts")
 def fetch_nfts(contract_address):
+    """
+    Stream the collection's NFTs from Alchemy, upserting each page as it
+    arrives so existing NFTs keep their ids and links. NFTs that aren't
+    returned anymore are deleted once every page was fetched.
+
+    :return: number of new and changed NFTs written
+    """
     collection = Collection.objects.get(contract_address=contract_address)
     logging.info(msg=f"Starting to fetch NFTs for contract: {contract_address}")
     alchemy_client = get_alchemy_client()
 
-    # Clear out NFTs
-    collection.nfts.all().delete()
-
-    nfts = []
+    saved = 0
+    seen_token_ids = set()
 
     has_next_page = True
     page_token = None
@@ -182,81 +240,22 @@ def fetch_nfts(contract_address):
         data = alchemy_client.get_nfts_for_collection(
             contract_address, start_token=page_token
         )
-        APICallRecordLog.objects.create(
-            client="alchemy", service="get_nfts_for_collection"
-        )
-        logging_service.log(
-            {
-                "Event": "Fetch NFTs for Collection",
-                "Service": "Alchemy",
-                "Collection_ID": collection.id,
-                "Contract_Address": contract_address,
-            }
-        )
-        nft_objs = []
-        for nft in data["nfts"]:
-            metadata = nft.get("metadata")
-            if metadata is None or isinstance(metadata, Mapping) is False:
-                logging.warning(
-                    msg=f"NFT is missing in Alchemy collection response data for contract: "
-                    f"{contract_address} and nft: {nft}"
-                )
-            else:
-                attributes = metadata.get("attributes")
-
-                if not attributes:
-                    trait_count = 0
-                else:
-                    trait_count = len(attributes)
-
-                token_id_str = nft.get("id").get("tokenId")
-                if isinstance(token_id_str, str):
-                    token_id = int(token_id_str, base=16)
-                else:
-                    token_id = token_id_str
-
-                media = nft.get("media")
-                image_url = None
-
-                if media and len(media) > 0:
-                    # print(f"NFT {nft.id} from collection {collection.id} media does not have media: {media}")
-                    thumbnail = media[0].get("thumbnail")
-                    gateway_url = media[0].get("gateway")  # IPFS
-
-                    if thumbnail:
-                        image_url = thumbnail
-                    elif gateway_url:
-                        if "https" in gateway_url:
-                            image_url = gateway_url
-                    else:
-                        pass
-                        # print(f"NFT {nft.id} media does not have thumbnail: {media}")
-
-                if token_id:
-                    nft_obj = NFT(
-                        collection=collection,
-                        name=nft.get("name"),
-                        token_id=token_id,
-                        image_url=image_url,
-                        raw_metadata=nft,
-                        trait_count=trait_count,
-                    )
-                    nft_objs.append(nft_obj)
-
-        nfts += nft_objs
+        saved += save_nft_response(collection, data, seen_token_ids)
 
         page_token = data.get("nextToken")
         if not page_token or len(data["nfts"]) == 0:
             has_next_page = False
 
-    logging.info(msg=f"Bulk creating NFTs for contract {contract_address}...")
-
-    # Bulk create NFTs
-    NFT.objects.bulk_create(nfts, batch_size=100)
-    logging.info(msg=f"Created NFTs for contract {contract_address}")
+    pruned = prune_nfts(collection, seen_token_ids)
+    logging.info(
+        msg=f"Saved {saved} new or changed NFTs and deleted {pruned} NFTs "
+        f"for contract {contract_address}"
+    )
 
     connection.close()
 
+    return saved
+
 
 @app.task(name="create_nft_attributes")
 def create_nft_attributes(contract_address):
@@ -308,32 +307,27 @@ def create_nft_attributes(contract_address):
     )
     logging.info(msg=f"Created CollectionAttributes for contract {contract_address}")
 
+    # Deleting the attributes above also removed the previous NFT traits
+    trait_count = save_nft_traits(
+        collection,
+        collection.nfts.values_list(
+            "id", "raw_metadata__metadata__attributes"
+        ).iterator(chunk_size=2000),
+    )
+    logging.info(msg=f"Created {trait_count} NFTTraits for contract {contract_address}")
+
     connection.close()
 
 
 @app.task(name="link_nfts_to_transactions")
 def link_nfts_to_transactions(contract_address):
     logging.info(
-        msg=f"Started linking nfts to wallets for contract: {contract_address}"
-    )
-    collection = Collection.objects.get(contract_address=contract_address)
-    transactions: QuerySet[Transaction] = Transaction.objects.filter(
-        contract_address=contract_address, collection_only=False
+        msg=f"Started linking nfts to transactions for contract: {contract_address}"
     )
-
-    transactions_to_update = []
-    # Assign NFT based on token_id of transaction
-    for transaction_obj in transactions:
-        nft = NFT.objects.filter(
-            collection=collection, token_id=transaction_obj.token_id
-        ).first()
-        transaction_obj.nft = nft
-        transactions_to_update.append(transaction_obj)
-
-    Transaction.objects.bulk_update(transactions_to_update, ["nft"], batch_size=100)
+    linked = link_transactions([contract_address])
 
     logging.info(
-        msg=f"Finished linking nfts to transactions for contract: {contract_address}"
+        msg=f"Finished linking {linked} nfts to transactions for contract: {contract_address}"
     )
 
     connection.close()
@@ -346,29 +340,35 @@ def link_nfts_to_wallets(contract_address):
     logging.info(
         msg=f"Started linking nfts to wallets for contract: {contract_address}"
     )
-    collection = Collection.objects.get(contract_address=contract_address)
-    wallet_nfts = WalletNFT.objects.filter(
-        nft_raw_data__contract_address=contract_address
+    linked = link_wallet_nfts([contract_address])
+
+    logging.info(
+        msg=f"Finished linking {linked} nfts to wallets for contract: {contract_address}"
     )
 
-    wallet_nfts_to_update = []
+    connection.close()
 
-    for wallet_nft in wallet_nfts:
-        token_id = wallet_nft.nft_raw_data.get("token_id", None)
-        if not token_id:
-            logging.warning(
-                msg=f"WalletNFT has missing token_id in nft_raw_data for walletnft: {wallet_nft.id}"
-            )
-        else:
-            wallet_nft.nft = NFT.objects.filter(
-                collection=collection, token_id=token_id
-            ).first()
-            wallet_nfts_to_update.append(wallet_nft)
+    return "Done"
 
-    WalletNFT.objects.bulk_update(wallet_nfts_to_update, ["nft"], batch_size=100)
+
+@app.task(name="link_nfts_for_collections")
+def link_nfts_for_collections(contract_addresses=None):
+    """
+    Link NFTs to transactions and wallets for many collections in one pass,
+    defaults to every collection
+    """
+    if contract_addresses is None:
+        contract_addresses = list(
+            Collection.objects.values_list("contract_address", flat=True)
+        )
+    logging.info(msg=f"Started linking nfts for {len(contract_addresses)} collections")
+
+    transactions_linked = link_transactions(contract_addresses)
+    wallet_nfts_linked = link_wallet_nfts(contract_addresses)
 
     logging.info(
-        msg=f"Finished linking nfts to wallets for contract: {contract_address}"
+        msg=f"Finished linking nfts for {len(contract_addresses)} collections: "
+        f"{transactions_linked} transactions, {wallet_nfts_linked} wallet nfts"
     )
 
     connection.close()
@@ -376,6 +376,55 @@ def link_nfts_to_wallets(contract_address):
     return "Done"
 
 
+async def _fetch_collection_nfts(client, contract_address):
+    collection = await sync_to_async(Collection.objects.get)(
+        contract_address=contract_address
+    )
+    saved = 0
+    seen_token_ids = set()
+    async for data in client.iter_nfts_for_collection(contract_address):
+        saved += await sync_to_async(save_nft_response)(
+            collection, data, seen_token_ids
+        )
+    await sync_to_async(prune_nfts)(collection, seen_token_ids)
+    return saved
+
+
+async def _fetch_collections_nfts(contract_addresses):
+    async with AsyncAlchemyClient() as client:
+        results = await asyncio.gather(
+            *(
+                _fetch_collection_nfts(client, contract_address)
+                for contract_address in contract_addresses
+            ),
+            return_exceptions=True,
+        )
+    await sync_to_async(connections.close_all)()
+    return dict(zip(contract_addresses, results))
+
+
+@app.task(name="fetch_collections_nfts")
+def fetch_collections_nfts(contract_addresses):
+    """
+    Fetch the NFTs of many collections concurrently from this one worker with
+    the async Alchemy client, then re-rank each collection's changes
+    """
+    logging.info(
+        msg=f"Starting to fetch NFTs for {len(contract_addresses)} collections"
+    )
+    results = asyncio.run(_fetch_collections_nfts(contract_addresses))
+
+    for contract_address, saved in results.items():
+        if isinstance(saved, Exception):
+            logging.error(
+                msg=f"Failed to fetch NFTs for contract {contract_address}: {saved!r}"
+            )
+        else:
+            rerank_nfts.delay(contract_address)
+
+    connection.close()
+
+
 def calculate_collection_rarity_task(contract_address):
     # Step 1 - get NFTs for the contract - saves them in the DB
     step1 = fetch_nfts.si(contract_address)
@@ -397,154 +446,45 @@ def calculate_collection_rarity_task(contract_address):
     return result
 
 
+def refresh_collection_nfts_task(contract_address):
+    """
+    Re-fetch a collection's NFTs and re-rank only the ones that changed,
+    e.g. after a reveal or a metadata refresh
+    """
+    workflow = chain(fetch_nfts.si(contract_address), rerank_nfts.si(contract_address))
+    result = workflow.delay()
+    return result
+
+
 @app.task(name="fetch_collections_transfers")
 def fetch_collections_transfers():
     """
     This task allows us to fetch thousands of transactions across collections but doesn't provide
     the value (eth) of the transaction.
+
+    Mnemonic only filters transfers by a single contract, so each collection is
+    synced on its own from its checkpoint.
     """
     contract_addresses = list(
         Collection.objects.filter(released=True)
         .order_by("id")
         .values_list("contract_address", flat=True)
     )
+    checkpoints = EthBlock.objects.in_bulk(
+        contract_addresses, field_name="contract_address"
+    )
 
-    def chunker(seq, size):
-        return (seq[pos : pos + size] for pos in range(0, len(seq), size))  # noqa
-
-    def get_transaction_type(t):
-        transfer_type = t.get("transferType")
-
-        type_mint = "TRANSFER_TYPE_MINT"
-        type_burn = "TRANSFER_TYPE_BURN"
-        # type_regular = "TRANSFER_TYPE_REGULAR"
-
-        if transfer_type == type_mint:
-            return "mint"
-
-        elif transfer_type == type_burn:
-            return "burn"
-
-        return "transfer"
-
-    for group in chunker(contract_addresses, 1):
-        offset = 0
-        has_next_page = True
-        transactions = []
-
-        last_block_timestamp = None
-        last_eth_block: EthBlock = (
-            EthBlock.objects.filter(contract_address=group[0])
-            .order_by("-last_block")
-            .first()
-        )
-        if last_eth_block:
-            last_block_timestamp = last_eth_block.timestamp
-
-        last_fetched_block_number = None
-        last_fetched_block_timestamp = None
-
-        while has_next_page:
-            time.sleep(0.5)
-            contract_address = group[0]
-            data = mnemonic_client.get_collection_transfers(
-                contract_address,
-                limit=500,
-                offset=offset,
-                timestamp__gt=last_block_timestamp,
-            )
-            APICallRecordLog.objects.create(
-                client="mnemonic", service="get_collection_transfers"
+    for contract_address in contract_addresses:
+        try:
+            saved = sync_collection_transfers(
+                contract_address, checkpoints.get(contract_address)
             )
-            logging_service.log(
-                {
-                    "Event": "Fetch Collection Transfers",
-                    "Service": "Mnemonic",
-                    "Contract_Address": contract_address,
-                }
+        except MnemonicPageError as error:
+            logging.error(
+                msg=f"Failed to fetch sales for contract address: {contract_address}: {error}"
             )
-
-            error = data.get("error")
-
-            if error:
-                logging.error(
-                    msg=f"Failed to fetch sales for contract addresses: {group}: {error}"
-                )
-                return
-
-            transfers = data.get("nftTransfers")
-            if not transfers:
-                has_next_page = False
-
-            elif transfers:
-                result_count = len(transfers)
-                print(f"Page offset: {offset}. Result count: {result_count}")
-
-                if result_count == 500:
-                    offset += 500
-                else:
-                    has_next_page = False
-
-                for transfer in transfers:
-                    transfer_type = get_transaction_type(transfer)
-
-                    contract_address = transfer.get("contractAddress")
-                    block_number = transfer.get("blockchainEvent").get("blockNumber")
-                    token_id = transfer.get("tokenId")
-                    quantity = transfer.get("quantity")
-                    transaction_hash = transfer.get("blockchainEvent").get("txHash")
-                    transaction_timestamp = parser.parse(
-                        transfer.get("blockchainEvent").get("blockTimestamp")
-                    )
-
-                    sender = transfer.get("sender")
-                    sender_address = sender.get("address")
-
-                    recipient = transfer.get("recipient")
-                    receiver_address = recipient.get("address")
-
-                    recipient_paid = transfer.get("recipientPaid")
-                    price_eth = None
-                    price_usd = None
-                    if recipient_paid:
-                        price_eth = recipient_paid.get("totalEth")
-                        price_usd = recipient_paid.get("totalUsd")
-
-                    if contract_address and token_id:
-                        # These transactions are to display in the sales/transfers tab
-                        # so they don't need a wallet associated with it
-                        tx = Transaction(
-                            nft=(
-                                NFT.objects.filter(
-                                    collection__contract_address=contract_address,
-                                    token_id=token_id,
-                                ).first()
-                            ),
-                            transaction_type=transfer_type,
-                            transfer_from=sender_address,
-                            transfer_to=receiver_address,
-                            contract_address=contract_address,
-                            token_id=token_id,
-                            quantity=int(quantity),
-                            transaction_hash=transaction_hash,
-                            block_number=block_number,
-                            transaction_date=transaction_timestamp,
-                            raw_transaction_data=transfer,
-                            collection_only=True,
-                            price_eth=price_eth,
-                            price_usd=price_usd,
-                        )
-                        transactions.append(tx)
-                    last_fetched_block_number = block_number
-                    last_fetched_block_timestamp = transaction_timestamp
-
-                EthBlock.objects.create(
-                    last_block=last_fetched_block_number,
-                    timestamp=last_fetched_block_timestamp,
-                    contract_address=group[0],
-                )
-
-        Transaction.objects.bulk_create(transactions, batch_size=100)
+            continue
+        logging.info(msg=f"Saved {saved} transfers for contract: {contract_address}")
 
     connection.close()
     return "Done"
@@ -558,78 +498,16 @@ def collection_callback(contract_address):
 @app.task(name="fetch_collection_owners_history")
 def fetch_collection_owners_history():
     logging.info(msg="Fetching collection owners history")
-    collection_metrics: QuerySet[CollectionMetrics] = CollectionMetrics.objects.filter(
-        collection__released=True
-    )
-    collection_metrics_to_update = []
-    for collection_metric in collection_metrics:
-        try:
-            collection = collection_metric.collection
-            results = mnemonic_client.get_historical_collection_owners(
-                collection.contract_address
-            )
-            APICallRecordLog.objects.create(
-                client="mnemonic", service="collection_owners_history"
-            )
-            logging_service.log(
-                {
-                    "Event": "Fetch Collection Owners History",
-                    "Service": "Mnemonic",
-                    "Collection_ID": collection.id,
-                    "Collection_Name": collection.name,
-                    "Contract_Address": collection.contract_address,
-                }
-            )
-
-            collection_metric.owners_history = results.get("dataPoints")
-            collection_metrics_to_update.append(collection_metric)
-            time.sleep(0.3)
-        except Exception:
-            pass
-
-    CollectionMetrics.objects.bulk_update(
-        collection_metrics_to_update, ["owners_history"], batch_size=100
-    )
-    logging.info(msg="Finished fetching collection owners history")
+    saved = refresh_history(OWNERS_HISTORY)
+    logging.info(msg=f"Finished fetching collection owners history: {saved} saved")
     connection.close()
 
 
 @app.task(name="fetch_collection_price_history")
 def fetch_collection_price_history():
     logging.info(msg="Fetching collection prices history")
-    collection_metrics: QuerySet[CollectionMetrics] = CollectionMetrics.objects.filter(
-        collection__released=True
-    )
-    collection_metrics_to_update = []
-    for collection_metric in collection_metrics:
-        try:
-            collection = collection_metric.collection
-            results = mnemonic_client.get_historical_price_history(
-                collection.contract_address
-            )
-            APICallRecordLog.objects.create(
-                client="mnemonic", service="collection_price_history"
-            )
-            logging_service.log(
-                {
-                    "Event": "Fetch Collection Price History",
-                    "Service": "Mnemonic",
-                    "Collection_ID": collection.id,
-                    "Collection_Name": collection.name,
-                    "Contract_Address": collection.contract_address,
-                }
-            )
-
-            collection_metric.price_history = results.get("dataPoints")
-            collection_metrics_to_update.append(collection_metric)
-            time.sleep(0.3)
-        except Exception:
-            pass
-
-    CollectionMetrics.objects.bulk_update(
-        collection_metrics_to_update, ["price_history"], batch_size=100
-    )
-    logging.info(msg="Finished fetching collection prices history")
+    saved = refresh_history(PRICE_HISTORY)
+    logging.info(msg=f"Finished fetching collection prices history: {saved} saved")
     connection.close()
 
 
@@ -688,23 +566,60 @@ def fetch_eth_price():
     eth = data.get("ethereum")
     if eth:
         price = eth.get("usd")
-        EthPrice.objects.create(date=datetime.date.today(), value=price)
+        EthPrice.objects.update_or_create(
+            date=datetime.date.today(), defaults={"value": price}
+        )
     connection.close()
 
 
 def fetch_eth_price_history():
-    import csv
-
-    prices = []
+    result = seed_eth_prices()
+    logging.info(msg=f"Seeded ETH price history: {result}")
+    # The seed doesn't send post_save
+    eth_prices.invalidate()
+    connection.close()
 
-    with open("data/ETH-USD.csv") as f:
-        reader = csv.DictReader(f)
+    return result
 
-        for row in reader:
-            date = row["Date"]
-            price = row["Close"]
 
-            prices.append(EthPrice(date=date, value=price))
+@app.task(name="backfill_transaction_price_usd")
+def backfill_transaction_price_usd(batch_size=50000):
+    """
+    Fill in price_usd for priced transactions that were stored without one,
+    looking up the ETH price of each batch's transaction dates at once
+    """
+    logging.info(msg="Backfilling transaction USD prices")
+    transactions = Transaction.objects.filter(
+        price_usd__isnull=True, price_eth__gt=0
+    ).order_by("id")
+
+    updated = 0
+    last_id = 0
+    while True:
+        rows = list(
+            transactions.filter(id__gt=last_id).values_list(
+                "id", "price_eth", TruncDate("transaction_date")
+            )[:batch_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        ether_prices = eth_prices.as_of_many([date for _, _, date in rows])
+        updated += bulk_update_values(
+            Transaction,
+            [
+                (transaction_id, usd_value(price_eth, ether_price))
+                for (transaction_id, price_eth, _), ether_price in zip(
+                    rows, ether_prices.tolist()
+                )
+                if not np.isnan(ether_price)
+            ],
+            ["price_usd"],
+            # One statement per batch lets Postgres join the whole batch at once
+            page_size=batch_size,
+        )
 
-    EthPrice.objects.bulk_create(prices, batch_size=100)
     connection.close()
+    logging.info(msg=f"Backfilled USD prices of {updated} transactions")
+    return updated
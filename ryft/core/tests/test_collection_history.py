@@ -0,0 +1,121 @@
+import datetime
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+
+from ryft.core.collection_history import (
+    OWNERS_HISTORY,
+    get_duration,
+    get_owners_history,
+    get_price_history,
+    refresh_history,
+)
+from ryft.core.integrations.mnemonic import Duration
+from ryft.core.models import (
+    Collection,
+    CollectionMetrics,
+    CollectionOwnersRecord,
+    CollectionPriceRecord,
+)
+
+
+def day(number):
+    return datetime.datetime(2023, 1, number, tzinfo=datetime.timezone.utc)
+
+
+def get_owners(contract_address, duration):
+    return {
+        "dataPoints": [
+            {"timestamp": f"2023-01-0{number}T00:00:00Z", "count": str(number * 10)}
+            for number in range(1, 4)
+        ]
+    }
+
+
+@pytest.mark.django_db
+class TestCollectionHistory:
+    @pytest.fixture
+    def collection(self):
+        collection = Collection.objects.bulk_create(
+            [Collection(name="History", contract_address="0xa", released=True)]
+        )[0]
+        CollectionMetrics.objects.create(
+            collection=collection, last_fetched=timezone.now()
+        )
+        return collection
+
+    def test_get_duration(self):
+        now = day(8)
+
+        assert get_duration(None, now) == Duration.year
+        assert get_duration(day(8), now) == Duration.day
+        assert get_duration(day(2), now) == Duration.week
+        assert get_duration(day(1), now) == Duration.month
+
+    @patch(
+        "ryft.core.collection_history.mnemonic_client.get_historical_collection_owners",
+        side_effect=get_owners,
+    )
+    def test_refresh_history_is_incremental(self, mocked_owners, collection):
+        CollectionOwnersRecord.objects.create(
+            collection=collection, timestamp=day(2), owners_count=1
+        )
+        CollectionOwnersRecord.objects.create(
+            collection=collection, timestamp=day(1), owners_count=5
+        )
+
+        assert refresh_history(OWNERS_HISTORY) == 2
+        assert mocked_owners.call_args.args == ("0xa", Duration.year)
+        assert list(
+            collection.owners_records.order_by("timestamp").values_list(
+                "timestamp", "owners_count"
+            )
+        ) == [(day(1), 5), (day(2), 20), (day(3), 30)]
+
+    def test_downsamples_history(self, collection):
+        CollectionPriceRecord.objects.bulk_create(
+            [
+                CollectionPriceRecord(
+                    collection=collection,
+                    timestamp=day(number),
+                    min_price=number,
+                    max_price=number * 2,
+                    avg_price=number,
+                    volume=10,
+                    quantity=2,
+                )
+                for number in range(2, 9)
+            ]
+        )
+        CollectionOwnersRecord.objects.bulk_create(
+            [
+                CollectionOwnersRecord(
+                    collection=collection, timestamp=day(number), owners_count=number
+                )
+                for number in range(2, 9)
+            ]
+        )
+
+        # 2023-01-02 is a Monday
+        assert get_price_history(collection, day(1), "week") == [
+            {
+                "date": day(2),
+                "min_price": 2,
+                "max_price": 16,
+                "avg_price": 5,
+                "volume": 70,
+                "quantity": 14,
+            }
+        ]
+        # Weighted by the number of sales of each day
+        collection.price_records.filter(timestamp=day(8)).update(quantity=9)
+        assert get_price_history(collection, day(8), "week")[0]["avg_price"] == 8
+        assert get_price_history(collection, day(1), "week")[0]["avg_price"] == 6
+        collection.price_records.update(quantity=0)
+        assert get_price_history(collection, day(1), "week")[0]["avg_price"] is None
+
+        assert get_owners_history(collection, day(7), "day") == [
+            {"date": day(7), "owners_count": 7},
+            {"date": day(8), "owners_count": 8},
+        ]
@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+
+from ryft.core.collection_metrics import refresh_collection_metrics
+from ryft.core.integrations.errors import (
+    NFTPortContractNotFound,
+    NFTPortContractStatisticsError,
+)
+from ryft.core.models import APICallRecordLog, Collection, CollectionMetrics
+
+
+def get_contract_statistics(contract_address):
+    if contract_address == "0xc":
+        raise NFTPortContractNotFound("Not found")
+    if contract_address == "0xd":
+        raise NFTPortContractStatisticsError("Error code: 500")
+    return {
+        "statistics": {
+            "floor_price": 1.5,
+            "one_day_average_price": 2,
+            "one_day_sales": 3,
+            "one_day_volume": 6,
+        }
+    }
+
+
+@pytest.mark.django_db
+class TestRefreshCollectionMetrics:
+    @patch(
+        "ryft.core.collection_metrics.nftport_client.get_contract_statistics",
+        side_effect=get_contract_statistics,
+    )
+    def test_continues_past_errors(self, mocked_statistics):
+        collections = Collection.objects.bulk_create(
+            [
+                Collection(name=address, contract_address=address, released=True)
+                for address in ("0xa", "0xb", "0xc", "0xd")
+            ]
+        )
+        CollectionMetrics.objects.create(
+            collection=collections[0],
+            current_floor_price=1,
+            last_fetched=timezone.now(),
+        )
+
+        result = refresh_collection_metrics(workers=2)
+
+        assert str(result) == "2 updated, 1 unsupported, 1 failed"
+        assert mocked_statistics.call_count == 4
+        assert set(
+            CollectionMetrics.objects.values_list(
+                "collection__contract_address", "current_floor_price"
+            )
+        ) == {("0xa", 1.5), ("0xb", 1.5)}
+        assert list(
+            Collection.objects.filter(nftport_unsupported=True).values_list(
+                "contract_address", flat=True
+            )
+        ) == ["0xc"]
+        assert APICallRecordLog.objects.count() == 2
@@ -0,0 +1,111 @@
+import datetime
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ryft.core.api.fieldsets import parse_fields
+from ryft.core.api.views import CollectionViewSet
+from ryft.core.models import Collection, CollectionMetrics, CollectionOwnersRecord
+
+
+def test_parse_fields():
+    assert parse_fields("") == {}
+    assert parse_fields("name, collectionmetrics.current_floor_price") == {
+        "name": None,
+        "collectionmetrics": {"current_floor_price"},
+    }
+    assert parse_fields("collectionmetrics.royalty_fee,collectionmetrics") == {
+        "collectionmetrics": None
+    }
+
+
+@pytest.mark.django_db
+class TestCollectionFieldsets:
+    @pytest.fixture
+    def collection(self):
+        collection = Collection.objects.bulk_create(
+            [Collection(name="Fields", contract_address="0xa", contract_abi="[]")]
+        )[0]
+        CollectionMetrics.objects.create(
+            collection=collection,
+            current_floor_price=1.5,
+            royalty_fee=5,
+            last_fetched=timezone.now(),
+        )
+        return collection
+
+    def get(self, rf, url, action="list", **kwargs):
+        view = CollectionViewSet.as_view(
+            {"get": action}, permission_classes=[], authentication_classes=[]
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = view(rf.get(url), **kwargs).render()
+        return response, json.loads(response.content), queries
+
+    def test_list_fields(self, rf, collection):
+        response, data, queries = self.get(
+            rf, "/api/collections/?fields=name,collectionmetrics.current_floor_price"
+        )
+
+        assert response.status_code == 200
+        assert data["results"] == [
+            {"name": "Fields", "collectionmetrics": {"current_floor_price": 1.5}}
+        ]
+        sql = queries.captured_queries[-1]["sql"]
+        assert "contract_address" not in sql
+        assert "royalty_fee" not in sql
+
+    def test_list_expand(self, rf, collection):
+        _, data, _ = self.get(rf, "/api/collections/")
+        assert "artwork_images" not in data["results"][0]
+
+        _, data, _ = self.get(rf, "/api/collections/?expand=artwork_images")
+        assert data["results"][0]["artwork_images"] == []
+
+    def test_retrieve_defers_unused_columns(self, rf, collection):
+        response, data, queries = self.get(
+            rf, "/api/collections/0xa/", "retrieve", contract_address="0xa"
+        )
+
+        assert response.status_code == 200
+        assert data["collectionmetrics"]["royalty_fee"] == 5
+        assert "contract_abi" not in queries.captured_queries[0]["sql"]
+
+    def test_retrieve_history(self, rf, collection):
+        timestamp = timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0, tzinfo=datetime.timezone.utc
+        )
+        CollectionOwnersRecord.objects.create(
+            collection=collection, timestamp=timestamp, owners_count=12
+        )
+
+        _, data, _ = self.get(
+            rf, "/api/collections/0xa/", "retrieve", contract_address="0xa"
+        )
+
+        assert data["collectionmetrics"]["owners_history"] == [
+            {"timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"), "count": "12"}
+        ]
+        assert data["collectionmetrics"]["price_history"] == []
+
+        _, data, _ = self.get(
+            rf,
+            "/api/collections/0xa/?fields=collectionmetrics.royalty_fee",
+            "retrieve",
+            contract_address="0xa",
+        )
+        assert data == {"collectionmetrics": {"royalty_fee": 5}}
+
+    def test_unknown_fields(self, rf, collection):
+        response, data, _ = self.get(
+            rf, "/api/collections/?fields=name,bogus&expand=name"
+        )
+
+        assert response.status_code == 400
+        assert data == {
+            "fields": ["Unknown fields: bogus"],
+            "expand": ["Fields can't be expanded: name"],
+        }
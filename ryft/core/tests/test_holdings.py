@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ryft.core.holdings import refresh_holding_floor_values, refresh_wallet_holdings
+from ryft.core.models import Collection, CollectionMetrics, Wallet, WalletNFT
+
+
+@pytest.mark.django_db
+class TestWalletHoldings:
+    def test_refresh_wallet_holdings(self):
+        collection = Collection.objects.create(name="Known", contract_address="0xa")
+        CollectionMetrics.objects.create(
+            collection=collection, current_floor_price=1.5, last_fetched=timezone.now()
+        )
+        wallet = Wallet.objects.create(wallet_address="0x1")
+        wallet_nfts = WalletNFT.objects.bulk_create(
+            [
+                WalletNFT(wallet=wallet, nft_raw_data={"contract_address": address})
+                for address in ("0xa", "0xa", "0xb")
+            ]
+            + [WalletNFT(wallet=wallet, nft_raw_data={})]
+        )
+
+        assert refresh_wallet_holdings([wallet.id]) == 2
+        assert set(
+            wallet.holdings.values_list(
+                "contract_address", "collection_id", "count", "floor_value"
+            )
+        ) == {("0xa", collection.id, 2, 3.0), ("0xb", None, 1, 0.0)}
+
+        wallet_nfts[2].delete()
+        refresh_wallet_holdings([wallet.id])
+        assert list(wallet.holdings.values_list("contract_address", flat=True)) == [
+            "0xa"
+        ]
+
+    def test_refresh_holding_floor_values(self):
+        wallet = Wallet.objects.create(wallet_address="0x1")
+        WalletNFT.objects.bulk_create(
+            [
+                WalletNFT(wallet=wallet, nft_raw_data={"contract_address": "0xa"})
+                for _ in range(2)
+            ]
+        )
+        refresh_wallet_holdings([wallet.id])
+        collection = Collection.objects.create(name="New", contract_address="0xa")
+        CollectionMetrics.objects.create(
+            collection=collection, current_floor_price=2, last_fetched=timezone.now()
+        )
+
+        assert refresh_holding_floor_values(["0xa"]) == 1
+        assert refresh_holding_floor_values() == 0
+        holding = wallet.holdings.get()
+        assert holding.collection == collection
+        assert holding.floor_value == 4.0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_wallet_refreshes():
+    wallet = Wallet.objects.create(wallet_address="0x1")
+    WalletNFT.objects.create(wallet=wallet, nft_raw_data={"contract_address": "0xa"})
+    refresh_wallet_holdings([wallet.id])
+    refreshed = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def refresh(hold=False):
+        try:
+            with transaction.atomic():
+                refresh_wallet_holdings([wallet.id])
+                if hold:
+                    refreshed.set()
+                    release.wait(5)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    first = threading.Thread(target=refresh, kwargs={"hold": True})
+    first.start()
+    refreshed.wait(5)
+    # The second refresh waits for the first one to commit
+    second = threading.Thread(target=refresh)
+    second.start()
+    time.sleep(0.2)
+    release.set()
+    first.join()
+    second.join()
+
+    assert errors == []
+    assert wallet.holdings.count() == 1
@@ -1,4 +1,23 @@
-from unittest.mock import patch
+import asyncio
+import threading
+from unittest.mock import AsyncMock, Mock, patch
+
+import httpx
+import pytest
+import requests
+
+from ryft.core.integrations.alchemy import AsyncAlchemyClient
+from ryft.core.integrations.cache import CachedSession
+from ryft.core.integrations.errors import MnemonicPageError
+from ryft.core.integrations.mnemonic import MnemonicClient
+from ryft.core.integrations.ratelimit import RateLimitedSession, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def local_rate_limits():
+    TokenBucket._local_states.clear()
+    with patch("ryft.core.integrations.ratelimit.get_redis", return_value=None):
+        yield
 
 
 class TestNFTPortClient:
@@ -58,3 +77,180 @@ class TestAlchemyClient:
         response = alchemy_client.get_nfts_for_wallet(wallet_address="12345")
 
         assert response["response"] == "NOK"
+
+
+def mock_async_alchemy_client(handler):
+    client = AsyncAlchemyClient()
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+class TestAsyncAlchemyClient:
+    @patch("ryft.core.integrations.alchemy.asyncio.sleep", new_callable=AsyncMock)
+    def test_retries_when_rate_limited(self, mocked_sleep):
+        responses = [
+            httpx.Response(429, headers={"Retry-After": "1"}),
+            httpx.Response(200, json={"nfts": [], "nextToken": None}),
+        ]
+
+        async def run():
+            async with mock_async_alchemy_client(lambda _: responses.pop(0)) as client:
+                return await client.get_nfts_for_collection("0x123")
+
+        assert asyncio.run(run()) == {"nfts": [], "nextToken": None}
+        mocked_sleep.assert_any_await(1)
+
+    def test_iter_nfts_for_collection(self):
+        def handler(request):
+            start_token = request.url.params.get("startToken")
+            if start_token is None:
+                return httpx.Response(200, json={"nfts": [{"id": 1}], "nextToken": "2"})
+            return httpx.Response(200, json={"nfts": [{"id": int(start_token)}]})
+
+        async def run():
+            async with mock_async_alchemy_client(handler) as client:
+                return [
+                    page["nfts"]
+                    async for page in client.iter_nfts_for_collection("0x123")
+                ]
+
+        assert asyncio.run(run()) == [[{"id": 1}], [{"id": 2}]]
+
+
+class TestMnemonicClient:
+    @staticmethod
+    def get_transfers(*timestamps):
+        return {
+            "nftTransfers": [
+                {"blockchainEvent": {"blockTimestamp": timestamp}}
+                for timestamp in timestamps
+            ]
+        }
+
+    def test_iter_collection_transfers(self):
+        client = MnemonicClient()
+        pages = [
+            self.get_transfers("t1", "t2", "t2"),
+            self.get_transfers("t2", "t2", "t2"),
+            self.get_transfers("t2", "t3"),
+        ]
+        with patch.object(client, "get_collection_transfers", side_effect=pages) as get:
+            result = list(client.iter_collection_transfers("0x1", limit=3))
+
+        assert len(result) == 3
+        # The cursor stays before the tied timestamp and skips the transfers seen
+        assert [
+            (call.kwargs["timestamp__gt"], call.kwargs["offset"])
+            for call in get.call_args_list
+        ] == [(None, 0), ("t1", 2), ("t1", 5)]
+
+    def test_iter_collection_transfers_error(self):
+        client = MnemonicClient()
+        with patch.object(
+            client, "get_collection_transfers", return_value={"error": "Bad request"}
+        ):
+            with pytest.raises(MnemonicPageError):
+                list(client.iter_collection_transfers("0x1"))
+
+
+class TestCachedSession:
+    url = "https://api.example.com/stats/0x1"
+
+    def get_response(self, status_code=200, content=b'{"count": 1}', headers=None):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = content
+        response.headers.update(headers or {})
+        response.url = self.url
+        return response
+
+    def get_session(self, *responses):
+        session = Mock(get=Mock(side_effect=responses))
+        cached_session = CachedSession(
+            session, ttls={r"/stats/": 60}, cache_alias="integrations"
+        )
+        cached_session.cache.clear()
+        return cached_session
+
+    def test_caches_responses(self):
+        cached_session = self.get_session(self.get_response())
+
+        assert cached_session.get(self.url).json() == {"count": 1}
+        assert cached_session.get(self.url).json() == {"count": 1}
+        assert cached_session.session.get.call_count == 1
+        assert cached_session.stats() == {
+            r"/stats/": {"hits": 1, "misses": 1, "revalidated": 0}
+        }
+
+    def test_skips_error_responses(self):
+        cached_session = self.get_session(
+            self.get_response(content=b'{"error": "Not found"}'),
+            self.get_response(),
+        )
+
+        assert cached_session.get(self.url).json() == {"error": "Not found"}
+        assert cached_session.get(self.url).json() == {"count": 1}
+
+    @patch("ryft.core.integrations.cache.time.time")
+    def test_revalidates_stale_responses(self, mocked_time):
+        cached_session = self.get_session(
+            self.get_response(headers={"ETag": '"v1"'}),
+            self.get_response(status_code=304, content=b""),
+        )
+        mocked_time.return_value = 0
+        cached_session.get(self.url)
+        mocked_time.return_value = 61
+
+        assert cached_session.get(self.url).json() == {"count": 1}
+        assert (
+            cached_session.session.get.call_args.kwargs["headers"]["If-None-Match"]
+            == '"v1"'
+        )
+        assert cached_session.stats()[r"/stats/"]["revalidated"] == 1
+
+
+class TestTokenBucket:
+    def test_spaces_requests(self):
+        bucket = TokenBucket("test", rate=10)
+
+        assert bucket.take() == 0
+        assert 0 < bucket.take() <= 0.1
+
+    def test_penalize_blocks_and_slows_down(self):
+        bucket = TokenBucket("test", rate=10)
+
+        assert bucket.penalize(retry_after=5) == 5
+        assert 4 < bucket.take() <= 5
+
+    def test_aacquire_takes_tokens_off_the_event_loop(self):
+        bucket = TokenBucket("test", rate=10)
+        threads = []
+
+        def take():
+            threads.append(threading.get_ident())
+            return 0 if len(threads) > 1 else 0.01
+
+        async def acquire():
+            with patch.object(bucket, "take", side_effect=take):
+                await bucket.aacquire()
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(acquire())
+        assert len(threads) == 2
+        assert loop_thread not in threads
+
+    @patch("ryft.core.integrations.ratelimit.time.sleep")
+    @patch("ryft.core.integrations.ratelimit.requests.Session.request")
+    def test_session_retries_when_rate_limited(self, mocked_request, mocked_sleep):
+        rate_limited = requests.Response()
+        rate_limited.status_code = 429
+        rate_limited.headers["Retry-After"] = "2"
+        ok = requests.Response()
+        ok.status_code = 200
+        mocked_request.side_effect = [rate_limited, ok]
+
+        session = RateLimitedSession("test", per_second=10)
+
+        assert session.get("https://api.example.com").status_code == 200
+        assert mocked_request.call_count == 2
+        assert 1 < mocked_sleep.call_args_list[0].args[0] <= 2
@@ -0,0 +1,94 @@
+import pytest
+from django.utils import timezone
+
+from ryft.core.linking import link_transactions, link_wallet_nfts
+from ryft.core.models import NFT, Collection, Transaction, Wallet, WalletNFT
+
+
+@pytest.mark.django_db
+class TestLinking:
+    @pytest.fixture
+    def nfts(self):
+        collections = Collection.objects.bulk_create(
+            [
+                Collection(name=address, contract_address=address)
+                for address in ("0xa", "0xb")
+            ]
+        )
+        return NFT.objects.bulk_create(
+            [
+                NFT(collection=collections[0], token_id="1", raw_metadata={}),
+                NFT(collection=collections[0], token_id="2", raw_metadata={}),
+                NFT(collection=collections[1], token_id="1", raw_metadata={}),
+            ]
+        )
+
+    @pytest.fixture
+    def wallet(self):
+        return Wallet.objects.create(wallet_address="0x1")
+
+    def test_link_transactions(self, nfts, wallet):
+        def create(
+            tx_hash, contract_address, token_id, nft=None, collection_only=False
+        ):
+            return Transaction.objects.create(
+                wallet=None if collection_only else wallet,
+                nft=nft,
+                contract_address=contract_address,
+                token_id=token_id,
+                transaction_type="transfer",
+                transaction_hash=tx_hash,
+                transaction_date=timezone.now(),
+                collection_only=collection_only,
+            )
+
+        unlinked = create("0x1", "0xa", "1")
+        stale = create("0x2", "0xa", "2", nft=nfts[2])
+        linked = create("0x3", "0xa", "2", nft=nfts[1])
+        unmatched = create("0x4", "0xa", "3")
+        other_collection = create("0x5", "0xb", "1")
+        collection_only = create("0x1", "0xa", "1", collection_only=True)
+
+        assert link_transactions(["0xa"]) == 2
+        assert link_transactions(["0xa"]) == 0
+
+        for transaction, nft in (
+            (unlinked, nfts[0]),
+            (stale, nfts[1]),
+            (linked, nfts[1]),
+            (unmatched, None),
+            (other_collection, None),
+            (collection_only, None),
+        ):
+            transaction.refresh_from_db()
+            assert transaction.nft == nft
+
+    def test_link_wallet_nfts(self, nfts, wallet):
+        def create(contract_address, token_id, nft=None):
+            return WalletNFT.objects.create(
+                wallet=wallet,
+                nft=nft,
+                nft_raw_data={
+                    "contract_address": contract_address,
+                    "token_id": token_id,
+                },
+            )
+
+        unlinked = create("0xa", "1")
+        linked = create("0xa", "2", nft=nfts[1])
+        unmatched = create("0xa", "3")
+        other_collection = create("0xb", "1")
+        missing_data = WalletNFT.objects.create(wallet=wallet, nft_raw_data={})
+
+        assert link_wallet_nfts(["0xa"]) == 1
+        assert link_wallet_nfts(["0xa"]) == 0
+
+        for wallet_nft, nft in (
+            (unlinked, nfts[0]),
+            (linked, nfts[1]),
+            (unmatched, None),
+            (other_collection, None),
+            (missing_data, None),
+        ):
+            wallet_nft.refresh_from_db()
+            assert wallet_nft.nft == nft
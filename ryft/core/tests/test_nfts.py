@@ -0,0 +1,90 @@
+import pytest
+
+from ryft.core.models import Collection, NFTTraitSnapshot
+from ryft.core.rarity import rank_collection, rerank_snapshotted_nfts
+from ryft.core.tasks import build_nft, prune_nfts, save_nft_page
+
+
+def alchemy_nft(token_id, hat, last_updated="2023-01-01T00:00:00Z"):
+    return {
+        "id": {"tokenId": hex(token_id)},
+        "title": f"NFT #{token_id}",
+        "media": [{"gateway": f"https://nfts.test/{token_id}.png"}],
+        "metadata": {"attributes": [{"trait_type": "Hat", "value": hat}]},
+        "timeLastUpdated": last_updated,
+    }
+
+
+@pytest.mark.django_db
+class TestSaveNFTPage:
+    @pytest.fixture
+    def collection(self):
+        return Collection.objects.bulk_create(
+            [Collection(name="Page", contract_address="0xa", supply=2)]
+        )[0]
+
+    def save(self, collection, items):
+        return save_nft_page(
+            collection, [build_nft(collection, item) for item in items]
+        )
+
+    def test_only_writes_new_and_changed_nfts(self, collection):
+        items = [alchemy_nft(1, "Cap"), alchemy_nft(2, "Crown")]
+        assert self.save(collection, items + [alchemy_nft(2, "Crown")]) == 2
+        ids = dict(collection.nfts.values_list("token_id", "id"))
+
+        # Only the fetch time changed
+        items = [
+            alchemy_nft(1, "Cap", "2023-01-02T00:00:00Z"),
+            alchemy_nft(2, "Crown", "2023-01-02T00:00:00Z"),
+        ]
+        assert self.save(collection, items) == 0
+
+        assert self.save(collection, [alchemy_nft(1, "Beanie"), items[1]]) == 1
+        assert dict(collection.nfts.values_list("token_id", "id")) == ids
+        assert collection.nfts.get(token_id="1").raw_metadata["metadata"] == {
+            "attributes": [{"trait_type": "Hat", "value": "Beanie"}]
+        }
+
+    def test_snapshots_previous_traits_until_reranked(self, collection):
+        self.save(collection, [alchemy_nft(1, "Cap"), alchemy_nft(2, "Crown")])
+        assert set(
+            collection.trait_snapshots.values_list("token_id", "trait_count")
+        ) == {("1", None), ("2", None)}
+
+        rank_collection(collection)
+        assert not collection.trait_snapshots.exists()
+
+        self.save(collection, [alchemy_nft(1, "Beanie")])
+        self.save(collection, [alchemy_nft(1, "Crown")])
+        # The second change keeps the traits the occurrences were counted with
+        assert list(NFTTraitSnapshot.objects.values_list("token_id", "attributes")) == [
+            ("1", [{"trait_type": "Hat", "value": "Cap"}])
+        ]
+
+        rerank_snapshotted_nfts(collection)
+        assert not collection.trait_snapshots.exists()
+        assert dict(
+            collection.attributes.filter(name="Hat").values_list("value", "occurrences")
+        ) == {"Crown": 2}
+
+    def test_prunes_nfts_missing_from_a_fetch(self, collection):
+        self.save(
+            collection,
+            [alchemy_nft(1, "Cap"), alchemy_nft(2, "Crown"), alchemy_nft(3, "Cap")],
+        )
+        rank_collection(collection)
+
+        assert prune_nfts(collection, set()) == 0
+        assert prune_nfts(collection, {"1", "2"}) == 1
+        assert sorted(collection.nfts.values_list("token_id", flat=True)) == [
+            "1",
+            "2",
+        ]
+
+        # The deleted NFT no longer counts towards its trait value
+        rerank_snapshotted_nfts(collection)
+        assert not collection.trait_snapshots.exists()
+        assert dict(
+            collection.attributes.filter(name="Hat").values_list("value", "occurrences")
+        ) == {"Cap": 1, "Crown": 1}
@@ -0,0 +1,93 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from config.celery_app import app
+from ryft.core.integrations.errors import MnemonicPageError
+from ryft.core.models import Wallet, WalletOnboardingStep
+from ryft.core.portfolio import tasks
+
+
+@pytest.fixture
+def eager_celery():
+    app.conf.task_always_eager = True
+    yield
+    app.conf.task_always_eager = False
+
+
+@pytest.mark.django_db(transaction=True)
+class TestWalletOnboarding:
+    def test_calculate_wallet_portfolio(self, eager_celery):
+        wallet = Wallet.objects.create(wallet_address="0x1")
+        steps = {step: MagicMock() for step in tasks.ONBOARDING_STEPS}
+        steps["transactions"].side_effect = ConnectionResetError
+
+        with patch.dict(tasks.ONBOARDING_STEPS, steps):
+            tasks.calculate_wallet_portfolio(wallet.wallet_address)
+
+        for step in ("webhook", "nfts", "ens", "wallet_nfts", "access", "thumbnail"):
+            steps[step].assert_called_once_with(wallet.id)
+        assert dict(wallet.onboarding_steps.values_list("step", "status")) == {
+            "webhook": "done",
+            "nfts": "done",
+            "transactions": "failed",
+            "ens": "done",
+            "wallet_nfts": "done",
+            "portfolio": "done",
+            "access": "done",
+            "thumbnail": "done",
+        }
+        # Left unprocessed so the onboarding can be retried
+        wallet.refresh_from_db()
+        assert not wallet.processed
+
+    def test_completed_onboarding_marks_wallet_processed(self, eager_celery):
+        wallet = Wallet.objects.create(wallet_address="0x1")
+        steps = {step: MagicMock() for step in tasks.ONBOARDING_STEPS}
+
+        with patch.dict(tasks.ONBOARDING_STEPS, steps):
+            tasks.calculate_wallet_portfolio(wallet.wallet_address, tracked_wallet=True)
+
+        assert set(wallet.onboarding_steps.values_list("status", flat=True)) == {"done"}
+        wallet.refresh_from_db()
+        assert wallet.processed
+
+    def test_steps_building_on_failed_nfts_are_skipped(self, eager_celery):
+        wallet = Wallet.objects.create(wallet_address="0x1")
+        steps = {step: MagicMock() for step in tasks.ONBOARDING_STEPS}
+        steps["nfts"].side_effect = ConnectionResetError
+
+        with patch.dict(tasks.ONBOARDING_STEPS, steps):
+            tasks.calculate_wallet_portfolio(wallet.wallet_address)
+
+        for step in ("wallet_nfts", "portfolio", "access", "thumbnail"):
+            steps[step].assert_not_called()
+        assert dict(wallet.onboarding_steps.values_list("step", "status")) == {
+            "webhook": "done",
+            "nfts": "failed",
+            "transactions": "done",
+            "ens": "done",
+            "wallet_nfts": "skipped",
+            "portfolio": "skipped",
+            "access": "skipped",
+            "thumbnail": "skipped",
+        }
+        wallet.refresh_from_db()
+        assert not wallet.processed
+
+    def test_failed_nfts_fetch_keeps_previous_nfts(self):
+        wallet = Wallet.objects.create(wallet_address="0x1", nfts_raw_data=[{"id": 1}])
+        WalletOnboardingStep.objects.create(wallet=wallet, step="nfts")
+
+        def iter_wallet_nfts(wallet_address, limit):
+            yield [{"id": 2}]
+            raise MnemonicPageError("Bad request")
+
+        with patch.object(
+            tasks.mnemonic_client, "iter_wallet_nfts", side_effect=iter_wallet_nfts
+        ):
+            assert tasks.run_wallet_onboarding_step(wallet.id, "nfts") is False
+
+        assert wallet.onboarding_steps.get().status == "failed"
+        wallet.refresh_from_db()
+        assert wallet.nfts_raw_data == [{"id": 1}]
@@ -0,0 +1,52 @@
+import datetime
+from unittest.mock import patch
+
+import numpy as np
+
+from ryft.core.prices import EthPriceSeries, usd_value
+
+PRICES = (
+    np.array(["2023-01-01", "2023-01-03"], dtype="datetime64[D]"),
+    np.array([1200.0, 1300.0]),
+)
+
+
+@patch.object(EthPriceSeries, "get", return_value=PRICES)
+class TestEthPriceSeries:
+    def test_as_of(self, mocked_get):
+        series = EthPriceSeries()
+
+        assert series.as_of(datetime.date(2022, 12, 31)) is None
+        assert series.as_of(datetime.date(2023, 1, 1)) == 1200.0
+        assert series.as_of(datetime.date(2023, 1, 2)) == 1200.0
+        assert series.as_of(datetime.date(2023, 1, 5)) == 1300.0
+
+    def test_as_of_many(self, mocked_get):
+        series = EthPriceSeries()
+
+        prices = series.as_of_many(
+            [
+                datetime.date(2023, 1, 2),
+                datetime.date(2023, 1, 3),
+                datetime.date(2022, 1, 1),
+            ]
+        )
+
+        assert prices[:2].tolist() == [1200.0, 1300.0]
+        assert np.isnan(prices[2])
+
+    def test_no_prices(self, mocked_get):
+        mocked_get.return_value = (
+            np.array([], dtype="datetime64[D]"),
+            np.array([], dtype=np.float64),
+        )
+        series = EthPriceSeries()
+
+        assert np.isnan(series.as_of_many([datetime.date(2023, 1, 2)])).all()
+        assert series.as_of(datetime.date(2023, 1, 2)) is None
+
+
+def test_usd_value():
+    # 0.29 * 100 is 28.999999999999996 in floats
+    assert usd_value(0.29, 100) == 29
+    assert usd_value(2, 1299.99) == 2599
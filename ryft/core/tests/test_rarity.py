@@ -0,0 +1,196 @@
+import random
+
+import numpy as np
+import pytest
+
+from ryft.core.models import NFT, Collection, NFTTrait
+from ryft.core.rarity import (
+    RankIndex,
+    build_trait_matrix,
+    rank_collection,
+    rank_key,
+    rank_scores,
+    rerank_changed_nfts,
+    score_trait_matrix,
+    snapshot_nft_traits,
+)
+
+
+def legacy_scores(rows, supply):
+    """The per-NFT loop previously used by the rank_nfts task"""
+    trait_type_map = {}
+    trait_count_map = {}
+    for _, trait_count, _, attributes in rows:
+        trait_count_map[trait_count] = trait_count_map.get(trait_count, 0) + 1
+        for attribute in attributes or []:
+            name = attribute.get("trait_type")
+            value = attribute.get("value")
+            key = name or value
+            trait_type_map.setdefault(key, {})
+            trait_type_map[key][value] = trait_type_map[key].get(value, 0) + 1
+
+    scores = {}
+    for nft_id, trait_count, rarity_score, attributes in rows:
+        scores[nft_id] = rarity_score
+        if attributes:
+            total_score = 0
+            for attribute in attributes:
+                name = attribute.get("trait_type")
+                value = attribute.get("value")
+                if name and value:
+                    total_score += 1 / (trait_type_map[name][value] / supply)
+            occurrences = trait_count_map[trait_count]
+            scores[nft_id] = total_score + len(trait_count_map) * 2 / (
+                occurrences / supply
+            )
+    return scores
+
+
+def make_rows(size):
+    rng = random.Random(7)
+    rows = []
+    for nft_id in range(1, size + 1):
+        attributes = [
+            {"trait_type": trait, "value": rng.choice(["a", "b", "c", "d", None])}
+            for trait in ["Hat", "Eyes", "Mouth", "Background"]
+            if rng.random() > 0.2
+        ]
+        if rng.random() > 0.9:
+            attributes.append({"value": "Sky"})
+        if rng.random() > 0.95:
+            attributes = []
+        rows.append((nft_id, len(attributes), None, attributes))
+    return rows
+
+
+class TestRarityEngine:
+    def test_scores_match_legacy_formula(self):
+        rows = make_rows(500)
+        expected = legacy_scores(rows, supply=520)
+
+        matrix = build_trait_matrix(rows)
+        result = score_trait_matrix(matrix, supply=520)
+
+        for nft_id, score in zip(matrix.nft_ids.tolist(), result.scores.tolist()):
+            if expected[nft_id] is None:
+                assert np.isnan(score)
+            else:
+                assert score == expected[nft_id]
+
+    def test_occurrences(self):
+        rows = [
+            (1, 2, None, [{"trait_type": "Hat", "value": "Cap"}, {"value": "Sky"}]),
+            (2, 1, None, [{"trait_type": "Hat", "value": "Cap"}]),
+            (3, 1, None, [{"trait_type": "Hat", "value": "Crown"}]),
+        ]
+
+        matrix = build_trait_matrix(rows)
+        result = score_trait_matrix(matrix, supply=3)
+
+        occurrences = dict(zip(matrix.pairs, result.occurrences.tolist()))
+        assert occurrences == {
+            ("Hat", "Cap"): 2,
+            ("Sky", "Sky"): 1,
+            ("Hat", "Crown"): 1,
+        }
+        assert result.trait_count_occurrences == {1: 2, 2: 1}
+
+    def test_rank_scores_puts_null_scores_first(self):
+        nft_ids = np.array([1, 2, 3, 4])
+        scores = np.array([5.0, np.nan, 9.0, 5.0])
+
+        ranks = rank_scores(nft_ids, scores)
+
+        assert ranks.tolist() == [3, 1, 2, 4]
+
+
+class TestRankIndex:
+    def test_moving_an_nft_matches_a_full_ranking(self):
+        scores = {1: 5.0, 2: None, 3: 9.0, 4: 5.0, 5: 1.0}
+        index = RankIndex(scores.items())
+
+        index.discard(rank_key(5, scores[5]))
+        scores[5] = 7.0
+        index.add(rank_key(5, scores[5]))
+
+        nft_ids = np.array(list(scores))
+        values = np.array([np.nan if s is None else s for s in scores.values()])
+        expected = dict(zip(nft_ids.tolist(), rank_scores(nft_ids, values).tolist()))
+        assert index.ranks() == expected
+
+
+UNREVEALED = [{"trait_type": "Status", "value": "Unrevealed"}]
+
+
+def revealed(token_id):
+    return [
+        {"trait_type": "Hat", "value": "Cap" if token_id % 2 else "Crown"},
+        {"trait_type": "Eyes", "value": "Blue"},
+    ]
+
+
+@pytest.mark.django_db
+class TestRerankChangedNFTs:
+    def create_collection(self, supply):
+        collection = Collection.objects.bulk_create(
+            [Collection(name="Reveal", contract_address="0xa", supply=supply)]
+        )[0]
+        NFT.objects.bulk_create(
+            [
+                NFT(
+                    collection=collection,
+                    token_id=str(token_id),
+                    trait_count=1,
+                    raw_metadata={"metadata": {"attributes": UNREVEALED}},
+                )
+                for token_id in range(4)
+            ]
+        )
+        return collection
+
+    def reveal(self, collection, token_ids):
+        previous = snapshot_nft_traits(collection, token_ids)
+        for nft in collection.nfts.filter(token_id__in=token_ids):
+            nft.raw_metadata = {"metadata": {"attributes": revealed(int(nft.token_id))}}
+            nft.trait_count = 2
+            nft.save()
+        return rerank_changed_nfts(collection, previous)
+
+    def assert_attributes(self, collection, expected):
+        assert {
+            (name, value): occurrences
+            for name, value, occurrences in collection.attributes.exclude(
+                name="Trait Count"
+            ).values_list("name", "value", "occurrences")
+        } == expected
+
+    @pytest.mark.parametrize("supply", [4, None])
+    def test_reveal_creates_and_removes_attributes(self, supply):
+        collection = self.create_collection(supply)
+        rank_collection(collection)
+        self.assert_attributes(collection, {("Status", "Unrevealed"): 4})
+
+        # Revealing half of the collection adds a trait count
+        self.reveal(collection, ["0", "1"])
+        self.assert_attributes(
+            collection,
+            {
+                ("Status", "Unrevealed"): 2,
+                ("Hat", "Cap"): 1,
+                ("Hat", "Crown"): 1,
+                ("Eyes", "Blue"): 2,
+            },
+        )
+
+        # Revealing the rest removes one
+        self.reveal(collection, ["2", "3"])
+        self.assert_attributes(
+            collection, {("Hat", "Cap"): 2, ("Hat", "Crown"): 2, ("Eyes", "Blue"): 4}
+        )
+        assert NFTTrait.objects.filter(nft__collection=collection).count() == 8
+        assert (
+            NFTTrait.objects.filter(
+                attribute__name="Hat", attribute__value="Cap"
+            ).count()
+            == 2
+        )
@@ -0,0 +1,67 @@
+import datetime
+from unittest.mock import patch
+
+import pytest
+
+from ryft.core.models import Collection, EthPrice
+from ryft.core.seeds import format_supply, get_contract_address, seed
+from ryft.core.utils import chunked
+
+
+@pytest.mark.django_db
+class TestSeed:
+    @patch("ryft.core.seeds.bulk_upsert")
+    def test_seed_only_writes_changed_rows(self, mocked_bulk_upsert):
+        EthPrice.objects.bulk_create(
+            [
+                EthPrice(date=datetime.date(2023, 1, 1), value="1200.00"),
+                EthPrice(date=datetime.date(2023, 1, 2), value="1250.00"),
+            ]
+        )
+        prices = [
+            EthPrice(date="2023-01-01", value="1199.999"),
+            EthPrice(date="2023-01-02", value="1300.5"),
+            EthPrice(date="2023-01-03", value="1310"),
+            EthPrice(date="2023-01-03", value="1320"),
+        ]
+
+        result = seed(EthPrice, prices, key="date", update_fields=["value"])
+
+        assert result.created == [datetime.date(2023, 1, 3)]
+        assert result.updated == [datetime.date(2023, 1, 2)]
+        assert result.unchanged == 1
+        written = mocked_bulk_upsert.call_args.args[1]
+        assert [price.value for price in written] == ["1300.5", "1320"]
+
+    def test_seed_without_update_fields_only_creates_rows(self):
+        Collection.objects.bulk_create(
+            [Collection(name="Curated", contract_address="0xa", supply=10)]
+        )
+        collections = [
+            Collection(name="Scraped", contract_address="0xa", supply=20),
+            Collection(name="New", contract_address="0xb", supply=30),
+        ]
+
+        result = seed(Collection, collections, key="contract_address", update_fields=[])
+
+        assert result.created == ["0xb"]
+        assert result.updated == []
+        assert result.unchanged == 1
+        assert set(Collection.objects.values_list("name", "supply")) == {
+            ("Curated", 10),
+            ("New", 30),
+        }
+
+    def test_chunked(self):
+        assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+    def test_collection_fields(self):
+        assert format_supply("20,000 items") == 20000
+        assert format_supply("? items") is None
+        assert (
+            get_contract_address(
+                "https://looksrare.org/collections/0xBC4CA0eda7647a8ab7c2061c2e118a18a936f13d"
+            )
+            == "0xbc4ca0eda7647a8ab7c2061c2e118a18a936f13d"
+        )
+        assert get_contract_address("") is None
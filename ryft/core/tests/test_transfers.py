@@ -0,0 +1,188 @@
+from unittest.mock import patch
+
+import pytest
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from ryft.core.integrations.errors import MnemonicPageError
+from ryft.core.models import NFT, Collection, EthBlock, Transaction, Wallet
+from ryft.core.transfers import (
+    build_transaction,
+    parse_log_index,
+    save_transactions,
+    sync_collection_transfers,
+)
+
+
+def mnemonic_transfer(tx_hash, token_id, block, log_index="0x1"):
+    return {
+        "contractAddress": "0xa",
+        "tokenId": token_id,
+        "transferType": "TRANSFER_TYPE_REGULAR",
+        "sender": {"address": "0x1"},
+        "recipient": {"address": "0x2"},
+        "quantity": "1",
+        "blockchainEvent": {
+            "txHash": tx_hash,
+            "logIndex": log_index,
+            "blockNumber": str(block),
+            "blockTimestamp": f"2023-01-01T00:00:{block:02}Z",
+        },
+    }
+
+
+def iter_pages(*pages):
+    def iter_collection_transfers(contract_address, limit, timestamp__gt):
+        for page in pages:
+            if isinstance(page, Exception):
+                raise page
+            yield page
+
+    return iter_collection_transfers
+
+
+def sync(*pages, checkpoint=None):
+    with patch(
+        "ryft.core.transfers.mnemonic_client.iter_collection_transfers",
+        side_effect=iter_pages(*pages),
+    ) as mocked_iter:
+        return sync_collection_transfers("0xa", checkpoint), mocked_iter
+
+
+def test_parse_log_index():
+    assert parse_log_index(None) is None
+    assert parse_log_index("") is None
+    assert parse_log_index(7) == 7
+    assert parse_log_index("0x1a") == 26
+    assert parse_log_index("0X1A") == 26
+    assert parse_log_index("12") == 12
+    assert parse_log_index("010") == 10
+
+
+@pytest.mark.django_db
+class TestSaveTransactions:
+    def test_same_transfer_is_stored_once(self):
+        transfers = [
+            mnemonic_transfer("0x1", "1", 1),
+            mnemonic_transfer("0x1", "1", 1, log_index=None),
+        ]
+
+        assert save_transactions([build_transaction(t) for t in transfers]) == 2
+        assert save_transactions([build_transaction(t) for t in transfers]) == 0
+
+        # Wallet copies of a transfer are stored apart from the collection one
+        wallet = Wallet.objects.create(wallet_address="0x2")
+        wallet_transaction = build_transaction(transfers[0])
+        wallet_transaction.wallet = wallet
+        wallet_transaction.collection_only = False
+        assert save_transactions([wallet_transaction]) == 1
+        assert Transaction.objects.count() == 3
+
+    def test_unique_transfer_constraint(self):
+        build_transaction(mnemonic_transfer("0x1", "1", 1, log_index=None)).save()
+
+        with pytest.raises(IntegrityError), transaction.atomic():
+            build_transaction(mnemonic_transfer("0x1", "1", 2, log_index=None)).save()
+
+
+@pytest.mark.django_db
+class TestSyncCollectionTransfers:
+    def test_checkpoint_stays_before_trailing_ties(self):
+        first_page = [
+            mnemonic_transfer("0x1", "1", 1),
+            mnemonic_transfer("0x2", "2", 2),
+            mnemonic_transfer("0x3", "3", 2),
+        ]
+        with pytest.raises(MnemonicPageError):
+            sync(first_page, MnemonicPageError("Bad request"))
+
+        # The rest of the transfers of block 2 could be on the failed page
+        checkpoint = EthBlock.objects.get(contract_address="0xa")
+        assert checkpoint.last_block == 1
+
+        saved, mocked_iter = sync(
+            first_page[1:] + [mnemonic_transfer("0x4", "4", 2)],
+            [mnemonic_transfer("0x5", "5", 3)],
+            checkpoint=checkpoint,
+        )
+
+        assert mocked_iter.call_args.kwargs["timestamp__gt"] == (
+            checkpoint.timestamp.isoformat()
+        )
+        assert saved == 2
+        assert Transaction.objects.count() == 5
+        assert EthBlock.objects.get(contract_address="0xa").last_block == 3
+
+    def test_syncing_again_inserts_nothing(self):
+        pages = [
+            [mnemonic_transfer("0x1", "1", 1), mnemonic_transfer("0x2", "2", 2)],
+            [mnemonic_transfer("0x3", "3", 3)],
+        ]
+
+        assert sync(*pages)[0] == 3
+        assert sync(*pages)[0] == 0
+        assert Transaction.objects.count() == 3
+
+    def test_resolves_each_page_nfts_in_one_query(self):
+        collection = Collection.objects.bulk_create(
+            [Collection(name="Transfers", contract_address="0xa")]
+        )[0]
+        nfts = NFT.objects.bulk_create(
+            [
+                NFT(collection=collection, token_id=token_id, raw_metadata={})
+                for token_id in ("1", "2")
+            ]
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            sync(
+                [mnemonic_transfer("0x1", "1", 1), mnemonic_transfer("0x2", "2", 2)],
+                [mnemonic_transfer("0x3", "2", 3), mnemonic_transfer("0x4", "3", 4)],
+                [mnemonic_transfer("0x5", "3", 5)],
+            )
+
+        nft_queries = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('SELECT "core_nft"')
+        ]
+        # Token 3 has no NFT and isn't looked up again on the last page
+        assert len(nft_queries) == 2
+        assert dict(Transaction.objects.values_list("transaction_hash", "nft_id")) == {
+            "0x1": nfts[0].id,
+            "0x2": nfts[1].id,
+            "0x3": nfts[1].id,
+            "0x4": None,
+            "0x5": None,
+        }
+
+    def test_drops_duplicate_transfers(self):
+        transfer = mnemonic_transfer("0x1", "1", 1)
+
+        with patch(
+            "ryft.core.transfers.bulk_insert_ignore", return_value=1
+        ) as mocked_insert:
+            sync([transfer, transfer, mnemonic_transfer("0x2", "1", 2)], [transfer])
+
+        inserted = [
+            saved.transaction_hash
+            for call in mocked_insert.call_args_list
+            for saved in call.args[1]
+        ]
+        assert inserted == ["0x1", "0x2"]
+
+    def test_keeps_transfers_of_one_transaction_apart(self):
+        # A batch transfer, and a token moved twice in the same transaction
+        sync(
+            [
+                mnemonic_transfer("0x1", "1", 1, log_index="0x1"),
+                mnemonic_transfer("0x1", "2", 1, log_index="0x1"),
+                mnemonic_transfer("0x1", "1", 1, log_index="0x2"),
+            ]
+        )
+
+        assert set(Transaction.objects.values_list("token_id", "log_index")) == {
+            ("1", 1),
+            ("2", 1),
+            ("1", 2),
+        }
@@ -0,0 +1,58 @@
+import pytest
+from django.utils import timezone
+
+from ryft.core.holdings import refresh_wallet_holdings
+from ryft.core.models import (
+    Collection,
+    CollectionMetrics,
+    Wallet,
+    WalletNFT,
+    WalletPortfolioRecord,
+)
+from ryft.core.portfolio.valuation import record_all_portfolio_values
+
+
+@pytest.mark.django_db
+class TestPortfolioValuation:
+    def test_record_all_portfolio_values(self):
+        priced, unpriced = Collection.objects.bulk_create(
+            [
+                Collection(name="Priced", contract_address="0xa"),
+                Collection(name="Unpriced", contract_address="0xb"),
+            ]
+        )
+        metrics = {
+            priced: CollectionMetrics(
+                collection=priced, current_floor_price=2, last_fetched=timezone.now()
+            ),
+            unpriced: CollectionMetrics(
+                collection=unpriced, last_fetched=timezone.now()
+            ),
+        }
+        CollectionMetrics.objects.bulk_create(metrics.values())
+        holder, empty, unprocessed = Wallet.objects.bulk_create(
+            [
+                Wallet(wallet_address="0x1", processed=True),
+                Wallet(wallet_address="0x2", processed=True),
+                Wallet(wallet_address="0x3", processed=False),
+            ]
+        )
+        WalletNFT.objects.bulk_create(
+            [
+                WalletNFT(
+                    wallet=holder,
+                    nft_raw_data={"contract_address": collection.contract_address},
+                )
+                for collection in (priced, priced, unpriced)
+            ]
+        )
+        refresh_wallet_holdings([holder.id])
+        # Floor prices are refreshed before valuing
+        metrics[priced].current_floor_price = 1.5
+        metrics[priced].save()
+
+        # Wallets whose onboarding didn't complete are valued too
+        assert record_all_portfolio_values(batch_size=1) == 3
+        assert dict(
+            WalletPortfolioRecord.objects.values_list("wallet_id", "portfolio_value")
+        ) == {holder.id: 3.0, empty.id: 0.0, unprocessed.id: 0.0}
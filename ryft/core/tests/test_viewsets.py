@@ -16,7 +16,13 @@ from ryft.core.api.views import (
     WalletTransactionsAPIView,
     WalletViewSet,
 )
-from ryft.core.models import Transaction, Wallet, WalletPortfolioRecord
+from ryft.core.models import (
+    CollectionAttribute,
+    NFTTrait,
+    Transaction,
+    Wallet,
+    WalletPortfolioRecord,
+)
 from ryft.core.tests.factories import (
     CollectionFactory,
     NFTFactory,
@@ -105,6 +111,38 @@ class TestCollectionViewSet:
         assert response.status_code == 200
         assert json.loads(response.content)["results"] == expected_json
 
+    def test_nfts_filter_by_trait(self, rf, user, collection):
+        army_hat = CollectionAttribute.objects.create(
+            collection=collection, name="Hat", value="Army Hat"
+        )
+        cap = CollectionAttribute.objects.create(
+            collection=collection, name="Hat", value="Cap"
+        )
+        blue_eyes = CollectionAttribute.objects.create(
+            collection=collection, name="Eyes", value="Blue"
+        )
+        nfts = [
+            NFTFactory(collection=collection, rank=1),
+            NFTFactory(collection=collection, rank=2),
+            NFTFactory(collection=collection, rank=3),
+        ]
+        for nft, attributes in zip(
+            nfts, [[army_hat, blue_eyes], [cap, blue_eyes], [army_hat]]
+        ):
+            for attribute in attributes:
+                NFTTrait.objects.create(nft=nft, attribute=attribute)
+
+        url = f"/api/collections/{collection.contract_address}/nfts/"
+        request = rf.get(url, {"trait": ["Hat:Army Hat", "Hat:Cap", "Eyes:Blue"]})
+        force_authenticate(request, user=user)
+        view = NFTListAPIView.as_view()
+        response = view(request, contract_address=collection.contract_address).render()
+        assert response.status_code == 200
+        assert [nft["token_id"] for nft in json.loads(response.content)["results"]] == [
+            nfts[0].token_id,
+            nfts[1].token_id,
+        ]
+
 
 class TestWalletViewSet:
     def test_list(self, rf, user):
@@ -0,0 +1,74 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+
+from ryft.core.api.views import wallet_activity_webhook
+from ryft.core.models import Wallet, WebhookEvent
+from ryft.core.wallet_addresses import WalletAddressSet
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_address_set_reloads_when_wallets_change(django_assert_num_queries):
+    addresses = WalletAddressSet()
+    wallet = Wallet.objects.create(wallet_address="0x1")
+    assert "0x1" in addresses
+
+    # Unchanged wallets are read from memory
+    with django_assert_num_queries(0):
+        assert addresses.filter({"0x1", "0x2"}) == {"0x1"}
+
+    Wallet.objects.create(wallet_address="0x2")
+    assert addresses.filter({"0x1", "0x2"}) == {"0x1", "0x2"}
+
+    wallet.delete()
+    assert "0x1" not in addresses
+
+
+@pytest.mark.django_db(transaction=True)
+@patch("ryft.core.api.views.queue_webhook_events")
+@patch("ryft.core.api.views.is_valid_signature_for_string_body", return_value=True)
+class TestWalletActivityWebhook:
+    def post(self, rf, event_id, from_address, to_address):
+        body = {
+            "id": event_id,
+            "event": {
+                "activity": [{"fromAddress": from_address, "toAddress": to_address}]
+            },
+        }
+        request = rf.post(
+            "/webhooks/alchemy/wallet-activity/",
+            data=json.dumps(body),
+            content_type="application/json",
+            HTTP_X_ALCHEMY_SIGNATURE="signature",
+        )
+        return wallet_activity_webhook(request)
+
+    def test_rejects_untracked_wallets(self, mocked_signature, mocked_queue, rf):
+        Wallet.objects.create(wallet_address="0x1")
+
+        response = self.post(rf, "untracked", "0x2", "0x3")
+
+        assert response.status_code == 200
+        assert not WebhookEvent.objects.exists()
+        mocked_queue.assert_not_called()
+
+    def test_queues_tracked_wallets(self, mocked_signature, mocked_queue, rf):
+        self.post(rf, "before", "0x2", "0x1")
+        Wallet.objects.create(wallet_address="0x1")
+
+        response = self.post(rf, "tracked", "0x2", "0x1")
+
+        assert response.status_code == 200
+        assert list(WebhookEvent.objects.values_list("event_id", flat=True)) == [
+            "tracked"
+        ]
+        mocked_queue.assert_called_once_with()
@@ -0,0 +1,34 @@
+import pytest
+
+from ryft.core.models import NFT, Collection, Wallet, WalletNFT
+from ryft.core.wallet_nfts import sync_wallet_nfts
+
+
+@pytest.mark.django_db
+class TestSyncWalletNFTs:
+    def test_sync_wallet_nfts(self):
+        collection = Collection.objects.create(name="Known", contract_address="0xa")
+        nft = NFT.objects.create(collection=collection, token_id="2")
+        wallet = Wallet.objects.create(wallet_address="0x1")
+        kept, sold = WalletNFT.objects.bulk_create(
+            [
+                WalletNFT(
+                    wallet=wallet,
+                    nft_raw_data={"contract_address": "0xa", "token_id": token_id},
+                )
+                for token_id in ("2", "3")
+            ]
+        )
+        nfts = [
+            {"contractAddress": "0xa", "tokenId": str(token_id), "metadata": {}}
+            for token_id in range(2, 2500)
+            if token_id != 3
+        ]
+
+        assert sync_wallet_nfts(wallet, nfts, chunk_size=1000) == (2496, 1, 1)
+        assert wallet.wallet_nfts.count() == 2497
+        assert WalletNFT.objects.get(id=kept.id).nft == nft
+        assert not WalletNFT.objects.filter(id=sold.id).exists()
+        assert wallet.holdings.get().count == 2497
+
+        assert sync_wallet_nfts(wallet, nfts) == (0, 0, 0)
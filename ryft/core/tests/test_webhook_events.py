@@ -0,0 +1,86 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from ryft.core.models import WebhookEvent
+from ryft.core.portfolio import tasks
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def create_events(*names):
+    return WebhookEvent.objects.bulk_create(
+        [WebhookEvent(event_id=name, payload={"name": name}) for name in names]
+    )
+
+
+def process_payloads(payloads):
+    if any(payload["name"] == "bad" for payload in payloads):
+        raise ValueError("Bad event")
+
+
+@pytest.mark.django_db(transaction=True)
+@patch.object(tasks.process_webhook_events, "apply_async")
+def test_queue_webhook_events_is_debounced(mocked_apply_async):
+    for _ in range(3):
+        tasks.queue_webhook_events()
+    mocked_apply_async.assert_called_once_with(countdown=tasks.WEBHOOK_DEBOUNCE_SECONDS)
+
+    # A run clears the flag, so events stored during it queue the next run
+    tasks.process_webhook_events()
+    tasks.queue_webhook_events()
+    assert mocked_apply_async.call_count == 2
+
+
+@pytest.mark.django_db(transaction=True)
+@patch.object(tasks, "process_wallet_activity", side_effect=process_payloads)
+def test_failed_batch_is_retried_one_event_at_a_time(mocked_process):
+    create_events("first", "bad", "last")
+
+    assert tasks.process_webhook_events(batch_size=10) == 3
+
+    # The batch, then each event
+    assert mocked_process.call_count == 4
+    events = WebhookEvent.objects.order_by("id")
+    assert all(event.processed_timestamp for event in events)
+    assert [(event.event_id, event.error) for event in events] == [
+        ("first", None),
+        ("bad", "Bad event"),
+        ("last", None),
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+@patch.object(tasks, "process_wallet_activity")
+def test_claimed_events_are_skipped(mocked_process):
+    claimed, pending = create_events("claimed", "pending")
+    locked = threading.Event()
+    release = threading.Event()
+
+    def claim():
+        with transaction.atomic():
+            WebhookEvent.objects.select_for_update().get(id=claimed.id)
+            locked.set()
+            release.wait(5)
+        connection.close()
+
+    worker = threading.Thread(target=claim)
+    worker.start()
+    locked.wait(5)
+    try:
+        assert tasks.process_webhook_events() == 1
+    finally:
+        release.set()
+        worker.join()
+
+    mocked_process.assert_called_once_with([{"name": "pending"}])
+    claimed.refresh_from_db()
+    assert claimed.processed_timestamp is None
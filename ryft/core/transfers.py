@@ -0,0 +1,193 @@
+"""
+Incremental sync of collection transfers from Mnemonic.
+
+Every contract has a single EthBlock checkpoint holding the block and
+timestamp of the last transfer whose timestamp was saved in full. A sync only
+asks Mnemonic for transfers after that timestamp, so its cost follows the
+number of new transfers rather than the size of the history.
+"""
+from dateutil import parser
+from django.db import transaction
+
+from ryft.core.db import bulk_insert_ignore, bulk_upsert
+from ryft.core.integrations.mnemonic import mnemonic_client
+from ryft.core.models import NFT, APICallRecordLog, EthBlock, Transaction
+from ryft.core.services.logging import logging_service
+
+TRANSACTION_TYPES = {
+    "TRANSFER_TYPE_MINT": "mint",
+    "TRANSFER_TYPE_BURN": "burn",
+}
+
+
+def parse_log_index(value):
+    """
+    Log indexes come as ints, decimal strings or hex strings depending on the
+    provider. Decimal strings can be zero padded
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        if value[:2].lower() == "0x":
+            return int(value, 16)
+        return int(value, 10)
+    return int(value)
+
+
+def save_transactions(transactions):
+    """
+    Insert transactions in a single statement per page, skipping any transfer
+    that is already stored.
+
+    This is the writer shared by every path that ingests transfers, so retries
+    and overlapping syncs don't store the same transfer twice.
+
+    :return: number of transactions inserted
+    """
+    return bulk_insert_ignore(Transaction, transactions)
+
+
+def build_transaction(transfer, nft_id=None):
+    """
+    Build an unsaved collection Transaction from a Mnemonic transfer.
+
+    These transactions are to display in the sales/transfers tab so they
+    don't need a wallet associated with them.
+    """
+    blockchain_event = transfer.get("blockchainEvent")
+    recipient_paid = transfer.get("recipientPaid") or {}
+
+    return Transaction(
+        nft_id=nft_id,
+        transaction_type=TRANSACTION_TYPES.get(
+            transfer.get("transferType"), "transfer"
+        ),
+        transfer_from=transfer.get("sender").get("address"),
+        transfer_to=transfer.get("recipient").get("address"),
+        contract_address=transfer.get("contractAddress"),
+        token_id=transfer.get("tokenId"),
+        quantity=int(transfer.get("quantity")),
+        transaction_hash=blockchain_event.get("txHash"),
+        log_index=parse_log_index(blockchain_event.get("logIndex")),
+        block_number=blockchain_event.get("blockNumber"),
+        transaction_date=parser.parse(blockchain_event.get("blockTimestamp")),
+        raw_transaction_data=transfer,
+        collection_only=True,
+        price_eth=recipient_paid.get("totalEth"),
+        price_usd=recipient_paid.get("totalUsd"),
+    )
+
+
+def resolve_nft_ids(contract_address, token_ids, nft_ids):
+    """
+    Look up the NFTs of `token_ids` in one query and add them to `nft_ids`.
+
+    Token ids without an NFT are stored as None so they aren't looked up again.
+    """
+    if not token_ids:
+        return nft_ids
+
+    nft_ids.update(dict.fromkeys(token_ids))
+    nft_ids.update(
+        NFT.objects.filter(
+            collection__contract_address=contract_address, token_id__in=token_ids
+        ).values_list("token_id", "id")
+    )
+    return nft_ids
+
+
+def save_checkpoint(contract_address, transfer):
+    """
+    Move the contract's checkpoint to `transfer`, creating it on the first sync
+    """
+    blockchain_event = transfer.get("blockchainEvent")
+    bulk_upsert(
+        EthBlock,
+        [
+            EthBlock(
+                contract_address=contract_address,
+                last_block=int(blockchain_event.get("blockNumber")),
+                timestamp=parser.parse(blockchain_event.get("blockTimestamp")),
+            )
+        ],
+        conflict_fields=["contract_address"],
+        update_fields=["last_block", "timestamp"],
+    )
+
+
+def last_complete_transfer(page):
+    """
+    :return: the last transfer of `page` before the ones sharing its last
+        timestamp, which may continue on the next page. None when the whole
+        page shares one timestamp
+    """
+    timestamps = [transfer["blockchainEvent"]["blockTimestamp"] for transfer in page]
+    ties = timestamps.count(timestamps[-1])
+    return page[-ties - 1] if ties < len(page) else None
+
+
+def sync_collection_transfers(contract_address, checkpoint: EthBlock = None):
+    """
+    Save the transfers of a contract made since its checkpoint.
+
+    Each page is saved together with its checkpoint, so a sync that fails part
+    way through resumes after the last timestamp that was written in full.
+    Transfers saved again on resume are skipped by ``save_transactions``.
+
+    :return: number of transactions saved
+    """
+    timestamp__gt = checkpoint.timestamp.isoformat() if checkpoint else None
+    pages = mnemonic_client.iter_collection_transfers(
+        contract_address, limit=500, timestamp__gt=timestamp__gt
+    )
+
+    # Token id to NFT id of the collection, filled in as new token ids appear
+    nft_ids = {}
+    # (transaction hash, log index, token id) of the transfers already saved by
+    # this sync, like the unique transfer constraint
+    seen = set()
+    saved = 0
+    page = None
+    for page in pages:
+        APICallRecordLog.objects.create(
+            client="mnemonic", service="get_collection_transfers"
+        )
+        logging_service.log(
+            {
+                "Event": "Fetch Collection Transfers",
+                "Service": "Mnemonic",
+                "Contract_Address": contract_address,
+            }
+        )
+
+        transfers = [
+            transfer
+            for transfer in page
+            if transfer.get("contractAddress") and transfer.get("tokenId")
+        ]
+        resolve_nft_ids(
+            contract_address,
+            {transfer["tokenId"] for transfer in transfers} - nft_ids.keys(),
+            nft_ids,
+        )
+
+        transactions = []
+        for transfer in transfers:
+            tx = build_transaction(transfer, nft_ids.get(transfer["tokenId"]))
+            key = (tx.transaction_hash, tx.log_index, tx.token_id)
+            if key in seen:
+                continue
+            seen.add(key)
+            transactions.append(tx)
+
+        with transaction.atomic():
+            saved += save_transactions(transactions)
+            complete = last_complete_transfer(page)
+            if complete:
+                save_checkpoint(contract_address, complete)
+
+    # Every transfer up to the last one was fetched
+    if page:
+        save_checkpoint(contract_address, page[-1])
+
+    return saved
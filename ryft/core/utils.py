@@ -2,6 +2,7 @@ import hashlib
 import hmac
 import logging
 import time
+from itertools import islice
 
 import requests
 from django.conf import settings
@@ -14,6 +15,15 @@ logger = logging.getLogger(__name__)
 DISCORD_API_ENDPOINT = "https://discord.com/api"
 
 
+def chunked(iterable, size):
+    """
+    :return: an iterator over lists of up to `size` items of `iterable`
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
 def is_valid_signature_for_string_body(
     body: bytes, signature: str, signing_key: str
 ) -> bool:
@@ -0,0 +1,25 @@
+from ryft.core.models import Wallet
+from ryft.core.snapshots import VersionedSnapshot
+
+
+class WalletAddressSet(VersionedSnapshot):
+    """
+    Addresses of every Wallet, reloaded whenever a Wallet is created or deleted
+    """
+
+    version_key = "wallet_addresses:version"
+
+    def load(self):
+        return frozenset(Wallet.objects.values_list("wallet_address", flat=True))
+
+    def __contains__(self, address):
+        return address in self.get()
+
+    def filter(self, addresses):
+        """
+        :return: the addresses that belong to a Wallet
+        """
+        return self.get().intersection(addresses)
+
+
+wallet_addresses = WalletAddressSet()
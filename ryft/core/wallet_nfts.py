@@ -0,0 +1,97 @@
+"""
+Sync of a wallet's WalletNFTs with the NFTs it holds.
+
+The holdings are processed in chunks: the NFTs of a chunk are resolved in one
+query and only the differences with the stored WalletNFTs are written, so
+wallets with thousands of NFTs are synced in bounded memory without
+recreating rows that didn't change.
+"""
+import logging
+
+from django.db import transaction
+
+from ryft.core.holdings import refresh_wallet_holdings
+from ryft.core.models import WalletNFT
+from ryft.core.utils import chunked
+from ryft.core.webhooks import get_nft_ids
+
+
+def sync_wallet_nfts(wallet, nfts, chunk_size=1000):
+    """
+    Make the wallet's WalletNFTs match `nfts`, the NFTs fetched from Mnemonic
+
+    :return: number of WalletNFTs created, relinked and deleted
+    """
+    # WalletNFT id and NFT id of every stored (contract address, token id)
+    existing = {}
+    stale = []
+    stored = wallet.wallet_nfts.values_list(
+        "id", "nft_raw_data__contract_address", "nft_raw_data__token_id", "nft_id"
+    )
+    for wallet_nft_id, contract_address, token_id, nft_id in stored.iterator():
+        key = (contract_address, str(token_id))
+        if contract_address is None or key in existing:
+            stale.append(wallet_nft_id)
+        else:
+            existing[key] = (wallet_nft_id, nft_id)
+
+    created = relinked = 0
+    held = set()
+    with transaction.atomic():
+        for chunk in chunked(nfts, chunk_size):
+            holdings = {}
+            for nft_data in chunk:
+                key = (nft_data["contractAddress"], str(nft_data["tokenId"]))
+                if key in held:
+                    continue
+                held.add(key)
+                holdings[key] = nft_data
+                if not nft_data.get("metadata"):
+                    logging.warning(
+                        msg=f"Couldn't get metadata for NFT in wallet: {wallet.id}: {key}"
+                    )
+
+            nft_ids = get_nft_ids(
+                [
+                    {"contract_address": contract_address, "token_id": token_id}
+                    for contract_address, token_id in holdings
+                ]
+            )
+
+            to_create = []
+            to_relink = []
+            for (contract_address, token_id), nft_data in holdings.items():
+                nft_id = nft_ids.get((contract_address, token_id))
+                if (contract_address, token_id) not in existing:
+                    to_create.append(
+                        WalletNFT(
+                            wallet=wallet,
+                            nft_id=nft_id,
+                            nft_raw_data={
+                                "contract_address": contract_address,
+                                "token_id": nft_data["tokenId"],
+                            },
+                        )
+                    )
+                    continue
+
+                wallet_nft_id, stored_nft_id = existing[(contract_address, token_id)]
+                if nft_id != stored_nft_id:
+                    to_relink.append(WalletNFT(id=wallet_nft_id, nft_id=nft_id))
+
+            WalletNFT.objects.bulk_create(to_create, batch_size=chunk_size)
+            WalletNFT.objects.bulk_update(to_relink, ["nft"], batch_size=chunk_size)
+            created += len(to_create)
+            relinked += len(to_relink)
+
+        stale += [
+            wallet_nft_id
+            for key, (wallet_nft_id, _) in existing.items()
+            if key not in held
+        ]
+        for ids in chunked(stale, chunk_size):
+            WalletNFT.objects.filter(id__in=ids).delete()
+
+        refresh_wallet_holdings([wallet.id])
+
+    return created, relinked, len(stale)
@@ -0,0 +1,235 @@
+"""
+Processing of queued Alchemy wallet activity webhooks.
+
+The webhook view only verifies and stores the payload. Workers then apply
+pending events in batches with a fixed number of queries per batch instead of
+several queries per activity item.
+"""
+from collections import defaultdict
+
+from dateutil import parser
+from django.db import transaction
+from django.db.models import Q
+
+from config.settings.base import RYFT_CONTRACT_ADDRESS
+from ryft.core.holdings import refresh_wallet_holdings
+from ryft.core.models import NFT, Transaction, Wallet, WalletNFT
+from ryft.core.prices import eth_prices, usd_value
+from ryft.core.transfers import parse_log_index, save_transactions
+from ryft.core.wallet_addresses import wallet_addresses
+
+NULL_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def get_transaction_type(activity):
+    transaction_type = "transfer"
+    from_address = activity.get("from")
+    to_address = activity.get("to")
+
+    if from_address == NULL_ADDRESS:
+        transaction_type = "mint"
+
+    elif to_address == NULL_ADDRESS:
+        transaction_type = "burn"
+
+    return transaction_type
+
+
+def parse_activity(payload):
+    """
+    Pull the NFT transfers out of a wallet activity payload
+
+    :return: a dict per transfer, in the order of the payload
+    """
+    transaction_date = parser.parse(payload.get("createdAt")).date()
+
+    transfers = []
+    for activity in payload["event"]["activity"]:
+        if activity.get("category") == "token":
+            continue
+
+        price_eth = None
+        token_id = None
+
+        erc1155_metadata = activity.get("erc1155Metadata")
+        erc721_token_id = activity.get("erc721TokenId")
+        if erc1155_metadata:
+            token_id = int(erc1155_metadata[0].get("tokenId"), base=16)
+            price_eth = int(erc1155_metadata[0].get("value"), base=16)
+        elif erc721_token_id:
+            token_id = int(erc721_token_id, base=16)
+
+        if not token_id:
+            continue
+
+        if activity.get("value"):
+            price_eth = activity.get("value")
+
+        transfers.append(
+            {
+                "activity": activity,
+                "contract_address": activity.get("rawContract").get("address"),
+                "token_id": token_id,
+                "from_address": activity.get("fromAddress"),
+                "to_address": activity.get("toAddress"),
+                "price_eth": price_eth,
+                "transaction_date": transaction_date,
+            }
+        )
+
+    return transfers
+
+
+def get_nft_ids(transfers):
+    """
+    :return: NFT id of every (contract address, token id) in one query
+    """
+    token_ids = defaultdict(set)
+    for transfer in transfers:
+        token_ids[transfer["contract_address"]].add(str(transfer["token_id"]))
+
+    nft_filter = Q()
+    for contract_address, ids in token_ids.items():
+        nft_filter |= Q(collection__contract_address=contract_address, token_id__in=ids)
+
+    return {
+        (contract_address, token_id): nft_id
+        for contract_address, token_id, nft_id in NFT.objects.filter(
+            nft_filter
+        ).values_list("collection__contract_address", "token_id", "id")
+    }
+
+
+def _pairs_filter(pairs):
+    pairs_filter = Q()
+    for wallet_id, nft_id in pairs:
+        pairs_filter |= Q(wallet_id=wallet_id, nft_id=nft_id)
+    return pairs_filter
+
+
+def process_wallet_activity(payloads):
+    """
+    Apply wallet activity payloads in order: store their transactions, update
+    RYFT membership and move WalletNFTs between the sender and recipient,
+    refreshing the holdings of the wallets involved.
+
+    When the same wallet or NFT appears more than once only its last
+    transfer decides the final state.
+
+    :return: number of transfers involving a tracked wallet
+    """
+    transfers = [
+        transfer for payload in payloads for transfer in parse_activity(payload)
+    ]
+    if not transfers:
+        return 0
+
+    addresses = wallet_addresses.filter(
+        address
+        for transfer in transfers
+        for address in (transfer["from_address"], transfer["to_address"])
+    )
+    wallets = Wallet.objects.in_bulk(addresses, field_name="wallet_address")
+    transfers = [
+        transfer
+        for transfer in transfers
+        if wallets.keys() & {transfer["from_address"], transfer["to_address"]}
+    ]
+    if not transfers:
+        return 0
+
+    nft_ids = get_nft_ids(transfers)
+
+    transactions = []
+    # Last known state of each wallet's membership and of each WalletNFT
+    memberships = {}
+    holdings = {}
+    for transfer in transfers:
+        activity = transfer["activity"]
+        contract_address = transfer["contract_address"]
+        token_id = transfer["token_id"]
+        nft_id = nft_ids.get((contract_address, str(token_id)))
+
+        price_eth = transfer["price_eth"]
+        price_usd = None
+        if price_eth:
+            ether_price = eth_prices.as_of(transfer["transaction_date"])
+            if ether_price:
+                price_usd = usd_value(price_eth, ether_price)
+
+        for address, received in (
+            (transfer["from_address"], False),
+            (transfer["to_address"], True),
+        ):
+            wallet = wallets.get(address)
+            if not wallet:
+                continue
+
+            transactions.append(
+                Transaction(
+                    wallet=wallet,
+                    nft_id=nft_id,
+                    transaction_type=get_transaction_type(activity),
+                    transfer_from=transfer["from_address"],
+                    transfer_to=transfer["to_address"],
+                    contract_address=contract_address,
+                    token_id=token_id,
+                    quantity=1,
+                    transaction_hash=activity.get("transactionHash"),
+                    log_index=parse_log_index(
+                        (activity.get("log") or {}).get("logIndex")
+                    ),
+                    block_hash=activity.get("blockHash"),
+                    block_number=activity.get("blockNumber"),
+                    transaction_date=transfer["transaction_date"],
+                    raw_transaction_data=activity,
+                    price_eth=price_eth,
+                    price_usd=price_usd,
+                )
+            )
+            if contract_address == RYFT_CONTRACT_ADDRESS:
+                memberships[wallet.id] = received
+            if nft_id:
+                holdings[(wallet.id, nft_id)] = (received, transfer)
+
+    with transaction.atomic():
+        save_transactions(transactions)
+
+        for is_member in (True, False):
+            wallet_ids = [
+                wallet_id
+                for wallet_id, member in memberships.items()
+                if member is is_member
+            ]
+            if wallet_ids:
+                Wallet.objects.filter(id__in=wallet_ids).update(is_member=is_member)
+
+        sent = [pair for pair, (received, _) in holdings.items() if not received]
+        if sent:
+            WalletNFT.objects.filter(_pairs_filter(sent)).delete()
+
+        added = {pair: transfer for pair, (held, transfer) in holdings.items() if held}
+        if added:
+            existing = set(
+                WalletNFT.objects.filter(_pairs_filter(added)).values_list(
+                    "wallet_id", "nft_id"
+                )
+            )
+            WalletNFT.objects.bulk_create(
+                [
+                    WalletNFT(
+                        wallet_id=wallet_id,
+                        nft_id=nft_id,
+                        nft_raw_data={
+                            "contract_address": transfer["contract_address"],
+                            "token_id": transfer["token_id"],
+                        },
+                    )
+                    for (wallet_id, nft_id), transfer in added.items()
+                    if (wallet_id, nft_id) not in existing
+                ]
+            )
+
+        refresh_wallet_holdings({wallet_id for wallet_id, _ in holdings})
+
+    return len(transfers)